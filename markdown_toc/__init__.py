@@ -1,7 +1,3 @@
-import logging
-
-logger = logging.getLogger(__name__)
-
 # Imports, if any
 
 # fmt: off
@@ -13,6 +9,18 @@ __version__ = '0.3.1'
 # fmt: on
 
 
+def get_logger():
+    """
+    Return the package logger.
+
+    Importing `logging` costs more than the rest of startup, so it is only
+    imported when someone actually asks for the logger.
+    """
+    import logging
+
+    return logging.getLogger(__name__)
+
+
 def get_version(thing=None):
     if thing is None:
         return __version__
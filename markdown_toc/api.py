@@ -0,0 +1,221 @@
+"""
+Add or update tables of contents in Markdown text held in memory.
+
+This is the library interface: no command line is parsed and no files are
+read or written.  Options are checked once, into an `Options`:py:class:
+object that any number of documents can share, and documents without a
+table of contents token are passed through without being parsed::
+
+    from markdown_toc import api
+
+    (new_text, changed) = api.render(text, heading_level=2, skip_level=1)
+
+    options = api.Options(heading_level=2, skip_level=1)
+    for result in api.process_many(pages, options):
+        if result.changed:
+            save(result.name, result.text)
+"""
+
+from . import defaults, mdfile, slugs
+
+DEFAULT_NAME = "<string>"
+
+####################
+
+
+class Options(object):
+    """
+    Provide a checked set of options for rendering tables of contents.
+
+    The options are those of the command line, with the same defaults,
+    except that no comment is added unless `comment` is given.
+
+    :Args:
+        heading_text
+            (optional) Text of the heading above the table of contents
+
+        heading_level
+            (optional) Level of the heading above the table of contents
+
+        skip_level
+            (optional) Number of heading levels to leave out of the table of
+            contents
+
+        numbered
+            (optional) Whether to number the entries
+
+        alt_list_char
+            (optional) Whether to use ``*`` instead of ``-`` for entries
+
+        add_trailing_heading_chars
+            (optional) Whether to add trailing ``#`` characters to the
+            heading above the table of contents
+
+        anchor_style
+            (optional) One of `~markdown_toc.slugs.ANCHOR_STYLES`
+
+        comment
+            (optional) Comment to add near the table of contents
+
+    :Raises:
+        `ValueError`:py:exc: if an option has an invalid value
+    """
+
+    def __init__(
+        self,
+        heading_text=defaults.DEFAULT_HEADING_TEXT,
+        heading_level=defaults.DEFAULT_HEADING_LEVEL,
+        skip_level=defaults.DEFAULT_SKIP_LEVEL,
+        numbered=defaults.DEFAULT_NUMBERED,
+        alt_list_char=defaults.DEFAULT_ALT_LIST_CHAR,
+        add_trailing_heading_chars=defaults.DEFAULT_ADD_TRAILING_HEADING_CHARS,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
+        comment=None,
+    ):
+        if heading_level < 1:
+            raise ValueError("heading_level must be at least 1")
+        if skip_level < 0:
+            raise ValueError("skip_level must not be negative")
+        if anchor_style not in slugs.ANCHOR_STYLES:
+            raise ValueError(
+                "{style}: unrecognized anchor style".format(style=anchor_style)
+            )
+        self.parse_kwargs = {
+            "heading_text": heading_text,
+            "heading_level": heading_level,
+            "skip_level": skip_level,
+        }
+        self.render_kwargs = {
+            "numbered": numbered,
+            "toc_comment": comment,
+            "alt_list_char": alt_list_char,
+            "add_trailing_heading_chars": add_trailing_heading_chars,
+            "anchor_style": anchor_style,
+        }
+
+    def __repr__(self):
+        """Print a human-readable representation of these options."""
+        kwargs = dict(self.parse_kwargs, **self.render_kwargs)
+        kwargs["comment"] = kwargs.pop("toc_comment")
+        return "Options({kwargs})".format(
+            kwargs=", ".join(
+                "{name}={value!r}".format(name=name, value=value)
+                for (name, value) in sorted(kwargs.items())
+            )
+        )
+
+
+class Result(object):
+    """
+    Provide the result of processing one document with `process_many()`.
+
+    :Attributes:
+        name
+            The name the document was given
+
+        text
+            The document's new text, or its original text if there was an
+            error
+
+        changed
+            Whether `text` differs from the original text
+
+        error
+            `None`, or a message saying why the document could not be
+            processed
+    """
+
+    __slots__ = ("name", "text", "changed", "error")
+
+    def __init__(self, name, text, changed, error=None):
+        self.name = name
+        self.text = text
+        self.changed = changed
+        self.error = error
+
+    def __repr__(self):
+        """Print a human-readable representation of this result."""
+        return "Result(name={name!r}, changed={changed!r}, error={error!r})".format(
+            name=self.name, changed=self.changed, error=self.error
+        )
+
+
+def _get_options(options, option_values):
+    if options is None:
+        return Options(**option_values)
+    if option_values:
+        raise TypeError("give either an Options object or option values, not both")
+    return options
+
+
+def _render(md, text, options):
+    """Render `text` using `md`, a reusable `~markdown_toc.mdfile.MarkdownFile`."""
+    if not mdfile.text_has_toc_token(text):
+        return (text, False)
+    md.set_text(text)
+    md.parse(**options.parse_kwargs)
+    new_text = md.render(**options.render_kwargs)
+    return (new_text, new_text != text)
+
+
+def render(text, options=None, name=DEFAULT_NAME, **option_values):
+    """
+    Add or update the tables of contents in Markdown `text`.
+
+    :Args:
+        text
+            The Markdown text
+
+        options
+            (optional) An `Options`:py:class: object; alternatively, give
+            option values as keyword arguments
+
+        name
+            (optional) A name for the text, used in error messages
+
+    :Returns:
+        A tuple (`new_text`, `changed`)
+
+    :Raises:
+        `ValueError`:py:exc: if a table of contents is improperly nested, or
+        an option has an invalid value
+    """
+    options = _get_options(options, option_values)
+    md = mdfile.MarkdownFile(infile=None, infilename=name)
+    return _render(md, text, options)
+
+
+def process_many(documents, options=None, **option_values):
+    """
+    Add or update the tables of contents in many Markdown documents.
+
+    Documents are processed lazily, one at a time, and an error in one
+    document does not stop the others.
+
+    :Args:
+        documents
+            An iterable of (`name`, `text`) tuples
+
+        options
+            (optional) An `Options`:py:class: object; alternatively, give
+            option values as keyword arguments
+
+    :Returns:
+        An iterator of `Result`:py:class: objects, one per document, in order
+    """
+    # Options are checked now, rather than when the first result is wanted.
+    return _process_many(documents, _get_options(options, option_values))
+
+
+def _process_many(documents, options):
+    md = mdfile.MarkdownFile(infile=None)
+    for (name, text) in documents:
+        md.infilename = name
+        try:
+            (new_text, changed) = _render(md, text, options)
+        except ValueError as e:
+            # The parser gives the message and then the position.
+            error = ": ".join(str(x) for x in reversed(e.args))
+            yield Result(name, text, False, error=error)
+            continue
+        yield Result(name, new_text, changed)
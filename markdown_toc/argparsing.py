@@ -3,8 +3,45 @@
 from __future__ import print_function
 
 import argparse
+import os
 import sys
 
+DEFAULT_TERMINAL_COLUMNS = 80
+
+
+def _get_terminal_columns():
+    """Get the terminal width the way `shutil.get_terminal_size()` does."""
+    try:
+        columns = int(os.environ["COLUMNS"])
+    except (KeyError, ValueError):
+        columns = 0
+    if columns <= 0:
+        try:
+            columns = os.get_terminal_size(sys.__stdout__.fileno()).columns
+        except (AttributeError, ValueError, OSError):
+            columns = 0
+    return columns or DEFAULT_TERMINAL_COLUMNS
+
+
+class HelpFormatter(argparse.HelpFormatter):
+    """
+    Provide an `argparse.HelpFormatter`:py:class: that avoids importing `shutil`.
+
+    The stock formatter imports `shutil`:py:mod: to find the terminal width
+    every time an argument is added, which is a measurable share of startup
+    time for a short-lived command.
+    """
+
+    def __init__(self, prog, indent_increment=2, max_help_position=24, width=None):
+        if width is None:
+            width = _get_terminal_columns() - 2
+        super(HelpFormatter, self).__init__(
+            prog,
+            indent_increment=indent_increment,
+            max_help_position=max_help_position,
+            width=width,
+        )
+
 
 def grok_argv(argv):
     """
@@ -0,0 +1,634 @@
+"""
+Benchmark the hot paths of `~markdown_toc.mdfile`:py:mod:.
+
+Run the benchmarks on a synthetic Markdown document and save the results::
+
+    python -m markdown_toc.benchmark run --output baseline.json
+
+Later, run them again with the same parameters and flag regressions::
+
+    python -m markdown_toc.benchmark compare baseline.json
+
+Time a corpus of adversarial documents, each at two sizes, and flag any
+whose time grows faster than their size::
+
+    python -m markdown_toc.benchmark adversarial
+"""
+
+from __future__ import print_function
+
+import io
+import json
+import platform
+import random
+import sys
+import time
+
+from . import argparsing, get_version, links, mdfile, slugs
+
+####################
+
+STATUS_SUCCESS = 0
+STATUS_FAILURE = 1
+STATUS_REGRESSED = 99
+
+COMMAND_RUN = "run"
+COMMAND_COMPARE = "compare"
+COMMAND_ADVERSARIAL = "adversarial"
+
+DEFAULT_NUM_LINES = 100000
+DEFAULT_HEADING_DENSITY = 0.05
+DEFAULT_LEVELS = "1:1,2:8,3:6,4:2,5:1"
+DEFAULT_SETEXT_FRACTION = 0.0
+DEFAULT_FENCE_DENSITY = 0.01
+DEFAULT_FENCE_LENGTH = 8
+DEFAULT_NUM_MARKERS = 1
+DEFAULT_SEED = 42
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_ADVERSARIAL_SIZE = 20000
+DEFAULT_MAX_GROWTH = 2.0
+
+# The large document of each adversarial pair is this many times the size
+# of the small one; linear time means a time ratio of about this much.
+ADVERSARIAL_SCALE = 4
+
+PHASE_PARSE = "parse"
+PHASE_TOC_FORMAT = "toc_format"
+PHASE_ITEM_FORMAT = "item_format"
+PHASE_ANCHOR = "anchor"
+PHASE_WRITE = "write"
+
+PHASES = [PHASE_PARSE, PHASE_TOC_FORMAT, PHASE_ITEM_FORMAT, PHASE_ANCHOR, PHASE_WRITE]
+
+WORDS = (
+    "alpha beta gamma delta epsilon API Reference Install Usage Options "
+    "configuration overview Example examples C++ CLI -- module function "
+    "class method returns raises (deprecated) v2.0 notes FAQ hello_world"
+).split()
+
+# Documents that have made, or could make, a scanner or regex backtrack or
+# rescan; each maker takes a size and returns the document text.
+ADVERSARIAL_DOCUMENTS = [
+    ("hash_space_runs", lambda n: "#" + " #" * n + "\n"),
+    ("long_closing_run", lambda n: "# x" + " " * n + "#" * n + "\n"),
+    ("comment_spaces", lambda n: "[toc]: #" + " " * n + "(\n"),
+    ("bracket_runs", lambda n: "[" * n + "]: #\n"),
+    ("backtick_info", lambda n: "```" + "`" * n + "x\n"),
+    ("code_span_runs", lambda n: "# [x](#y) " + "`a" * n + "\n"),
+    ("html_tag_runs", lambda n: "<a " * n + "\n"),
+    ("link_runs", lambda n: "#" + "](" * n + "\n"),
+    ("list_marker_runs", lambda n: "- " * n + "x\n"),
+    ("unterminated_fence", lambda n: "```\n" + "# not a heading\n" * n),
+    ("unterminated_toc", lambda n: "[begintoc]: #\n" + "text\n" * n),
+    ("long_setext_paragraph", lambda n: "[toc]: #\n\n" + "word\n" * n + "===\n"),
+    ("duplicate_headings", lambda n: "[toc]: #\n" + "# a\n" * n),
+    ("blank_indent_runs", lambda n: (" " * 100 + "\n") * (n // 10)),
+]
+
+FORMAT_OPTIONS = {
+    "numbered": False,
+    "alt_list_char": False,
+    "add_trailing_heading_chars": False,
+}
+
+####################
+
+
+def _parse_levels(text):
+    """Parse a level distribution like ``1:1,2:8,3:6`` into (levels, weights)."""
+    levels = []
+    weights = []
+    for item in text.split(","):
+        (level, weight) = item.split(":")
+        levels.append(int(level))
+        weights.append(float(weight))
+    return (levels, weights)
+
+
+def _make_words(rng, min_words, max_words):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def generate_markdown(
+    num_lines=DEFAULT_NUM_LINES,
+    heading_density=DEFAULT_HEADING_DENSITY,
+    levels=DEFAULT_LEVELS,
+    fence_density=DEFAULT_FENCE_DENSITY,
+    fence_length=DEFAULT_FENCE_LENGTH,
+    num_markers=DEFAULT_NUM_MARKERS,
+    seed=DEFAULT_SEED,
+    setext_fraction=DEFAULT_SETEXT_FRACTION,
+):
+    """
+    Generate a synthetic Markdown document.
+
+    :Args:
+        num_lines
+            (optional) The approximate number of lines to generate
+
+        heading_density
+            (optional) The fraction of lines that are headings
+
+        levels
+            (optional) The heading level distribution, as comma-separated
+            ``level:weight`` pairs
+
+        fence_density
+            (optional) The fraction of lines that start a code fence
+
+        fence_length
+            (optional) The number of lines inside each code fence
+
+        num_markers
+            (optional) The number of table of contents tokens, spread evenly
+            through the document; every other one is a begin/end pair
+
+        seed
+            (optional) The random seed, so that documents are reproducible
+
+        setext_fraction
+            (optional) The fraction of level 1 and 2 headings written in
+            setext style, underlined with ``=`` or ``-``
+
+    :Returns:
+        A list of lines, each ending in a newline
+    """
+    rng = random.Random(seed)
+    (level_values, level_weights) = _parse_levels(levels)
+    marker_interval = num_lines // (num_markers + 1) if num_markers > 0 else None
+    markers_written = 0
+    lines = []
+    while len(lines) < num_lines:
+        if (
+            marker_interval is not None
+            and markers_written < num_markers
+            and len(lines) >= marker_interval * (markers_written + 1)
+        ):
+            if markers_written % 2 == 0:
+                lines.extend(["\n", "[toc]: #\n", "\n"])
+            else:
+                lines.extend(
+                    [
+                        "\n",
+                        "[begintoc]: #\n",
+                        "\n",
+                        "- [stale](#stale)\n",
+                        "\n",
+                        "[endtoc]: # (old)\n",
+                        "\n",
+                    ]
+                )
+            markers_written += 1
+            continue
+        r = rng.random()
+        if r < heading_density:
+            level = rng.choices(level_values, weights=level_weights)[0]
+            text = _make_words(rng, 1, 5)
+            # Only draw again when asked to, so that documents made with
+            # earlier versions' parameters stay the same.
+            if setext_fraction and level <= 2 and rng.random() < setext_fraction:
+                underline = ("=" if level == 1 else "-") * len(text)
+                lines.extend(["\n", text + "\n", underline + "\n"])
+            else:
+                lines.append(
+                    "{markers} {text}\n".format(
+                        markers=mdfile.HEADING_CHAR * level, text=text
+                    )
+                )
+        elif r < heading_density + fence_density:
+            lines.append("```python\n")
+            for _ in range(fence_length):
+                lines.append("# {text}\n".format(text=_make_words(rng, 2, 8)))
+            lines.append("```\n")
+        elif r < 0.8:
+            lines.append(_make_words(rng, 5, 15) + "\n")
+        else:
+            lines.append("\n")
+    return lines
+
+
+####################
+
+
+def _time_best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _parse_document(lines):
+    md = mdfile.MarkdownFile(infile=io.StringIO("".join(lines)), infilename="bench")
+    md.parse(heading_text="Contents", heading_level=1, skip_level=0)
+    return md
+
+
+def run_benchmarks(lines, repeat=DEFAULT_REPEAT):
+    """
+    Time each phase on the given document.
+
+    :Returns:
+        A `dict` mapping phase names to `dict` objects with the best time in
+        ``seconds`` plus ``lines_per_second`` and ``headings_per_second``
+    """
+    md = _parse_document(lines)
+    heading_texts = [text for (_line_index, _level, text) in md.headings]
+    toc_items = []
+    for (_line_index, _level, text) in md.headings:
+        toc_items.append(mdfile.TocItem(text=text, n=1))
+
+    def do_parse():
+        _parse_document(lines)
+
+    def do_toc_format():
+        md.toc.format(comment="", **FORMAT_OPTIONS)
+
+    def do_item_format():
+        for item in toc_items:
+            item.format(indent_level=1, numbered=False, alt_list_char=False)
+
+    def do_anchor():
+        # Start cold each time; memoized anchors would make later runs free.
+        slugs.make_slug.cache_clear()
+        slugs.Slugger().slug_all(heading_texts)
+
+    def do_write():
+        md.render(toc_comment="", **FORMAT_OPTIONS)
+
+    phase_funcs = {
+        PHASE_PARSE: do_parse,
+        PHASE_TOC_FORMAT: do_toc_format,
+        PHASE_ITEM_FORMAT: do_item_format,
+        PHASE_ANCHOR: do_anchor,
+        PHASE_WRITE: do_write,
+    }
+
+    num_lines = len(lines)
+    num_headings = len(heading_texts)
+    results = {}
+    for phase in PHASES:
+        seconds = _time_best(phase_funcs[phase], repeat)
+        results[phase] = {
+            "seconds": seconds,
+            "lines_per_second": num_lines / seconds if seconds else None,
+            "headings_per_second": num_headings / seconds if seconds else None,
+        }
+    return results
+
+
+def _get_params(args):
+    return {
+        "num_lines": args.num_lines,
+        "heading_density": args.heading_density,
+        "levels": args.levels,
+        "fence_density": args.fence_density,
+        "fence_length": args.fence_length,
+        "num_markers": args.num_markers,
+        "seed": args.seed,
+        "setext_fraction": args.setext_fraction,
+    }
+
+
+def _run(params, repeat):
+    lines = generate_markdown(**params)
+    return {
+        "version": get_version(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "params": params,
+        "repeat": repeat,
+        "results": run_benchmarks(lines, repeat=repeat),
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two sets of benchmark results.
+
+    :Returns:
+        A list of (`phase`, `baseline_seconds`, `current_seconds`, `ratio`,
+        `regressed`) tuples, where `regressed` is true when the current time
+        exceeds the baseline time by more than `threshold` (a fraction)
+    """
+    comparisons = []
+    for phase in PHASES:
+        if phase not in baseline["results"] or phase not in current["results"]:
+            continue
+        baseline_seconds = baseline["results"][phase]["seconds"]
+        current_seconds = current["results"][phase]["seconds"]
+        ratio = current_seconds / baseline_seconds if baseline_seconds else 1.0
+        comparisons.append(
+            (phase, baseline_seconds, current_seconds, ratio, ratio > 1.0 + threshold)
+        )
+    return comparisons
+
+
+def _process_adversarial(text):
+    md = mdfile.MarkdownFile(infile=io.StringIO(text), infilename="adversarial")
+    try:
+        md.parse(heading_text="Contents", heading_level=1, skip_level=0)
+        md.render(toc_comment="", **FORMAT_OPTIONS)
+        links.make_link_entry(md)
+    except ValueError:
+        # Rejecting a document is a fine outcome, so long as it is quick.
+        pass
+
+
+def run_adversarial(
+    size=DEFAULT_ADVERSARIAL_SIZE,
+    repeat=DEFAULT_REPEAT,
+    max_growth=DEFAULT_MAX_GROWTH,
+    scale=ADVERSARIAL_SCALE,
+):
+    """
+    Time each adversarial document at `size` and at `scale` times `size`.
+
+    :Returns:
+        A list of (`name`, `small_seconds`, `large_seconds`, `growth`,
+        `regressed`) tuples, where `growth` is the ratio of the times divided
+        by `scale` (about 1.0 for linear time), and `regressed` is true when
+        `growth` exceeds `max_growth`
+    """
+    results = []
+    for (name, make_document) in ADVERSARIAL_DOCUMENTS:
+        small_text = make_document(size)
+        large_text = make_document(size * scale)
+        small_seconds = _time_best(lambda: _process_adversarial(small_text), repeat)
+        large_seconds = _time_best(lambda: _process_adversarial(large_text), repeat)
+        growth = large_seconds / small_seconds / scale if small_seconds else 1.0
+        results.append(
+            (name, small_seconds, large_seconds, growth, growth > max_growth)
+        )
+    return results
+
+
+def save_adversarial(directory, size=DEFAULT_ADVERSARIAL_SIZE):
+    """Write each adversarial document, at `size`, to `directory` as ``NAME.md``."""
+    import os
+    import os.path
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for (name, make_document) in ADVERSARIAL_DOCUMENTS:
+        path = os.path.join(directory, name + ".md")
+        with io.open(path, "wt", encoding="utf-8", newline="") as f:
+            f.write(make_document(size))
+
+
+####################
+
+
+def _print_results(report):
+    print(
+        "{:<12} {:>12} {:>16} {:>16}".format(
+            "phase", "seconds", "lines/s", "headings/s"
+        )
+    )
+    for phase in PHASES:
+        result = report["results"][phase]
+        print(
+            "{:<12} {:>12.6f} {:>16,.0f} {:>16,.0f}".format(
+                phase,
+                result["seconds"],
+                result["lines_per_second"] or 0,
+                result["headings_per_second"] or 0,
+            )
+        )
+
+
+def _print_comparisons(comparisons):
+    print("{:<12} {:>12} {:>12} {:>8}".format("phase", "baseline", "current", "ratio"))
+    for (phase, baseline_seconds, current_seconds, ratio, regressed) in comparisons:
+        print(
+            "{:<12} {:>12.6f} {:>12.6f} {:>8.3f}{flag}".format(
+                phase,
+                baseline_seconds,
+                current_seconds,
+                ratio,
+                flag="  REGRESSED" if regressed else "",
+            )
+        )
+
+
+def _print_adversarial(results):
+    print(
+        "{:<24} {:>12} {:>12} {:>8}".format("document", "small", "large", "growth")
+    )
+    for (name, small_seconds, large_seconds, growth, regressed) in results:
+        print(
+            "{:<24} {:>12.6f} {:>12.6f} {:>8.3f}{flag}".format(
+                name,
+                small_seconds,
+                large_seconds,
+                growth,
+                flag="  SUPER-LINEAR" if regressed else "",
+            )
+        )
+
+
+def _load_report(path):
+    with open(path, "rt") as f:
+        return json.load(f)
+
+
+def _save_report(report, path):
+    with open(path, "wt") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _add_generator_arguments(parser):
+    parser.add_argument(
+        "--lines",
+        dest="num_lines",
+        type=int,
+        default=DEFAULT_NUM_LINES,
+        help="approximate number of lines (default: {})".format(DEFAULT_NUM_LINES),
+    )
+    parser.add_argument(
+        "--heading-density",
+        type=float,
+        default=DEFAULT_HEADING_DENSITY,
+        help="fraction of lines that are headings (default: {})".format(
+            DEFAULT_HEADING_DENSITY
+        ),
+    )
+    parser.add_argument(
+        "--levels",
+        default=DEFAULT_LEVELS,
+        help="heading level distribution as 'level:weight,...' (default: {})".format(
+            DEFAULT_LEVELS
+        ),
+    )
+    parser.add_argument(
+        "--fence-density",
+        type=float,
+        default=DEFAULT_FENCE_DENSITY,
+        help="fraction of lines that start a code fence (default: {})".format(
+            DEFAULT_FENCE_DENSITY
+        ),
+    )
+    parser.add_argument(
+        "--fence-length",
+        type=int,
+        default=DEFAULT_FENCE_LENGTH,
+        help="lines inside each code fence (default: {})".format(DEFAULT_FENCE_LENGTH),
+    )
+    parser.add_argument(
+        "--markers",
+        dest="num_markers",
+        type=int,
+        default=DEFAULT_NUM_MARKERS,
+        help="number of table of contents tokens (default: {})".format(
+            DEFAULT_NUM_MARKERS
+        ),
+    )
+    parser.add_argument(
+        "--setext-fraction",
+        type=float,
+        default=DEFAULT_SETEXT_FRACTION,
+        help=(
+            "fraction of level 1 and 2 headings written setext-style (default: {})"
+        ).format(DEFAULT_SETEXT_FRACTION),
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=DEFAULT_SEED,
+        help="random seed (default: {})".format(DEFAULT_SEED),
+    )
+
+
+def _add_repeat_argument(parser):
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help="runs per phase; the best time is kept (default: {})".format(
+            DEFAULT_REPEAT
+        ),
+    )
+
+
+def _setup_args(argv):
+    (prog, argv) = argparsing.grok_argv(argv)
+    parser = argparsing.setup_argparse(
+        prog=prog, description="Benchmark markdown-toc on synthetic Markdown."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser(COMMAND_RUN, help="run the benchmarks")
+    _add_generator_arguments(run_parser)
+    _add_repeat_argument(run_parser)
+    run_parser.add_argument(
+        "-o",
+        "--output",
+        dest="output_filename",
+        default=None,
+        metavar="OUTPUTFILE",
+        help="save results as a JSON baseline",
+    )
+
+    compare_parser = subparsers.add_parser(
+        COMMAND_COMPARE, help="compare results against a baseline"
+    )
+    compare_parser.add_argument(
+        "baseline_filename", metavar="BASELINE", help="baseline results (JSON)"
+    )
+    compare_parser.add_argument(
+        "current_filename",
+        nargs="?",
+        default=None,
+        metavar="CURRENT",
+        help=(
+            "current results (JSON); if omitted, run the benchmarks with the "
+            "baseline's parameters"
+        ),
+    )
+    _add_repeat_argument(compare_parser)
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=(
+            "flag phases more than this fraction slower than the baseline "
+            "(default: {})"
+        ).format(DEFAULT_THRESHOLD),
+    )
+
+    adversarial_parser = subparsers.add_parser(
+        COMMAND_ADVERSARIAL,
+        help="time adversarial documents and flag super-linear growth",
+    )
+    adversarial_parser.add_argument(
+        "--size",
+        type=int,
+        default=DEFAULT_ADVERSARIAL_SIZE,
+        help="size of the small document of each pair (default: {})".format(
+            DEFAULT_ADVERSARIAL_SIZE
+        ),
+    )
+    _add_repeat_argument(adversarial_parser)
+    adversarial_parser.add_argument(
+        "--max-growth",
+        type=float,
+        default=DEFAULT_MAX_GROWTH,
+        help=(
+            "flag documents whose time grows more than this many times faster "
+            "than their size (default: {})"
+        ).format(DEFAULT_MAX_GROWTH),
+    )
+    adversarial_parser.add_argument(
+        "--save-dir",
+        default=None,
+        metavar="DIRECTORY",
+        help="also write the small documents to this directory",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error("a command is required")
+    return args
+
+
+def main(*argv):
+    """Run or compare benchmarks."""
+    args = _setup_args(argv)
+
+    if args.command == COMMAND_RUN:
+        report = _run(_get_params(args), args.repeat)
+        _print_results(report)
+        if args.output_filename is not None:
+            _save_report(report, args.output_filename)
+        return STATUS_SUCCESS
+
+    if args.command == COMMAND_ADVERSARIAL:
+        if args.save_dir is not None:
+            save_adversarial(args.save_dir, size=args.size)
+        results = run_adversarial(
+            size=args.size, repeat=args.repeat, max_growth=args.max_growth
+        )
+        _print_adversarial(results)
+        if any(regressed for (_n, _s, _l, _g, regressed) in results):
+            return STATUS_REGRESSED
+        return STATUS_SUCCESS
+
+    baseline = _load_report(args.baseline_filename)
+    if args.current_filename is None:
+        current = _run(baseline["params"], args.repeat)
+    else:
+        current = _load_report(args.current_filename)
+    comparisons = compare_results(baseline, current, threshold=args.threshold)
+    _print_comparisons(comparisons)
+    if any(regressed for (_p, _b, _c, _r, regressed) in comparisons):
+        return STATUS_REGRESSED
+    return STATUS_SUCCESS
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv))
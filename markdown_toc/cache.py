@@ -0,0 +1,195 @@
+"""
+Provide a persistent cache of files known to already be up to date.
+
+A cache entry records that a file, processed with a given set of options,
+is already in its final state, so that later runs can skip it entirely.
+Entries are looked up first by (path, size, mtime), which needs only a
+`os.stat()`:py:func:, then by a hash of the file's content.
+"""
+
+import os
+import os.path
+import time
+
+from . import defaults
+
+DEFAULT_MAX_ENTRIES = defaults.DEFAULT_CACHE_SIZE
+
+# Seconds a connection waits for another process to release its lock.
+LOCK_TIMEOUT = 30.0
+
+# A file modified this recently (in seconds) might be modified again within
+# the granularity of its mtime, so only its content hash is trusted.
+RACY_INTERVAL = 2.0
+
+# How many stores between checks for entries to evict.
+EVICTION_INTERVAL = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT NOT NULL,
+    options_hash TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    content_hash TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (path, options_hash)
+);
+CREATE INDEX IF NOT EXISTS entries_by_content ON entries (content_hash, options_hash);
+CREATE INDEX IF NOT EXISTS entries_by_last_used ON entries (last_used);
+"""
+
+
+def hash_text(text):
+    """Compute a compact hash of `text` (a `str` or `bytes`)."""
+    import hashlib
+
+    if isinstance(text, str):
+        text = text.encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(text, digest_size=16).hexdigest()
+
+
+def hash_options(options):
+    """Compute a hash of an iterable of option values."""
+    return hash_text(repr(tuple(options)))
+
+
+class ResultCache(object):
+    """
+    Provide a size-bounded LRU cache of files known to be up to date.
+
+    The cache is an SQLite database, so several processes may share it;
+    SQLite serializes their writes.
+
+    :Args:
+        path
+            The path to the cache file; its directory is created if needed
+
+        max_entries
+            (optional) The maximum number of entries to keep; the least
+            recently used entries beyond this are evicted
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        import sqlite3
+
+        self.path = path
+        self.max_entries = max_entries
+        self._stores_since_eviction = 0
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+        self.evict()
+
+    def close(self):
+        """Close the cache."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _touch(self, path, options_hash):
+        with self._connection:
+            self._connection.execute(
+                "UPDATE entries SET last_used = ? WHERE path = ? AND options_hash = ?",
+                (time.time(), path, options_hash),
+            )
+
+    def lookup_stat(self, path, stat_result, options_hash):
+        """
+        Tell whether `path` is known to be up to date, given only its stat.
+
+        :Args:
+            path
+                The path to the file
+
+            stat_result
+                The result of `os.stat()`:py:func: on `path`
+
+            options_hash
+                The hash of the effective options (see `hash_options()`:py:func:)
+
+        :Returns:
+            `True` if the file's size and mtime match a cache entry
+        """
+        row = self._connection.execute(
+            "SELECT size, mtime_ns FROM entries WHERE path = ? AND options_hash = ?",
+            (path, options_hash),
+        ).fetchone()
+        if row is None or tuple(row) != (stat_result.st_size, stat_result.st_mtime_ns):
+            return False
+        self._touch(path, options_hash)
+        return True
+
+    def lookup_content(self, path, stat_result, content_hash, options_hash):
+        """
+        Tell whether content with the given hash is known to be up to date.
+
+        Any file with the same content qualifies, since the output depends
+        only on the content and the options.  On a hit, an entry for `path`
+        is stored so that the next lookup by stat succeeds.
+
+        :Returns:
+            `True` if some cache entry has the same content and options hashes
+        """
+        row = self._connection.execute(
+            "SELECT 1 FROM entries WHERE content_hash = ? AND options_hash = ? "
+            "LIMIT 1",
+            (content_hash, options_hash),
+        ).fetchone()
+        if row is None:
+            return False
+        self.store(path, stat_result, content_hash, options_hash)
+        return True
+
+    def store(self, path, stat_result, content_hash, options_hash):
+        """
+        Record that `path` is up to date.
+
+        :Args:
+            path
+                The path to the file
+
+            stat_result
+                The result of `os.stat()`:py:func: on `path` in its final state
+
+            content_hash
+                The hash of the file's final content (see `hash_text()`:py:func:)
+
+            options_hash
+                The hash of the effective options (see `hash_options()`:py:func:)
+        """
+        now = time.time()
+        if now - stat_result.st_mtime < RACY_INTERVAL:
+            (size, mtime_ns) = (None, None)
+        else:
+            (size, mtime_ns) = (stat_result.st_size, stat_result.st_mtime_ns)
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(path, options_hash, size, mtime_ns, content_hash, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, options_hash, size, mtime_ns, content_hash, now),
+            )
+        self._stores_since_eviction += 1
+        if self._stores_since_eviction >= EVICTION_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        """Evict the least recently used entries beyond `self.max_entries`."""
+        self._stores_since_eviction = 0
+        with self._connection:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM entries"
+            ).fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM entries WHERE rowid IN "
+                    "(SELECT rowid FROM entries ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
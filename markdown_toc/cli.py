@@ -2,14 +2,21 @@
 
 from __future__ import print_function
 
-import datetime
-import difflib
+import os
 import os.path
 import sys
 
-import argcomplete
-
-from . import argparsing, completion, get_version, iofile, mdfile
+# Modules needed only by some options (cache, links, regiondiff, timing,
+# walk and the like) are imported where they are used, to keep startup fast.
+from . import argparsing, defaults, get_version, iofile, mdfile, slugs
+from .defaults import (
+    DEFAULT_ADD_TRAILING_HEADING_CHARS,
+    DEFAULT_ALT_LIST_CHAR,
+    DEFAULT_HEADING_LEVEL,
+    DEFAULT_HEADING_TEXT,
+    DEFAULT_NUMBERED,
+    DEFAULT_SKIP_LEVEL,
+)
 
 ####################
 
@@ -19,6 +26,17 @@ STATUS_CHANGED = 99
 
 DIFF_CONTEXT_LINES = 3
 
+ARGCOMPLETE_ENV_VAR = "_ARGCOMPLETE"
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+# Keys of the per-file details returned by `_process_file()`
+DETAIL_LINK_ENTRY = "link_entry"
+DETAIL_TIMINGS = "timings"
+DETAIL_EXTRACT = "extract"
+DETAIL_WRITTEN = "written"
+
 NEWLINE_FORMAT_LINUX = "linux"
 NEWLINE_FORMAT_MICROSOFT = "microsoft"
 NEWLINE_FORMAT_NATIVE = "native"
@@ -52,17 +70,73 @@ NEWLINE_VALUES = {
 }
 
 DEFAULT_NEWLINES = NEWLINE_FORMAT_NATIVE
-DEFAULT_HEADING_TEXT = "Contents"
-DEFAULT_HEADING_LEVEL = 1
-DEFAULT_ADD_TRAILING_HEADING_CHARS = False
-DEFAULT_ALT_LIST_CHAR = False
-DEFAULT_NUMBERED = False
-DEFAULT_SKIP_LEVEL = 0
+DEFAULT_IDLE_TIMEOUT = 900.0
+DEFAULT_WATCH_DEBOUNCE = 0.2
+
+EXTRACT_JSON = "json"
+EXTRACT_MARKDOWN = "markdown"
+
+EXTRACT_FORMATS = [EXTRACT_JSON, EXTRACT_MARKDOWN]
+
+FSYNC_NEVER = "never"
+FSYNC_FILE = "file"
+FSYNC_BATCH = "batch"
+
+FSYNC_POLICIES = [FSYNC_NEVER, FSYNC_FILE, FSYNC_BATCH]
+
+DEFAULT_FSYNC = FSYNC_NEVER
+
+# How many files found under input directories may wait for each worker.
+PENDING_FILES_PER_JOB = 4
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CPU_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CPU_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
 
 
 ####################
 
 
+def _read_first_line(path):
+    try:
+        with open(path, "rt") as f:
+            return f.readline().strip()
+    except (OSError, IOError):
+        return None
+
+
+def _get_cgroup_cpu_limit():
+    """Get the CPU limit imposed by a Linux cgroup (v2 or v1), if any."""
+    cpu_max = _read_first_line(CGROUP_V2_CPU_MAX)
+    if cpu_max is not None:
+        fields = cpu_max.split()
+        if len(fields) == 2 and fields[0] != "max":
+            return float(fields[0]) / float(fields[1])
+        return None
+    quota = _read_first_line(CGROUP_V1_CPU_QUOTA)
+    period = _read_first_line(CGROUP_V1_CPU_PERIOD)
+    if quota is None or period is None or int(quota) <= 0 or int(period) <= 0:
+        return None
+    return float(quota) / float(period)
+
+
+def _get_usable_cpu_count():
+    """Get the number of CPUs this process may actually use."""
+    try:
+        cpu_count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpu_count = os.cpu_count() or 1
+    try:
+        cgroup_limit = _get_cgroup_cpu_limit()
+    except ValueError:
+        cgroup_limit = None
+    if cgroup_limit is not None:
+        import math
+
+        cpu_count = min(cpu_count, max(1, int(math.ceil(cgroup_limit))))
+    return cpu_count
+
+
 def _generate_comment(
     prog, argv, suffix="", with_full_command=False, with_datestamp=False
 ):
@@ -70,33 +144,106 @@ def _generate_comment(
         command = "'" + " ".join(argv) + "'"
     else:
         command = os.path.basename(prog)
-    datestamp = "".join([datetime.datetime.utcnow().isoformat(), "Z"])
     if with_datestamp:
+        import datetime
+
+        datestamp = "".join([datetime.datetime.utcnow().isoformat(), "Z"])
         template = "Generated by {command} on {datestamp}{suffix}"
     else:
+        datestamp = None
         template = "Generated by {command}{suffix}"
     comment_text = template.format(command=command, datestamp=datestamp, suffix=suffix)
     return comment_text
 
 
-def _compute_diff(filename, input_text, output_text, context_lines=DIFF_CONTEXT_LINES):
+def _compute_diff(
+    filename,
+    input_text,
+    output_text,
+    rendered_ranges=None,
+    context_lines=DIFF_CONTEXT_LINES,
+):
+    """
+    Compare the input and output text of a file in unified diff format.
+
+    :Args:
+        filename
+            The name of the file, for the diff's headers
+
+        input_text, output_text
+            The file's text before and after
+
+        rendered_ranges
+            (optional) The line ranges that alone may differ, as given by
+            `~markdown_toc.mdfile.MarkdownFile.get_rendered_ranges()`:py:meth:;
+            if given, only these ranges are compared
+
+        context_lines
+            (optional) The number of lines of context around each change
+
+    :Returns:
+        An iterator of the lines of the diff, without line endings
+    """
+    import difflib
+
+    from . import regiondiff
+
     input_filename = os.path.join("a", filename)
     output_filename = os.path.join("b", filename)
 
     input_lines = input_text.split("\n")
     output_lines = output_text.split("\n")
 
-    return difflib.unified_diff(
+    # The ranges count lines ended by any newline, but the diff splits
+    # only at '\n', so they only line up if there are no lone '\r's.
+    if rendered_ranges is None or input_text.count("\r") != input_text.count(
+        "\r\n"
+    ):
+        return difflib.unified_diff(
+            input_lines,
+            output_lines,
+            fromfile=input_filename,
+            tofile=output_filename,
+            n=context_lines,
+            # TODO: Remove this if we start using readlines() to get input/output text.
+            lineterm="",
+        )
+
+    regions = list(rendered_ranges)
+    if regions and regions[-1][1] >= len(input_lines) - 1:
+        # A table of contents at the very end may gain or lose the final
+        # newline, so the last region runs to the end of both texts.
+        (start, _end, new_start, _new_end) = regions[-1]
+        regions[-1] = (start, len(input_lines), new_start, len(output_lines))
+    return regiondiff.unified_diff(
         input_lines,
         output_lines,
+        regions,
         fromfile=input_filename,
         tofile=output_filename,
         n=context_lines,
-        # TODO: Remove this if we start using readlines() to get input/output text.
         lineterm="",
     )
 
 
+def _keeps_newlines(newline):
+    """Tell whether output with `newline` leaves the input's newlines alone."""
+    if newline is None:
+        newline = os.linesep
+    return newline in {"", "\n"}
+
+
+def _translate_newlines(text, newline):
+    """Translate newlines in `text` the way `io.open()`:py:func: does on output."""
+    if _keeps_newlines(newline):
+        return text
+    if newline is None:
+        newline = os.linesep
+    if isinstance(text, bytes):
+        return text.replace(b"\n", newline.encode("ascii"))
+    return text.replace("\n", newline)
+
+
 def _add_file_arguments(parser):
     parser.add_argument(
         "input_filenames",
@@ -104,7 +251,10 @@ def _add_file_arguments(parser):
         action="store",
         default=[],
         metavar="INPUTFILE",
-        help="input file[s], or '-' for stdin (default: stdin)",
+        help=(
+            "input file[s] or director[ies], or '-' for stdin (default: stdin); "
+            "directories are searched recursively for Markdown files"
+        ),
     )
     parser.add_argument(
         "-o",
@@ -127,6 +277,257 @@ def _add_file_arguments(parser):
     )
 
 
+def _add_fsync_arguments(parser):
+    parser.add_argument(
+        "--fsync",
+        action="store",
+        choices=FSYNC_POLICIES,
+        default=DEFAULT_FSYNC,
+        help=(
+            "when used with '--inplace', when to flush updated files to disk: "
+            "'{never}' (leave it to the OS), '{file}' (each file as it is "
+            "written), or '{batch}' (every file written, all at once at the end) "
+            "(default: {default})"
+        ).format(
+            never=FSYNC_NEVER, file=FSYNC_FILE, batch=FSYNC_BATCH, default=DEFAULT_FSYNC
+        ),
+    )
+
+
+def _add_walk_arguments(parser):
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=None,
+        metavar="PATTERN",
+        help=(
+            "in input directories, process files matching PATTERN; may be repeated "
+            "(default: {default})"
+        ).format(default=" ".join(repr(x) for x in defaults.MARKDOWN_PATTERNS)),
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=None,
+        metavar="PATTERN",
+        help=(
+            "in input directories, skip files and directories matching PATTERN; "
+            "may be repeated"
+        ),
+    )
+    parser.add_argument(
+        "--no-gitignore",
+        dest="use_gitignore",
+        action="store_false",
+        default=True,
+        help="in input directories, do not skip files ignored by '.gitignore'",
+    )
+
+
+def _add_git_arguments(parser):
+    git_mutex_group = parser.add_mutually_exclusive_group()
+    git_mutex_group.add_argument(
+        "--staged",
+        action="store_true",
+        default=False,
+        help=(
+            "update in place the Markdown files added, copied, modified or "
+            "renamed in the git index (limited to INPUTFILEs, if any)"
+        ),
+    )
+    git_mutex_group.add_argument(
+        "--changed-since",
+        action="store",
+        default=None,
+        metavar="REF",
+        help=(
+            "update in place the Markdown files changed in git since the current "
+            "branch forked from REF, including uncommitted and untracked files "
+            "(limited to INPUTFILEs, if any)"
+        ),
+    )
+
+
+def _add_extract_arguments(parser):
+    parser.add_argument(
+        "--extract",
+        action="store",
+        choices=EXTRACT_FORMATS,
+        default=None,
+        help=(
+            "instead of adding a table of contents, write out the headings of "
+            "each input file: '{json}' gives one JSON object per file, listing "
+            "every heading's line number, level, text and anchor; '{markdown}' "
+            "gives just the entries of the table of contents"
+        ).format(json=EXTRACT_JSON, markdown=EXTRACT_MARKDOWN),
+    )
+
+
+def _add_stream_arguments(parser):
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=False,
+        help=(
+            "write output as input is read, buffering only what follows the "
+            "first table of contents token; conflicts with '--inplace'"
+        ),
+    )
+    parser.add_argument(
+        "--stream-buffer-size",
+        action="store",
+        type=int,
+        default=mdfile.DEFAULT_STREAM_BUFFER_SIZE,
+        metavar="N",
+        help=(
+            "when used with '--stream', spill buffered input to a temporary file "
+            "beyond N characters (default: {default})"
+        ).format(default=mdfile.DEFAULT_STREAM_BUFFER_SIZE),
+    )
+
+
+def _add_bytes_arguments(parser):
+    parser.add_argument(
+        "--bytes",
+        action="store_true",
+        default=False,
+        help=(
+            "read and write files as bytes, decoding only headings and table "
+            "of contents tokens, so that everything else is copied through "
+            "byte for byte, even if it is not valid in the locale's encoding "
+            "(which must be ASCII-compatible)"
+        ),
+    )
+
+
+def _add_jobs_arguments(parser):
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        default=None,
+        metavar="N",
+        help=(
+            "when used with '--inplace', process up to N files at a time "
+            "(default: number of usable CPUs)"
+        ),
+    )
+
+
+def _add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=False,
+        help=(
+            "when used with '--inplace', skip files already known to be up to date "
+            "(default cache file: {default})"
+        ).format(default=defaults.get_default_cache_path()),
+    )
+    parser.add_argument(
+        "--cache-file",
+        action="store",
+        default=None,
+        metavar="CACHEFILE",
+        help="use CACHEFILE as the cache (implies '--cache')",
+    )
+    parser.add_argument(
+        "--cache-size",
+        action="store",
+        type=int,
+        default=defaults.DEFAULT_CACHE_SIZE,
+        metavar="N",
+        help="keep at most N entries in the cache (default: {default})".format(
+            default=defaults.DEFAULT_CACHE_SIZE
+        ),
+    )
+
+
+def _add_link_arguments(parser):
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        default=False,
+        help=(
+            "when used with '--inplace', report links to missing headings "
+            "('#anchor' or 'other.md#anchor') in the files processed "
+            "(default index file: {default})"
+        ).format(default=defaults.get_default_link_index_path()),
+    )
+    parser.add_argument(
+        "--link-index",
+        action="store",
+        dest="link_index_file",
+        default=None,
+        metavar="INDEXFILE",
+        help="use INDEXFILE as the link index (implies '--check-links')",
+    )
+
+
+def _add_limit_arguments(parser):
+    parser.add_argument(
+        "--max-file-size",
+        action="store",
+        type=int,
+        default=None,
+        metavar="BYTES",
+        help="skip input files larger than BYTES, reporting each one as a failure",
+    )
+    parser.add_argument(
+        "--time-limit",
+        action="store",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help=(
+            "give up on any file that takes longer than SECONDS to process, "
+            "reporting it as a failure"
+        ),
+    )
+
+
+def _add_timing_arguments(parser):
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=False,
+        help=(
+            "report how long each phase of processing each file takes, "
+            "in wall-clock and CPU seconds, as JSON lines on stderr"
+        ),
+    )
+    parser.add_argument(
+        "--timings-file",
+        action="store",
+        default=None,
+        metavar="TIMINGSFILE",
+        help="write timings to TIMINGSFILE instead (implies '--timings')",
+    )
+    parser.add_argument(
+        "--slow-threshold",
+        action="store",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help=(
+            "when used with '--timings', only report files taking at least "
+            "SECONDS of wall-clock time"
+        ),
+    )
+    parser.add_argument(
+        "--profile-out",
+        action="store",
+        default=None,
+        metavar="PROFILEFILE",
+        help=(
+            "profile the whole run with cProfile and write the statistics to "
+            "PROFILEFILE (files processed by worker processes are not profiled; "
+            "use '-j 1' to include them)"
+        ),
+    )
+
+
 def _add_diff_arguments(parser):
     diff_mutex_group = parser.add_mutually_exclusive_group()
     diff_mutex_group.add_argument(
@@ -241,6 +642,17 @@ def _add_option_arguments(parser):
             "(default: use '-')"
         ),
     )
+    parser.add_argument(
+        "--anchor-style",
+        action="store",
+        choices=slugs.ANCHOR_STYLES,
+        default=slugs.DEFAULT_ANCHOR_STYLE,
+        help=(
+            "Make anchor links the way this site does, including for duplicate "
+            "headings; 'plain' keeps letters, numbers and '-' and leaves "
+            "duplicates alone (default: {default})"
+        ).format(default=slugs.DEFAULT_ANCHOR_STYLE),
+    )
     parser.add_argument(
         "-n",
         "--numbered",
@@ -281,6 +693,72 @@ def _add_pre_commit_arguments(parser):
         action="store_true",
         help="Shortcut for '--inplace --changed' with static default comment",
     )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        default=False,
+        help=(
+            "like '--inplace', but only report the files that would change, and "
+            "exit with status {changed} if there are any; nothing is written "
+            "(static default comment, as for '--pre-commit')"
+        ).format(changed=STATUS_CHANGED),
+    )
+
+
+def _add_watch_arguments(parser):
+    parser.add_argument(
+        "--watch",
+        action="append",
+        nargs="+",
+        default=None,
+        metavar="PATH",
+        help=(
+            "keep running, and update each file (or Markdown file under each "
+            "directory) in place whenever it changes"
+        ),
+    )
+    parser.add_argument(
+        "--watch-debounce",
+        action="store",
+        type=float,
+        default=DEFAULT_WATCH_DEBOUNCE,
+        metavar="SECONDS",
+        help=(
+            "when used with '--watch', wait for changes to settle for SECONDS "
+            "(default: {default})"
+        ).format(default=DEFAULT_WATCH_DEBOUNCE),
+    )
+
+
+def _add_serve_arguments(parser):
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        default=False,
+        help=(
+            "run as a daemon serving requests from 'markdown-toc-client' "
+            "(all other options are ignored)"
+        ),
+    )
+    parser.add_argument(
+        "--socket",
+        action="store",
+        dest="socket_path",
+        default=None,
+        metavar="SOCKETPATH",
+        help="when used with '--serve', listen on SOCKETPATH",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        action="store",
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT,
+        metavar="SECONDS",
+        help=(
+            "when used with '--serve', exit after SECONDS with no requests "
+            "(default: {default})"
+        ).format(default=DEFAULT_IDLE_TIMEOUT),
+    )
 
 
 def _add_completion_arguments(parser):
@@ -304,19 +782,38 @@ def _setup_args(argv):
             "Add or update a table of contents in one or more "
             "GitHub-flavored Markdown documents."
         ),
+        formatter_class=argparsing.HelpFormatter,
     )
 
     _add_file_arguments(parser)
+    _add_fsync_arguments(parser)
+    _add_walk_arguments(parser)
+    _add_git_arguments(parser)
+    _add_extract_arguments(parser)
+    _add_stream_arguments(parser)
+    _add_bytes_arguments(parser)
+    _add_jobs_arguments(parser)
+    _add_cache_arguments(parser)
+    _add_link_arguments(parser)
+    _add_limit_arguments(parser)
+    _add_timing_arguments(parser)
     _add_diff_arguments(parser)
     _add_newline_arguments(parser)
     _add_heading_arguments(parser)
     _add_option_arguments(parser)
     _add_comment_arguments(parser)
     _add_pre_commit_arguments(parser)
+    _add_watch_arguments(parser)
+    _add_serve_arguments(parser)
     _add_completion_arguments(parser)
     parser.add_argument("-V", "--version", action="version", version=get_version(prog))
 
-    argcomplete.autocomplete(parser)
+    # argcomplete is slow to import, and only needed when the shell is
+    # asking for completions.
+    if ARGCOMPLETE_ENV_VAR in os.environ:
+        import argcomplete
+
+        argcomplete.autocomplete(parser)
     args = parser.parse_args()
 
     return (prog, args)
@@ -336,16 +833,28 @@ def _normalize_path(path):
 
 def _check_input_and_output_filenames(cli_args):
     """Check args found by `argparse.ArgumentParser`:py:class: and regularize."""
-    if len(cli_args.input_filenames) == 0:
+    if len(cli_args.input_filenames) == 0 and not cli_args.selected_from_git:
         cli_args.input_filenames.append("-")  # default to stdin
 
-    if not cli_args.inplace:
+    cli_args.has_input_dirs = any(os.path.isdir(x) for x in cli_args.input_filenames)
+
+    if cli_args.extract is not None:
+        if cli_args.output_filename is None:
+            cli_args.output_filename = "-"  # default to stdout
+        output_filename = _normalize_path(cli_args.output_filename)
+        if output_filename != "-" and any(
+            _normalize_path(x) == output_filename for x in cli_args.input_filenames
+        ):
+            raise RuntimeError("output file is also an input file")
+    elif not cli_args.inplace:
         if cli_args.output_filename is None:
             cli_args.output_filename = "-"  # default to stdout
         if len(cli_args.input_filenames) > 1:
             raise RuntimeError(
                 "to process more than one input file at a time, use '--inplace'"
             )
+        if cli_args.has_input_dirs:
+            raise RuntimeError("to process a directory, use '--inplace'")
         output_filename = _normalize_path(cli_args.output_filename)
         input_filename = _normalize_path(cli_args.input_filenames[0])
         if input_filename != "-" and input_filename == output_filename:
@@ -369,6 +878,8 @@ def _check_completion_args(cli_args):
 
 
 def _do_completion(cli_args, prog):
+    from . import completion
+
     if cli_args.completion_help:
         print(completion.get_instructions(prog, ["--bash-completion"]))
     elif cli_args.bash_completion:
@@ -383,6 +894,21 @@ def _check_pre_commit_args(cli_args):
         cli_args.show_changed = True
 
 
+def _check_check_mode_args(cli_args):
+    if not cli_args.check:
+        return
+    if cli_args.output_filename is not None:
+        raise RuntimeError("output files do not make sense with '--check'")
+    if cli_args.watch is not None:
+        raise RuntimeError("'--check' does not make sense with '--watch'")
+    if cli_args.stream:
+        raise RuntimeError("'--check' does not make sense with '--stream'")
+    if cli_args.extract is not None:
+        raise RuntimeError("'--check' does not make sense with '--extract'")
+    # Files are read and compared as for '--inplace', just never written.
+    cli_args.inplace = True
+
+
 def _check_diff_args(cli_args):
     if cli_args.show_changed and not cli_args.inplace:
         raise RuntimeError("'-C/--show-changed' only makes sense with '--inplace'")
@@ -390,103 +916,921 @@ def _check_diff_args(cli_args):
         raise RuntimeError("'-D/--show-diff' only makes sense with '--inplace'")
 
 
+def _check_watch_args(cli_args):
+    if cli_args.watch is None:
+        return
+    cli_args.watch = [path for paths in cli_args.watch for path in paths]
+    if cli_args.input_filenames:
+        raise RuntimeError("input files do not make sense with '--watch'")
+    if cli_args.output_filename is not None:
+        raise RuntimeError("output files do not make sense with '--watch'")
+    cli_args.inplace = True
+
+
+def _check_git_args(cli_args):
+    cli_args.selected_from_git = cli_args.staged or cli_args.changed_since is not None
+    if not cli_args.selected_from_git:
+        return
+    if cli_args.watch is not None:
+        raise RuntimeError(
+            "'--staged' and '--changed-since' do not make sense with '--watch'"
+        )
+    if cli_args.output_filename is not None:
+        raise RuntimeError(
+            "output files do not make sense with '--staged' or '--changed-since'"
+        )
+    cli_args.inplace = True
+
+    from . import gitfiles, walk
+
+    pathspecs = cli_args.input_filenames
+    if cli_args.staged:
+        paths = gitfiles.get_staged_paths(pathspecs)
+    else:
+        paths = gitfiles.get_changed_paths(cli_args.changed_since, pathspecs)
+    finder = walk.FileFinder(include=cli_args.include, exclude=cli_args.exclude)
+    cli_args.input_filenames = [
+        path for (path, git_path) in paths if finder.is_selected(git_path)
+    ]
+
+
+def _check_fsync_args(cli_args):
+    if cli_args.fsync == FSYNC_NEVER:
+        return
+    if not cli_args.inplace:
+        raise RuntimeError("'--fsync' only makes sense with '--inplace'")
+    if cli_args.fsync == FSYNC_BATCH and sys.platform == "win32":
+        # Windows cannot flush a file opened only for reading, and files
+        # must not be reopened for writing just to flush them.
+        cli_args.fsync = FSYNC_FILE
+
+
+def _check_extract_args(cli_args):
+    if cli_args.extract is None:
+        return
+    if cli_args.inplace:
+        raise RuntimeError("'--extract' does not make sense with '--inplace'")
+    if cli_args.stream:
+        raise RuntimeError("'--extract' does not make sense with '--stream'")
+
+
+def _check_stream_args(cli_args):
+    if cli_args.stream and cli_args.inplace:
+        raise RuntimeError("'--stream' does not make sense with '--inplace'")
+
+
+def _check_jobs_args(cli_args):
+    if cli_args.jobs is None:
+        cli_args.jobs = _get_usable_cpu_count()
+    elif cli_args.jobs < 1:
+        raise RuntimeError("'-j/--jobs' must be at least 1")
+
+
+def _check_cache_args(cli_args):
+    if cli_args.cache_file is None and cli_args.cache:
+        cli_args.cache_file = defaults.get_default_cache_path()
+    if cli_args.cache_file is None:
+        return
+    if not cli_args.inplace:
+        raise RuntimeError("'--cache' only makes sense with '--inplace'")
+    if cli_args.cache_size < 1:
+        raise RuntimeError("'--cache-size' must be at least 1")
+    cli_args.cache_options_hash = _get_cache_options_hash(cli_args)
+
+
+def _check_link_args(cli_args):
+    if cli_args.link_index_file is None and cli_args.check_links:
+        cli_args.link_index_file = defaults.get_default_link_index_path()
+    if cli_args.link_index_file is None:
+        return
+    if cli_args.watch is not None:
+        raise RuntimeError("'--check-links' does not make sense with '--watch'")
+    if not cli_args.inplace:
+        raise RuntimeError("'--check-links' only makes sense with '--inplace'")
+    from . import cache
+
+    cli_args.link_options_hash = cache.hash_options(
+        [get_version(), cli_args.heading_text, cli_args.anchor_style]
+    )
+
+
+def _check_bytes_args(cli_args):
+    cli_args.encoding = None
+    if not cli_args.bytes:
+        return
+    if cli_args.link_index_file is not None:
+        raise RuntimeError("'--bytes' does not work with '--check-links'")
+    if cli_args.stream and not _keeps_newlines(NEWLINE_VALUES[cli_args.newlines]):
+        raise RuntimeError(
+            "'--bytes' with '--stream' does not translate newlines; "
+            "use '--newlines {}'".format(NEWLINE_FORMAT_LINUX)
+        )
+    import locale
+
+    encoding = locale.getpreferredencoding(False)
+    # Lines are classified by their ASCII bytes, before anything is decoded.
+    sample = "[{toc}]: #\n".format(toc=mdfile.LABEL_TOC)
+    if sample.encode(encoding) != sample.encode("ascii"):
+        raise RuntimeError(
+            "'--bytes' needs an ASCII-compatible encoding, not {}".format(encoding)
+        )
+    cli_args.encoding = encoding
+
+
+def _check_limit_args(cli_args):
+    if cli_args.max_file_size is not None and cli_args.max_file_size < 0:
+        raise RuntimeError("'--max-file-size' must not be negative")
+    if cli_args.time_limit is not None:
+        if cli_args.time_limit <= 0:
+            raise RuntimeError("'--time-limit' must be positive")
+        from . import timing
+
+        if not timing.can_limit_time():
+            raise RuntimeError("'--time-limit' is not supported on this platform")
+
+
+def _check_timing_args(cli_args):
+    if cli_args.timings_file is None and cli_args.timings:
+        cli_args.timings_file = "-"  # stderr
+    if cli_args.slow_threshold < 0:
+        raise RuntimeError("'--slow-threshold' must not be negative")
+
+
+def _get_cache_options_hash(cli_args):
+    """Hash every option that affects the output of a file."""
+    from . import cache
+
+    return cache.hash_options(
+        [
+            get_version(),
+            cli_args.heading_text,
+            cli_args.heading_level,
+            cli_args.skip_level,
+            cli_args.numbered,
+            cli_args.alt_list_char,
+            cli_args.add_trailing_heading_chars,
+            cli_args.anchor_style,
+            cli_args.newlines,
+            cli_args.comment,
+        ]
+    )
+
+
 def _set_default_comment(cli_args, prog, argv):
     if cli_args.comment is not None:
         return
+    # A comment that changes from run to run would make every file look stale.
     cli_args.comment = (
         _generate_comment(prog, argv, suffix=" pre-commit hook")
-        if cli_args.pre_commit
+        if cli_args.pre_commit or cli_args.check
         else _generate_comment(prog, argv, with_full_command=True, with_datestamp=True)
     )
 
 
-def main(*argv):
-    """Do the thing."""
-    (prog, args) = _setup_args(argv)
+_result_caches = {}
 
-    if _check_completion_args(args):
-        _do_completion(args, prog)
-        return STATUS_SUCCESS
-
-    _check_pre_commit_args(args)
-    _check_diff_args(args)
-    _check_newlines(args)
-    _check_input_and_output_filenames(args)
-    _set_default_comment(args, prog, argv)
 
-    overall_status = STATUS_SUCCESS
+def _get_result_cache(args):
+    """Get this process's connection to the result cache, if any."""
+    if args.cache_file is None:
+        return None
+    # Connections must not be shared with forked worker processes.
+    key = (os.getpid(), args.cache_file)
+    if key not in _result_caches:
+        from . import cache
 
-    for input_filename in args.input_filenames:
-        file_status = STATUS_SUCCESS
-        input_iofile = iofile.TextIOFile(
-            input_filename,
-            input_newline="",
-            output_newline=NEWLINE_VALUES[args.newlines],
-        )
-        output_iofile = (
-            input_iofile
-            if args.inplace
-            else iofile.TextIOFile(
-                args.output_filename,
-                input_newline="",
-                output_newline=NEWLINE_VALUES[args.newlines],
-            )
+        _result_caches[key] = cache.ResultCache(
+            args.cache_file, max_entries=args.cache_size
         )
+    return _result_caches[key]
+
+
+_link_indexes = {}
 
-        input_iofile.open_for_input()
+
+def _get_link_index(args):
+    """Get this process's connection to the link index."""
+    # Connections must not be shared with forked worker processes.
+    key = (os.getpid(), args.link_index_file)
+    if key not in _link_indexes:
+        from . import links
+
+        _link_indexes[key] = links.LinkIndex(args.link_index_file)
+    return _link_indexes[key]
+
+
+def _make_iofile(args, path, output_newline=None, atomic=False, fsync=False):
+    """Make the IOFile for `path`: binary with '--bytes', otherwise text."""
+    if args.encoding is not None:
+        return iofile.BinaryIOFile(path, atomic=atomic, fsync=fsync)
+    return iofile.TextIOFile(
+        path,
+        input_newline="",
+        output_newline=output_newline,
+        atomic=atomic,
+        fsync=fsync,
+    )
+
+
+def _parse_file(args, input_filename):
+    """Read and parse an input file as it is, without changing it."""
+    input_iofile = iofile.TextIOFile(input_filename, input_newline="")
+    input_iofile.open_for_input()
+    try:
         md = mdfile.MarkdownFile(
             infile=input_iofile.file, infilename=input_iofile.printable_name
         )
+        md.parse(
+            heading_text=args.heading_text,
+            heading_level=args.heading_level,
+            skip_level=args.skip_level,
+        )
+    finally:
+        input_iofile.close()
+    return md
 
-        try:
-            input_text = md.read()
-            md.parse(
-                heading_text=args.heading_text,
-                heading_level=args.heading_level,
-                skip_level=args.skip_level,
-            )
-        except (TypeError, ValueError) as e:
-            if not args.inplace:
-                raise SystemExit(e)
-            overall_status = STATUS_FAILURE
-            file_status = STATUS_FAILURE
-            print(e, file=sys.stderr)
 
+def _parse_text(args, text, filename):
+    """Parse Markdown `text` in memory."""
+    import io
+
+    md = mdfile.MarkdownFile(infile=io.StringIO(text), infilename=filename)
+    md.parse(
+        heading_text=args.heading_text,
+        heading_level=args.heading_level,
+        skip_level=args.skip_level,
+    )
+    return md
+
+
+def _get_link_entry(args, path, md=None):
+    """
+    Get the link entry for a file, re-indexing it only if it has changed.
+
+    :Args:
+        args
+            The command-line arguments
+
+        path
+            The normalized path to the file
+
+        md
+            (optional) The file, already parsed, as it now is on disk
+
+    :Returns:
+        The link entry (see `~markdown_toc.links.make_link_entry()`:py:func:),
+        or `None` if the file cannot be read or parsed
+    """
+    link_index = _get_link_index(args)
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    entry = link_index.lookup(path, stat_result, args.link_options_hash)
+    if entry is None:
+        if md is None:
+            try:
+                md = _parse_file(args, path)
+            except (iofile.IOFileError, TypeError, ValueError):
+                return None
+        from . import links
+
+        entry = links.make_link_entry(md, args.anchor_style)
+        link_index.store(path, stat_result, args.link_options_hash, entry)
+    return entry
+
+
+def _get_link_details(args, input_filename, timer, md=None):
+    """Get the details about links `_process_file()` returns for a file."""
+    if args.link_index_file is None:
+        return {}
+    timer.start("links")
+    path = _normalize_path(input_filename)
+    entry = _get_link_entry(args, path, md=md)
+    if entry is None:
+        return {}
+    return {DETAIL_LINK_ENTRY: (input_filename, path, entry)}
+
+
+def _stream_file(args, input_filename, timer):
+    """Stream a single input file to the output file; see `_process_file()`."""
+    timer.start("stream")
+    input_iofile = _make_iofile(args, input_filename)
+    output_iofile = _make_iofile(
+        args, args.output_filename, output_newline=NEWLINE_VALUES[args.newlines]
+    )
+    input_iofile.open_for_input()
+    output_iofile.open_for_output()
+    md = mdfile.MarkdownFile(
+        infile=input_iofile.file,
+        infilename=input_iofile.printable_name,
+        outfile=output_iofile.file,
+        encoding=args.encoding,
+    )
+    try:
+        md.stream(
+            heading_text=args.heading_text,
+            heading_level=args.heading_level,
+            skip_level=args.skip_level,
+            numbered=args.numbered,
+            toc_comment=args.comment,
+            alt_list_char=args.alt_list_char,
+            add_trailing_heading_chars=args.add_trailing_heading_chars,
+            max_buffer_size=args.stream_buffer_size,
+            anchor_style=args.anchor_style,
+        )
+    except (TypeError, ValueError) as e:
+        raise SystemExit(e)
+    finally:
+        output_iofile.close()
         input_iofile.close()
+    return (STATUS_SUCCESS, [], {})
+
 
+def _format_file_error(input_filename, error):
+    """Describe `error`, raised while processing `input_filename`."""
+    if isinstance(error, iofile.IOFileError):
+        return str(error)
+    return "{filename}: {message}".format(
+        filename=error.filename or input_filename,
+        message=error.strerror or str(error),
+    )
+
+
+def _process_file(args, input_filename):
+    """
+    Add or update the table of contents in a single input file.
+
+    :Returns:
+        A tuple (`file_status`, `messages`, `details`), where `messages` is a
+        list of (`stream_name`, `text`) tuples to print, in order, once the
+        file is done (see `_print_messages()`:py:func:), and `details` is a
+        dict of anything else about the file that options asked for, keyed
+        by ``DETAIL_*`` constants.
+    """
+    from . import timing
+
+    timer = timing.NULL_TIMER if args.timings_file is None else timing.PhaseTimer()
+    try:
+        with timing.time_limit(args.time_limit):
+            (file_status, messages, details) = _update_file(
+                args, input_filename, timer
+            )
+    except timing.TimeLimitExceeded:
+        file_status = STATUS_FAILURE
+        messages = [
+            (
+                STDERR,
+                "Skipped {filename}: took longer than {seconds:g} seconds".format(
+                    filename=input_filename, seconds=args.time_limit
+                ),
+            )
+        ]
+        details = {}
+    except (OSError, iofile.IOFileError) as e:
+        # A file that cannot be read or written fails on its own, and the
+        # rest are still processed, whether or not they are done in parallel.
+        file_status = STATUS_FAILURE
+        messages = [(STDERR, _format_file_error(input_filename, e))]
+        details = {}
+    if timer is not timing.NULL_TIMER:
+        timer.stop()
+        details[DETAIL_TIMINGS] = timer.get_record(input_filename, file_status)
+    return (file_status, messages, details)
+
+
+def _update_file(args, input_filename, timer):
+    """Do the work of `_process_file()`, timing each phase with `timer`."""
+    if args.max_file_size is not None and input_filename != "-":
+        if os.stat(input_filename).st_size > args.max_file_size:
+            message = "Skipped {filename}: larger than {size} bytes".format(
+                filename=input_filename, size=args.max_file_size
+            )
+            # Skipped files may be stale, so they must not pass silently.
+            return (STATUS_FAILURE, [(STDERR, message)], {})
+
+    if args.stream:
+        return _stream_file(args, input_filename, timer)
+
+    file_status = STATUS_SUCCESS
+    messages = []
+
+    # A file with no table of contents token, and no newlines to change, is
+    # already up to date; finding that out needs no decoding or parsing.
+    timer.start("prescan")
+    if (
+        args.inplace
+        and _keeps_newlines(NEWLINE_VALUES[args.newlines])
+        and not mdfile.file_has_toc_token(input_filename)
+    ):
+        return (file_status, messages, _get_link_details(args, input_filename, timer))
+
+    result_cache = _get_result_cache(args)
+    if result_cache is not None:
+        from . import cache
+
+        timer.start("cache")
+        cache_path = _normalize_path(input_filename)
+        options_hash = args.cache_options_hash
+        if result_cache.lookup_stat(cache_path, os.stat(input_filename), options_hash):
+            return (
+                file_status,
+                messages,
+                _get_link_details(args, input_filename, timer),
+            )
+
+    timer.start("read")
+    input_iofile = _make_iofile(
+        args,
+        input_filename,
+        output_newline=NEWLINE_VALUES[args.newlines],
+        atomic=(args.inplace and not args.check),
+        fsync=(args.fsync == FSYNC_FILE),
+    )
+    if args.inplace:
+        output_iofile = input_iofile
+    elif args.extract is None:
+        output_iofile = _make_iofile(
+            args, args.output_filename, output_newline=NEWLINE_VALUES[args.newlines]
+        )
+
+    input_iofile.open_for_input()
+    md = mdfile.MarkdownFile(
+        infile=input_iofile.file,
+        infilename=input_iofile.printable_name,
+        encoding=args.encoding,
+    )
+
+    try:
+        # A file that cannot be decoded fails like one that cannot be parsed.
+        input_text = md.read()
+
+        if result_cache is not None:
+            timer.start("cache")
+            content_hash = cache.hash_text(input_text)
+            if result_cache.lookup_content(
+                cache_path, os.stat(input_filename), content_hash, options_hash
+            ):
+                input_iofile.close()
+                return (
+                    file_status,
+                    messages,
+                    _get_link_details(args, input_filename, timer),
+                )
+
+        timer.start("parse")
+        md.parse(
+            heading_text=args.heading_text,
+            heading_level=args.heading_level,
+            skip_level=args.skip_level,
+        )
+    except (TypeError, ValueError) as e:
+        if not args.inplace and args.extract is None:
+            raise SystemExit(e)
+        file_status = STATUS_FAILURE
+        messages.append((STDERR, str(e)))
+
+    input_iofile.close()
+
+    details = {}
+    if args.extract is not None:
         if file_status != STATUS_FAILURE:
-            output_iofile.open_for_output()
+            timer.start("extract")
+            details[DETAIL_EXTRACT] = (md.filename, _extract(args, md))
+        return (file_status, messages, details)
+
+    is_written = False
+    if file_status != STATUS_FAILURE:
+        timer.start("render")
+        rendered_text = md.render(
+            numbered=args.numbered,
+            toc_comment=args.comment,
+            alt_list_char=args.alt_list_char,
+            add_trailing_heading_chars=args.add_trailing_heading_chars,
+            anchor_style=args.anchor_style,
+        )
+        output_text = _translate_newlines(rendered_text, NEWLINE_VALUES[args.newlines])
+        is_changed = input_text != output_text
 
-            md.write(
-                numbered=args.numbered,
-                toc_comment=args.comment,
-                alt_list_char=args.alt_list_char,
-                add_trailing_heading_chars=args.add_trailing_heading_chars,
-                outfile=output_iofile.file,
+        # In place, only touch files whose content actually changes.
+        if (is_changed or not args.inplace) and not args.check:
+            timer.start("write")
+            output_iofile.open_for_output()
+            try:
+                # Binary files do not translate newlines themselves.
+                output_iofile.file.write(
+                    rendered_text if args.encoding is None else output_text
+                )
+                output_iofile.close()
+            except BaseException:
+                output_iofile.discard()
+                raise
+            is_written = args.inplace
+
+        # A file left stale by '--check' is not known to be up to date.
+        if result_cache is not None and not (args.check and is_changed):
+            timer.start("cache")
+            result_cache.store(
+                cache_path,
+                os.stat(input_filename),
+                cache.hash_text(output_text),
+                options_hash,
             )
 
-            output_iofile.close()
-
-            if args.inplace and (args.show_changed or args.show_diff):
-                output_iofile.open_for_input()
-                output_text = output_iofile.file.read()
-                if input_text != output_text:
-                    file_status = STATUS_CHANGED
-                    if overall_status != STATUS_FAILURE:
-                        overall_status = file_status
-                    print(
-                        "Updated {}".format(output_iofile.file.name),
-                        file=sys.stderr,
+        if args.link_index_file is not None:
+            # Links and anchors are indexed as the file now is on disk.
+            timer.start("links")
+            final_md = (
+                _parse_text(args, rendered_text, md.filename)
+                if is_changed and not args.check
+                else md
+            )
+            details = _get_link_details(args, input_filename, timer, md=final_md)
+
+        if (
+            args.inplace
+            and is_changed
+            and (args.check or args.show_changed or args.show_diff)
+        ):
+            file_status = STATUS_CHANGED
+            template = "Would update {}" if args.check else "Updated {}"
+            messages.append(
+                (STDERR, template.format(output_iofile.printable_name))
+            )
+            if args.show_diff:
+                timer.start("diff")
+                rendered_ranges = (
+                    md.get_rendered_ranges()
+                    if _keeps_newlines(NEWLINE_VALUES[args.newlines])
+                    else None
+                )
+                (diff_input_text, diff_output_text) = (input_text, output_text)
+                if args.encoding is not None:
+                    (diff_input_text, diff_output_text) = (
+                        x.decode(args.encoding, "replace")
+                        for x in (input_text, output_text)
                     )
-                    if args.show_diff:
-                        for line in _compute_diff(
-                            output_iofile.file.name, input_text, output_text
-                        ):
-                            print(line)
-                output_iofile.close()
+                for line in _compute_diff(
+                    output_iofile.printable_name,
+                    diff_input_text,
+                    diff_output_text,
+                    rendered_ranges=rendered_ranges,
+                ):
+                    messages.append((STDOUT, line))
+
+    if is_written and args.fsync == FSYNC_BATCH:
+        details[DETAIL_WRITTEN] = os.path.realpath(input_filename)
+    return (file_status, messages, details)
+
+
+def _extract(args, md):
+    """Extract the headings of a parsed file, as text to write out."""
+    if args.extract == EXTRACT_JSON:
+        import json
+
+        headings = [
+            {"line": line_number, "level": level, "text": text, "anchor": anchor}
+            for (line_number, level, text, anchor) in md.get_outline(
+                args.anchor_style
+            )
+        ]
+        # With '--bytes', heading texts keep their bytes rather than becoming
+        # escaped surrogates; see `_ExtractWriter`:py:class:.
+        return (
+            json.dumps(
+                {"file": md.filename, "headings": headings},
+                ensure_ascii=(args.encoding is None),
+            )
+            + "\n"
+        )
+    lines = md.toc.format_entries(
+        numbered=args.numbered,
+        alt_list_char=args.alt_list_char,
+        anchor_style=args.anchor_style,
+    )
+    return "".join(x + "\n" for x in lines)
+
+
+def _print_messages(messages):
+    for (stream_name, text) in messages:
+        print(text, file=(sys.stderr if stream_name == STDERR else sys.stdout))
+
+
+def _combine_status(overall_status, file_status):
+    if STATUS_FAILURE in {overall_status, file_status}:
+        return STATUS_FAILURE
+    if STATUS_CHANGED in {overall_status, file_status}:
+        return STATUS_CHANGED
+    return STATUS_SUCCESS
+
+
+def _get_file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _get_input_filenames(args):
+    """Get the input files, finding those under input directories lazily."""
+    if not args.has_input_dirs:
+        return args.input_filenames
+    from . import walk
+
+    return walk.iter_files(
+        args.input_filenames,
+        include=args.include,
+        exclude=args.exclude,
+        use_gitignore=args.use_gitignore,
+    )
+
+
+def _process_files_serially(args):
+    for input_filename in _get_input_filenames(args):
+        yield _process_file(args, input_filename)
+
+
+def _process_found_files_in_parallel(args):
+    """
+    Process files as they are found under input directories.
+
+    Each file is handed to the pool of `args.jobs` worker processes as soon
+    as it is found, with a bounded number waiting; results are yielded in
+    the order the files were found.
+    """
+    import collections
+    import concurrent.futures
+
+    max_pending = args.jobs * PENDING_FILES_PER_JOB
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        pending = collections.deque()
+        for input_filename in _get_input_filenames(args):
+            pending.append(pool.submit(_process_file, args, input_filename))
+            while pending and (len(pending) >= max_pending or pending[0].done()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _process_files_in_parallel(args):
+    """
+    Process input files using a pool of `args.jobs` worker processes.
+
+    Files are handed out largest first, so that one big file started last
+    does not hold up the whole run; results are yielded in input order.
+    """
+    import concurrent.futures
+
+    input_filenames = args.input_filenames
+    max_workers = min(args.jobs, len(input_filenames))
+    largest_first = sorted(
+        range(len(input_filenames)),
+        key=lambda i: _get_file_size(input_filenames[i]),
+        reverse=True,
+    )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [None] * len(input_filenames)
+        for i in largest_first:
+            futures[i] = pool.submit(_process_file, args, input_filenames[i])
+        for future in futures:
+            yield future.result()
+
+
+def _should_process_in_parallel(args):
+    if not (args.inplace or args.extract is not None) or args.jobs < 2:
+        return False
+    if args.has_input_dirs:
+        # Files found under directories are already deduplicated.
+        return True
+    if len(args.input_filenames) < 2:
+        return False
+    # Two workers must never rewrite the same file at once.
+    normalized_paths = {_normalize_path(x) for x in args.input_filenames}
+    return len(normalized_paths) == len(args.input_filenames)
+
+
+def _process_files(args):
+    """
+    Process all input files.
+
+    :Returns:
+        An iterator of (`file_status`, `messages`, `details`) tuples, one per
+        file; see `_process_file()`:py:func:
+    """
+    if _should_process_in_parallel(args):
+        if args.has_input_dirs:
+            return _process_found_files_in_parallel(args)
+        return _process_files_in_parallel(args)
+    return _process_files_serially(args)
+
+
+class _ExtractWriter(object):
+    """Write what `--extract` gets from each file to the output file."""
+
+    def __init__(self, args):
+        self.output_iofile = _make_iofile(
+            args, args.output_filename, output_newline=NEWLINE_VALUES[args.newlines]
+        )
+        self.output_iofile.open_for_output()
+        # With '--bytes', heading texts are encoded back to the bytes they
+        # were decoded from.
+        self.encoding = args.encoding
+        self.newline = NEWLINE_VALUES[args.newlines]
+        # Like head(1), mark where each file's table of contents starts when
+        # there is more than one.
+        self.with_names = args.extract == EXTRACT_MARKDOWN and (
+            args.has_input_dirs or len(args.input_filenames) > 1
+        )
+        self.count = 0
+
+    def write(self, name, text):
+        if self.with_names:
+            separator = "\n" if self.count > 0 else ""
+            text = "{separator}==> {name} <==\n{text}".format(
+                separator=separator, name=name, text=text
+            )
+        if self.encoding is not None:
+            text = _translate_newlines(text, self.newline).encode(
+                self.encoding, "surrogateescape"
+            )
+        self.output_iofile.file.write(text)
+        self.count += 1
+
+    def close(self):
+        self.output_iofile.close()
+
+
+def _sync_batch(written_paths):
+    """
+    Flush the files written in place to disk at once, for ``--fsync batch``.
+
+    :Args:
+        written_paths
+            A list of the paths in `DETAIL_WRITTEN` details, empty unless
+            ``--fsync batch`` was given
+    """
+    if written_paths:
+        iofile.fsync_files(written_paths)
+
+
+def _check_links(args, link_files):
+    """
+    Report broken links in the files processed.
+
+    :Args:
+        args
+            The command-line arguments
+
+        link_files
+            A list of (`input_filename`, `path`, `entry`) tuples, one for each
+            file processed, where `path` is normalized and `entry` is the
+            file's link entry
+
+    :Returns:
+        An exit status
+    """
+    entries = {path: entry for (_input_filename, path, entry) in link_files}
+
+    def get_entry(path):
+        if path in entries:
+            return entries[path]
+        # Files linked to, but not processed, are indexed on demand.
+        return _get_link_entry(args, path) if os.path.isfile(path) else None
+
+    from . import links
+
+    checker = links.LinkChecker(get_entry)
+    status = STATUS_SUCCESS
+    for (input_filename, path, entry) in link_files:
+        for (line_number, target, reason) in checker.find_broken_links(path, entry):
+            status = STATUS_FAILURE
+            print(
+                "{filename}:{line_number}: broken link to {target}: {reason}".format(
+                    filename=input_filename,
+                    line_number=line_number,
+                    target=target,
+                    reason=reason,
+                ),
+                file=sys.stderr,
+            )
+    return status
+
+
+def _watch_files(args, timings_writer):
+    from . import walk, watch
+
+    def process_file(path):
+        (_file_status, messages, details) = _process_file(args, path)
+        _sync_batch([details[DETAIL_WRITTEN]] if DETAIL_WRITTEN in details else [])
+        _print_messages(messages)
+        if timings_writer is not None:
+            timings_writer.write(details[DETAIL_TIMINGS])
+
+    finder = walk.FileFinder(
+        include=args.include, exclude=args.exclude, use_gitignore=args.use_gitignore
+    )
+    watch.watch(args.watch, process_file, debounce=args.watch_debounce, finder=finder)
+    return STATUS_SUCCESS
+
+
+def _run(args, prog, argv):
+    """Check the remaining arguments, and process the files."""
+    _check_pre_commit_args(args)
+    _check_check_mode_args(args)
+    _check_watch_args(args)
+    _check_git_args(args)
+    _check_diff_args(args)
+    _check_fsync_args(args)
+    _check_stream_args(args)
+    _check_extract_args(args)
+    _check_jobs_args(args)
+    _check_newlines(args)
+    if args.watch is None:
+        _check_input_and_output_filenames(args)
+    _set_default_comment(args, prog, argv)
+    _check_cache_args(args)
+    _check_link_args(args)
+    _check_bytes_args(args)
+    _check_limit_args(args)
+    _check_timing_args(args)
+
+    timings_writer = None
+    if args.timings_file is not None:
+        from . import timing
+
+        timings_writer = timing.TimingsWriter(
+            args.timings_file, threshold=args.slow_threshold
+        )
+    try:
+        if args.watch is not None:
+            return _watch_files(args, timings_writer)
+
+        overall_status = STATUS_SUCCESS
+        link_files = []
+        written_paths = []
+        extract_writer = None if args.extract is None else _ExtractWriter(args)
+
+        for (file_status, messages, details) in _process_files(args):
+            _print_messages(messages)
+            overall_status = _combine_status(overall_status, file_status)
+            if DETAIL_EXTRACT in details:
+                (name, text) = details[DETAIL_EXTRACT]
+                extract_writer.write(name, text)
+            if DETAIL_LINK_ENTRY in details:
+                link_files.append(details[DETAIL_LINK_ENTRY])
+            if DETAIL_WRITTEN in details:
+                written_paths.append(details[DETAIL_WRITTEN])
+            if timings_writer is not None:
+                timings_writer.write(details[DETAIL_TIMINGS])
+
+        _sync_batch(written_paths)
+
+        if extract_writer is not None:
+            extract_writer.close()
+
+        if args.link_index_file is not None:
+            overall_status = _combine_status(
+                overall_status, _check_links(args, link_files)
+            )
+    finally:
+        if timings_writer is not None:
+            timings_writer.close()
 
     return overall_status
 
 
+def _run_profiled(args, prog, argv):
+    """Run under cProfile, writing the statistics to `args.profile_out`."""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return _run(args, prog, argv)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(args.profile_out)
+
+
+def main(*argv):
+    """Do the thing."""
+    (prog, args) = _setup_args(argv)
+
+    if _check_completion_args(args):
+        _do_completion(args, prog)
+        return STATUS_SUCCESS
+
+    if args.serve:
+        from . import server
+
+        return server.serve(
+            socket_path=args.socket_path, idle_timeout=args.idle_timeout
+        )
+
+    if args.profile_out is not None:
+        return _run_profiled(args, prog, argv)
+    return _run(args, prog, argv)
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Provide a thin client for a running ``markdown-toc --serve`` daemon.
+
+The client forwards its arguments, working directory and environment to the
+daemon, along with its own standard input, output and error file
+descriptors, so the daemon reads and writes them directly; the client then
+exits with the daemon's exit status.  If no daemon is listening, the client
+runs `~markdown_toc.cli`:py:mod: itself.
+
+This module is imported on every call, so it must stay cheap to import.
+"""
+
+import os
+import socket
+import struct
+import sys
+
+SOCKET_ENV_VAR = "MARKDOWN_TOC_SOCKET"
+SOCKET_BASENAME = "markdown-toc.sock"
+
+CLIENT_PROG = "markdown-toc"
+
+STDIO_FDS = [0, 1, 2]
+
+LENGTH_FORMAT = "!I"
+STATUS_FORMAT = "!i"
+
+####################
+
+
+def get_socket_dir():
+    """Get a directory, private to this user, to hold the daemon's socket."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return runtime_dir
+    return os.path.join("/tmp", "markdown-toc-{uid}".format(uid=os.getuid()))
+
+
+def get_socket_path():
+    """Get the path to the daemon's socket."""
+    socket_path = os.environ.get(SOCKET_ENV_VAR)
+    if socket_path:
+        return socket_path
+    return os.path.join(get_socket_dir(), SOCKET_BASENAME)
+
+
+def encode_request(argv, cwd, environ):
+    """Encode a request as NUL-separated fields."""
+    fields = [cwd, str(len(argv))]
+    fields.extend(argv)
+    for (name, value) in environ.items():
+        fields.append("{name}={value}".format(name=name, value=value))
+    return b"\0".join(os.fsencode(x) for x in fields)
+
+
+def decode_request(data):
+    """
+    Decode a request encoded by `encode_request()`:py:func:.
+
+    :Returns:
+        A tuple (`argv`, `cwd`, `environ`)
+    """
+    fields = [os.fsdecode(x) for x in data.split(b"\0")]
+    cwd = fields[0]
+    argc = int(fields[1])
+    environ_start = 2 + argc
+    argv = fields[2:environ_start]
+    environ = dict(x.split("=", 1) for x in fields[environ_start:])
+    return (argv, cwd, environ)
+
+
+def recv_exactly(sock, size):
+    """Receive exactly `size` bytes from `sock`, or fewer if it is closed."""
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+####################
+
+
+def _connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _run_locally(argv):
+    from . import cli
+
+    sys.argv = argv
+    return cli.main(*argv)
+
+
+def run(argv):
+    """
+    Run markdown-toc with `argv` via the daemon, if one is listening.
+
+    :Returns:
+        The exit status
+    """
+    argv = [CLIENT_PROG] + list(argv[1:])
+    sock = _connect(get_socket_path())
+    if sock is None:
+        return _run_locally(argv)
+    with sock:
+        request = encode_request(argv, os.getcwd(), os.environ)
+        # The file descriptors ride along with the (fixed-size) length.
+        sock.sendmsg(
+            [struct.pack(LENGTH_FORMAT, len(request))],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, struct.pack("3i", *STDIO_FDS))],
+        )
+        sock.sendall(request)
+        reply = recv_exactly(sock, struct.calcsize(STATUS_FORMAT))
+    if len(reply) != struct.calcsize(STATUS_FORMAT):
+        print("{}: lost connection to daemon".format(argv[0]), file=sys.stderr)
+        return 1
+    (status,) = struct.unpack(STATUS_FORMAT, reply)
+    return status
+
+
+def main():
+    """Provide the client entry point."""
+    sys.exit(run(sys.argv))
+
+
+if __name__ == "__main__":
+    main()
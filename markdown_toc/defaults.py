@@ -0,0 +1,44 @@
+"""
+Provide the default options shared by the command line and the library.
+
+This module imports nothing but `os`:py:mod:, so `~markdown_toc.api`:py:mod:
+can use the command line's defaults without importing
+`~markdown_toc.cli`:py:mod:, and the command line can describe its defaults
+without importing the modules that use them.
+"""
+
+import os.path
+
+DEFAULT_HEADING_TEXT = "Contents"
+DEFAULT_HEADING_LEVEL = 1
+DEFAULT_ADD_TRAILING_HEADING_CHARS = False
+DEFAULT_ALT_LIST_CHAR = False
+DEFAULT_NUMBERED = False
+DEFAULT_SKIP_LEVEL = 0
+
+MARKDOWN_PATTERNS = ["*.md", "*.markdown"]
+
+DEFAULT_CACHE_SIZE = 100000
+CACHE_DIRNAME = "markdown-toc"
+CACHE_BASENAME = "results.sqlite3"
+LINK_INDEX_BASENAME = "links.sqlite3"
+
+####################
+
+
+def get_cache_dir():
+    """Get the directory that caches and indexes are kept in by default."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, CACHE_DIRNAME)
+
+
+def get_default_cache_path():
+    """Get the default location of the cache file."""
+    return os.path.join(get_cache_dir(), CACHE_BASENAME)
+
+
+def get_default_link_index_path():
+    """Get the default location of the link index file."""
+    return os.path.join(get_cache_dir(), LINK_INDEX_BASENAME)
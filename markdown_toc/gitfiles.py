@@ -0,0 +1,141 @@
+"""
+Get the files to process from a local git repository.
+
+Only the local repository is consulted; nothing is fetched.
+"""
+
+import os
+import os.path
+import subprocess
+
+GIT = "git"
+
+# Added, copied, modified or renamed: files that exist afterwards.
+DIFF_FILTER = "ACMR"
+
+####################
+
+
+def _run_git(args):
+    """
+    Run git and return its standard output.
+
+    :Raises:
+        `RuntimeError`:py:exc: if git cannot be run or fails
+    """
+    command = [GIT] + args
+    try:
+        result = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+    except OSError as e:
+        raise RuntimeError("cannot run {git}: {e}".format(git=GIT, e=e))
+    if result.returncode != 0:
+        raise RuntimeError(
+            "'{command}' failed: {message}".format(
+                command=" ".join(command),
+                message=os.fsdecode(result.stderr).strip(),
+            )
+        )
+    return result.stdout
+
+
+def _split_paths(output):
+    return [os.fsdecode(x) for x in output.split(b"\0") if x]
+
+
+def _get_top_level():
+    return os.fsdecode(_run_git(["rev-parse", "--show-toplevel"]).rstrip(b"\n"))
+
+
+def _to_local_paths(top_level, git_paths):
+    """
+    Convert paths relative to the top of the repository to ones usable here.
+
+    :Returns:
+        A list of (`path`, `git_path`) tuples for files that exist, where
+        `path` is relative to the current directory if it is below it
+    """
+    cwd_prefix = os.getcwd() + os.sep
+    rel_start = len(cwd_prefix)
+    paths = []
+    for git_path in git_paths:
+        path = os.path.join(top_level, git_path)
+        if not os.path.isfile(path):
+            continue
+        if path.startswith(cwd_prefix):
+            path = path[rel_start:]
+        paths.append((path, git_path))
+    return paths
+
+
+def get_staged_paths(pathspecs=None):
+    """
+    Get the files added, copied, modified or renamed in the git index.
+
+    :Args:
+        pathspecs
+            (optional) Paths (or git pathspecs) to limit the files to
+
+    :Returns:
+        A list of (`path`, `git_path`) tuples, where `path` is usable from
+        the current directory and `git_path` is relative to the top of the
+        repository
+    """
+    output = _run_git(
+        [
+            "diff",
+            "--cached",
+            "--name-only",
+            "-z",
+            "-M",
+            "--diff-filter=" + DIFF_FILTER,
+            "--",
+        ]
+        + list(pathspecs or [])
+    )
+    return _to_local_paths(_get_top_level(), _split_paths(output))
+
+
+def get_changed_paths(ref, pathspecs=None):
+    """
+    Get the files changed since `ref` branched off, including untracked ones.
+
+    Changes are those between the merge base of `ref` and ``HEAD`` and the
+    working tree, so they include commits on the current branch, staged and
+    unstaged changes, and new files not ignored by git.
+
+    :Args:
+        ref
+            A commit, branch or tag
+
+        pathspecs
+            (optional) Paths (or git pathspecs) to limit the files to
+
+    :Returns:
+        See `get_staged_paths()`:py:func:
+    """
+    pathspecs = list(pathspecs or [])
+    merge_base = os.fsdecode(_run_git(["merge-base", ref, "HEAD"]).strip())
+    changed_output = _run_git(
+        [
+            "diff",
+            "--name-only",
+            "-z",
+            "-M",
+            "--diff-filter=" + DIFF_FILTER,
+            merge_base,
+            "--",
+        ]
+        + pathspecs
+    )
+    # Unlike diff, ls-files only looks below the current directory by default.
+    untracked_output = _run_git(
+        ["ls-files", "-z", "--others", "--exclude-standard", "--full-name", "--"]
+        + (pathspecs or [":/"])
+    )
+    git_paths = _split_paths(changed_output) + _split_paths(untracked_output)
+    return _to_local_paths(_get_top_level(), git_paths)
@@ -3,8 +3,13 @@ Provide IOFile class and related exceptions.
 """
 
 import io
+import os
+import os.path
+import stat
 import sys
 
+TEMP_FILE_SUFFIX = ".tmp"
+
 
 class IOFileError(Exception):
     """
@@ -48,6 +53,42 @@ class IOFileOpenError(IOFileError):
         super(IOFileOpenError, self).__init__(path, message)
 
 
+def _fsync_dir(dir_path):
+    """Make the entries in `dir_path` durable, where the platform allows it."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(dir_path or os.curdir, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_files(paths):
+    """
+    Flush files that are already written and closed to disk, with their directories.
+
+    Each directory is flushed once, however many of the files are in it.
+
+    :Args:
+        paths
+            An iterable of paths to the files
+    """
+    dir_paths = set()
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue  # Gone since it was written; nothing left to flush
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        dir_paths.add(os.path.dirname(path))
+    for dir_path in sorted(dir_paths):
+        _fsync_dir(dir_path)
+
+
 class IOFile(object):
     """
     Provide object model for files that should be read, then written in place.
@@ -55,13 +96,28 @@ class IOFile(object):
     :Args:
         path
             The path to the file to open for input or output
+
+        atomic
+            (optional) Whether to write an existing file by writing a
+            temporary file beside it, then renaming that over it, so that
+            the file is never seen partly written; the file's permissions
+            are kept, but any other hard links to it are not updated.  If no
+            temporary file can be made there (say, the directory is
+            read-only), the file is written in place instead
+
+        fsync
+            (optional) Whether to flush output to disk before closing it
     """
 
-    def __init__(self, path):
+    def __init__(self, path, atomic=False, fsync=False):
         self.path = path
         self.mode = None
         self.file = None
         self.printable_name = path
+        self.atomic = atomic
+        self.fsync = fsync
+        self._temp_path = None
+        self._target_path = None
 
         self._io_properties = {
             "input": {
@@ -110,6 +166,58 @@ class IOFile(object):
         """
         raise IOFileOpenError(path=self.path, mode=self.mode, purpose=purpose)
 
+    def _make_temp_file(self):
+        """
+        Make a temporary file to be renamed over `self.path`:py:attr:.
+
+        The temporary file is in the same directory as the file it replaces
+        (following any symbolic link), so that the rename is atomic, and it
+        gets the same permissions (and, if possible, owner).
+
+        :Returns:
+            An open file descriptor for the temporary file, or `None` if
+            `self.path`:py:attr: does not exist yet or its directory is not
+            writable
+        """
+        import tempfile
+
+        target_path = os.path.realpath(self.path)
+        try:
+            stat_result = os.stat(target_path)
+        except FileNotFoundError:
+            return None
+        (target_dir, target_name) = os.path.split(target_path)
+        try:
+            (fd, temp_path) = tempfile.mkstemp(
+                dir=target_dir, prefix="." + target_name + ".", suffix=TEMP_FILE_SUFFIX
+            )
+        except PermissionError:
+            # A writable file in a read-only directory can still be updated,
+            # just not atomically.
+            return None
+        try:
+            os.chmod(temp_path, stat.S_IMODE(stat_result.st_mode))
+            if hasattr(os, "chown"):
+                try:
+                    os.chown(temp_path, stat_result.st_uid, stat_result.st_gid)
+                except OSError:
+                    pass  # Not allowed to give the file away; keep our own
+        except BaseException:
+            os.close(fd)
+            os.unlink(temp_path)
+            raise
+        self._temp_path = temp_path
+        self._target_path = target_path
+        return fd
+
+    def _get_file_to_open(self, purpose):
+        """Get the path or file descriptor to open for `purpose`."""
+        if purpose == "output" and self.atomic:
+            fd = self._make_temp_file()
+            if fd is not None:
+                return fd
+        return self.path
+
     def _open_for_purpose(self, purpose):
         """
         Open `self.file`:py:attr: for the given purpose.
@@ -134,7 +242,7 @@ class IOFile(object):
                     purpose, "stdio_printable_name"
                 )
             else:
-                self.file = open(self.path, target_mode)
+                self.file = open(self._get_file_to_open(purpose), target_mode)
             self.mode = target_mode
         return self.file
 
@@ -147,12 +255,46 @@ class IOFile(object):
         return self._open_for_purpose("output")
 
     def close(self):
-        """Close `self.file`:py:attr:."""
+        """
+        Close `self.file`:py:attr:.
+
+        Output written to a temporary file (see `atomic`) replaces the
+        original file only now.
+        """
         if self.file is not None:
             if self.path != "-":
+                is_output = self.mode == self._get_io_property("output", "target_mode")
+                if self.fsync and is_output:
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
                 self.file.close()
             self.file = None
             self.mode = None
+        if self._temp_path is not None:
+            os.replace(self._temp_path, self._target_path)
+            if self.fsync:
+                _fsync_dir(os.path.dirname(self._target_path))
+            self._temp_path = None
+            self._target_path = None
+
+    def discard(self):
+        """
+        Close `self.file`:py:attr:, abandoning any output to a temporary file.
+
+        The original file is left as it was.
+        """
+        if self._temp_path is None:
+            self.close()
+            return
+        try:
+            if self.file is not None:
+                self.file.close()
+        finally:
+            self.file = None
+            self.mode = None
+            os.unlink(self._temp_path)
+            self._temp_path = None
+            self._target_path = None
 
 
 class TextIOFile(IOFile):
@@ -170,10 +312,18 @@ class TextIOFile(IOFile):
         output_newline
             (optional) The newline convention used on output (see
             `io.open()`:py:meth:)
+
+        atomic
+            (optional) See `IOFile`:py:class:
+
+        fsync
+            (optional) See `IOFile`:py:class:
     """
 
-    def __init__(self, path, input_newline=None, output_newline=None):
-        super(TextIOFile, self).__init__(path)
+    def __init__(
+        self, path, input_newline=None, output_newline=None, atomic=False, fsync=False
+    ):
+        super(TextIOFile, self).__init__(path, atomic=atomic, fsync=fsync)
 
         self._io_properties["input"]["target_mode"] = "rt"
         self._io_properties["input"]["newline"] = input_newline
@@ -206,10 +356,36 @@ class TextIOFile(IOFile):
                 fileish = self._get_io_property(purpose, "stdio_stream").fileno()
                 closefd = False
             else:
-                fileish = self.path
+                fileish = self._get_file_to_open(purpose)
                 closefd = True
             self.file = io.open(
                 fileish, mode=target_mode, newline=newline, closefd=closefd
             )
             self.mode = target_mode
         return self.file
+
+
+class BinaryIOFile(IOFile):
+    """
+    Provide object model for files that should be read, then written in place, as bytes.
+
+    Nothing is decoded or translated on the way in or out.
+
+    :Args:
+        path
+            The path to the file to open for input or output
+
+        atomic
+            (optional) See `IOFile`:py:class:
+
+        fsync
+            (optional) See `IOFile`:py:class:
+    """
+
+    def __init__(self, path, atomic=False, fsync=False):
+        super(BinaryIOFile, self).__init__(path, atomic=atomic, fsync=fsync)
+
+        self._io_properties["input"]["target_mode"] = "rb"
+        self._io_properties["input"]["stdio_stream"] = sys.stdin.buffer
+        self._io_properties["output"]["target_mode"] = "wb"
+        self._io_properties["output"]["stdio_stream"] = sys.stdout.buffer
@@ -0,0 +1,316 @@
+"""
+Check that links to headings in Markdown files lead somewhere.
+
+Each file is indexed once, as it is processed, into a link entry: the
+anchor names its headings get (and any HTML ``name`` or ``id`` attributes),
+and the links it makes to anchors, either in the same file (``#section``)
+or in another Markdown file (``other.md#section``).  Entries are kept in a
+persistent index, keyed by (path, size, mtime), so a later run only
+re-indexes files that changed.  Once every file has an entry, each link is
+checked against the entry of the file it points to.
+
+Links are found with a cheap scan of text lines; code blocks and tables of
+contents are never scanned, and only lines that could hold a link are
+matched against a regex.
+"""
+
+import array
+import os
+import os.path
+import re
+import time
+
+from . import cache, mdfile, slugs
+
+MARKDOWN_SUFFIXES = (".md", ".markdown")
+
+# Kinds of lines that may hold links or anchors
+SCANNED_LINE_KINDS = frozenset([mdfile.LINE_TEXT, mdfile.LINE_HEADING])
+
+# Regexes are compiled on first use (see `_get_regex()`:py:func:), so that
+# importing this module stays cheap.
+INLINE_LINK_PATTERN = r"\]\(\s*<?([^\s)>]*)"
+REFERENCE_DEFINITION_PATTERN = r"^ {0,3}\[[^\]]+\]:\s*<?([^\s>]+)"
+HTML_ANCHOR_PATTERN = r"<[A-Za-z][^<>]*?\s(?:name|id)\s*=\s*[\"']([^\"'\s>]+)"
+CODE_SPAN_PATTERN = r"(`+)[^`].*?\1"
+URL_SCHEME_PATTERN = r"^[A-Za-z][-A-Za-z0-9+.]*:"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT NOT NULL,
+    options_hash TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    anchors TEXT NOT NULL,
+    link_line_numbers BLOB NOT NULL,
+    link_targets TEXT NOT NULL,
+    PRIMARY KEY (path, options_hash)
+);
+"""
+
+REASON_NO_FILE = "no such file"
+REASON_NO_ANCHOR = "no such anchor"
+
+####################
+
+_compiled_regexes = {}
+
+
+def _get_regex(pattern):
+    """Get `pattern` compiled, compiling it the first time."""
+    regex = _compiled_regexes.get(pattern)
+    if regex is None:
+        regex = _compiled_regexes[pattern] = re.compile(pattern)
+    return regex
+
+
+def _is_checked_target(target):
+    """Tell whether `target` links to an anchor in a local Markdown file."""
+    if "#" not in target or target.startswith("//"):
+        return False
+    if _get_regex(URL_SCHEME_PATTERN).match(target):
+        return False
+    path = target[: target.index("#")].split("?", 1)[0]
+    if not path:
+        return True
+    return not path.startswith("/") and path.lower().endswith(MARKDOWN_SUFFIXES)
+
+
+def extract_links(lines, line_kinds):
+    """
+    Find the links to anchors in a Markdown file.
+
+    :Returns:
+        A tuple (`line_numbers`, `targets`) of parallel sequences, with an
+        item per link, where each line number starts at 1 and each target
+        is the link as written, e.g. ``other.md#section`` or ``#section``
+    """
+    line_numbers = array.array("I")
+    targets = []
+    code_span_regex = _get_regex(CODE_SPAN_PATTERN)
+    inline_link_regex = _get_regex(INLINE_LINK_PATTERN)
+    reference_definition_regex = _get_regex(REFERENCE_DEFINITION_PATTERN)
+    for (line_index, (line, kind)) in enumerate(zip(lines, line_kinds)):
+        if kind not in SCANNED_LINE_KINDS or "#" not in line:
+            continue
+        if "](" not in line and "]:" not in line:
+            continue
+        if "`" in line:
+            line = code_span_regex.sub("", line)
+        line_targets = inline_link_regex.findall(line)
+        match = reference_definition_regex.match(line)
+        if match is not None:
+            line_targets.append(match.group(1))
+        for target in line_targets:
+            if _is_checked_target(target):
+                line_numbers.append(line_index + 1)
+                targets.append(target)
+    return (line_numbers, targets)
+
+
+def extract_html_anchors(lines, line_kinds):
+    """Find the anchor names set by HTML ``name`` and ``id`` attributes."""
+    anchors = []
+    html_anchor_regex = _get_regex(HTML_ANCHOR_PATTERN)
+    for (line, kind) in zip(lines, line_kinds):
+        if kind in SCANNED_LINE_KINDS and "<" in line:
+            anchors.extend(html_anchor_regex.findall(line))
+    return anchors
+
+
+def make_link_entry(md, anchor_style=slugs.DEFAULT_ANCHOR_STYLE):
+    """
+    Make the link entry for a parsed `~markdown_toc.mdfile.MarkdownFile`:py:class:.
+
+    Anchor names are those the document has once its tables of contents
+    are up to date, so the headings of tables of contents count too.
+
+    :Returns:
+        A tuple (`anchors`, `line_numbers`, `targets`), where `anchors` is a
+        list of anchor names, and `line_numbers` and `targets` are as for
+        `extract_links()`:py:func:
+    """
+    slugger = slugs.Slugger(anchor_style)
+    md.toc.get_anchor_names(anchor_style, slugger=slugger)
+    anchors = slugger.anchor_names
+    anchors.extend(extract_html_anchors(md.lines, md.line_kinds))
+    (line_numbers, targets) = extract_links(md.lines, md.line_kinds)
+    return (anchors, line_numbers, targets)
+
+
+def _split_lines(text):
+    return text.split("\n") if text else []
+
+
+def _unquote(text):
+    if "%" not in text:
+        return text
+    from urllib.parse import unquote
+
+    return unquote(text)
+
+
+class LinkChecker(object):
+    """
+    Check the links in a set of files.
+
+    Link targets are resolved lexically, the way a browser resolves a
+    relative URL, and each distinct target and each target file's anchor
+    names are worked out only once, however many links share them.
+
+    :Args:
+        get_entry
+            A callable taking the normalized path to a file and returning
+            its link entry, or `None` if there is no such file
+    """
+
+    def __init__(self, get_entry):
+        self.get_entry = get_entry
+        # Anchor names by target path, and by (directory, link path) pair
+        self._anchor_sets = {}
+        self._link_anchor_sets = {}
+
+    def _get_anchor_set(self, dir_path, link_path):
+        """Get the anchor names of the file `link_path` leads to from `dir_path`."""
+        path = os.path.normcase(
+            os.path.normpath(os.path.join(dir_path, _unquote(link_path)))
+        )
+        if path not in self._anchor_sets:
+            entry = self.get_entry(path)
+            self._anchor_sets[path] = None if entry is None else frozenset(entry[0])
+        anchors = self._anchor_sets[path]
+        self._link_anchor_sets[(dir_path, link_path)] = anchors
+        return anchors
+
+    def find_broken_links(self, path, entry):
+        """
+        Check the links in one file.
+
+        :Args:
+            path
+                The normalized path to the file
+
+            entry
+                The file's link entry (see `make_link_entry()`:py:func:)
+
+        :Returns:
+            A list of (`line_number`, `target`, `reason`) tuples, where
+            `reason` is `REASON_NO_FILE` or `REASON_NO_ANCHOR`
+        """
+        broken = []
+        dir_path = os.path.dirname(path)
+        link_anchor_sets = self._link_anchor_sets
+        own_anchors = None
+        for (line_number, target) in zip(entry[1], entry[2]):
+            (link_path, _hash, anchor) = target.partition("#")
+            if "?" in link_path:
+                link_path = link_path[: link_path.index("?")]
+            if link_path:
+                key = (dir_path, link_path)
+                if key in link_anchor_sets:
+                    anchors = link_anchor_sets[key]
+                else:
+                    anchors = self._get_anchor_set(dir_path, link_path)
+            else:
+                if own_anchors is None:
+                    own_anchors = frozenset(entry[0])
+                anchors = own_anchors
+            if anchors is None:
+                broken.append((line_number, target, REASON_NO_FILE))
+            elif anchor and anchor not in anchors and _unquote(anchor) not in anchors:
+                broken.append((line_number, target, REASON_NO_ANCHOR))
+        return broken
+
+
+class LinkIndex(object):
+    """
+    Provide a persistent index of the link entries of Markdown files.
+
+    Like `~markdown_toc.cache.ResultCache`:py:class:, the index is an SQLite
+    database that several processes may share.
+
+    :Args:
+        path
+            The path to the index file; its directory is created if needed
+    """
+
+    def __init__(self, path):
+        import sqlite3
+
+        self.path = path
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=cache.LOCK_TIMEOUT)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close the index."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def lookup(self, path, stat_result, options_hash):
+        """
+        Get the link entry for `path`, if it is still up to date.
+
+        :Args:
+            path
+                The normalized path to the file
+
+            stat_result
+                The result of `os.stat()`:py:func: on `path`
+
+            options_hash
+                The hash of the options that affect anchor names (see
+                `~markdown_toc.cache.hash_options()`:py:func:)
+
+        :Returns:
+            The link entry, or `None` if there is none for the file's
+            current size and mtime
+        """
+        row = self._connection.execute(
+            "SELECT size, mtime_ns, anchors, link_line_numbers, link_targets "
+            "FROM entries "
+            "WHERE path = ? AND options_hash = ?",
+            (path, options_hash),
+        ).fetchone()
+        if row is None or tuple(row[:2]) != (
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+        ):
+            return None
+        line_numbers = array.array("I")
+        line_numbers.frombytes(row[3])
+        return (_split_lines(row[2]), line_numbers, _split_lines(row[4]))
+
+    def store(self, path, stat_result, options_hash, entry):
+        """
+        Record the link entry for `path`.
+
+        A file modified too recently to trust its mtime is recorded without
+        its size and mtime, so it is re-indexed next time.
+        """
+        if time.time() - stat_result.st_mtime < cache.RACY_INTERVAL:
+            (size, mtime_ns) = (None, None)
+        else:
+            (size, mtime_ns) = (stat_result.st_size, stat_result.st_mtime_ns)
+        (anchors, line_numbers, targets) = entry
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (path, options_hash, size, mtime_ns, "
+                "anchors, link_line_numbers, link_targets) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path,
+                    options_hash,
+                    size,
+                    mtime_ns,
+                    "\n".join(anchors),
+                    line_numbers.tobytes(),
+                    "\n".join(targets),
+                ),
+            )
@@ -1,63 +1,46 @@
 """Model a Markdown file as an object."""
 
-import pprint
-import re
+import array
+import bisect
+import io
+import itertools
+
+from . import slugs
 
 INDENT_WIDTH = 4
 
+# Columns of indentation that make a line indented code
+CODE_INDENT = 4
+TAB_STOP = 4
+
+MAX_HEADING_LEVEL = 6
+MIN_FENCE_LENGTH = 3
+MIN_THEMATIC_BREAK_LENGTH = 3
+MAX_LIST_NUMBER_DIGITS = 9
+
+DEFAULT_STREAM_BUFFER_SIZE = 8 * 1024 * 1024
+
 LABEL_TOC = "toc"
 LABEL_BEGIN_TOC = "begintoc"
 LABEL_END_TOC = "endtoc"
 
 HEADING_CHAR = "#"
 
-RE_GROUP_LEVEL = "level"
-RE_GROUP_TEXT = "text"
-RE_GROUP_FENCE = "fence"
-RE_GROUP_LABEL = "label"
-RE_GROUP_REF = "ref"
-RE_GROUP_COMMENT = "comment"
-
-HEADING_REGEX_TEMPLATE = r"^(?P<{level}>#+) *(?P<{text}>.*[^ #])( *#+)?$"
-CODE_FENCE_REGEX_TEMPLATE = r"^(?P<{fence}>```+)"
-TOC_ENTRY_REGEX_TEMPLATE = r"^ *[-*+] *[^ ]"
-BLANK_LINE_REGEX_TEMPLATE = r"^$"
-COMMENT_REGEX_TEMPLATE = (
-    r"^\[(?P<{label}>[^\]]*)\]: "
-    r"#(?P<{ref}>[-0-9A-Za-z]*)?( +\((?P<comment>[^\)]*)\))? *$"
-)
-
-HEADING_REGEX_PATTERN = HEADING_REGEX_TEMPLATE.format(
-    level=RE_GROUP_LEVEL, text=RE_GROUP_TEXT
-)
-CODE_FENCE_REGEX_PATTERN = CODE_FENCE_REGEX_TEMPLATE.format(fence=RE_GROUP_FENCE)
-TOC_ENTRY_REGEX_PATTERN = TOC_ENTRY_REGEX_TEMPLATE
-BLANK_LINE_REGEX_PATTERN = BLANK_LINE_REGEX_TEMPLATE
-COMMENT_REGEX_PATTERN = COMMENT_REGEX_TEMPLATE.format(
-    label=RE_GROUP_LABEL, ref=RE_GROUP_REF, comment=RE_GROUP_COMMENT
-)
-
-HEADING_REGEX = re.compile(HEADING_REGEX_PATTERN)
-CODE_FENCE_REGEX = re.compile(CODE_FENCE_REGEX_PATTERN)
-TOC_ENTRY_REGEX = re.compile(TOC_ENTRY_REGEX_PATTERN)
-BLANK_LINE_REGEX = re.compile(BLANK_LINE_REGEX_PATTERN)
-COMMENT_REGEX = re.compile(COMMENT_REGEX_PATTERN)
+# What a table of contents token starts with, for searching raw bytes (see
+# `file_has_toc_token()`:py:func:).
+TOC_TOKEN_PREFIXES = [
+    "[{label}]: #".format(label=x).encode("ascii")
+    for x in [LABEL_TOC, LABEL_BEGIN_TOC]
+]
 
 
 ####################
 
 
-def _make_anchor_name(text):
+def _make_anchor_name(text, anchor_style=slugs.DEFAULT_ANCHOR_STYLE):
     if text is None:
         return None
-
-    anchor_text = []
-    for c in text:
-        if c.isalnum():
-            anchor_text.append(c.lower())
-        elif c.isspace() or c == "-":
-            anchor_text.append("-")
-    return "".join(anchor_text)
+    return slugs.make_slug(text, anchor_style)
 
 
 def _make_anchor_ref(text):
@@ -95,9 +78,23 @@ def _make_comment(text=None, label="comment"):
 ####################
 
 
+def _format_toc_line(
+    text, anchor_name, n, indent_level, numbered, alt_list_char, indent_width
+):
+    """Format one table of contents entry (see `TocItem.format()`:py:meth:)."""
+    link = _make_inline_link(text, _make_anchor_ref(anchor_name))
+    if numbered:
+        item_text = _make_numbered_list_item(link, n)
+    else:
+        item_text = _make_list_item(link, alt_list_char=alt_list_char)
+    return "".join([" " * (indent_level * indent_width), item_text])
+
+
 class TocItem(object):
     """Model an item in a table of contents."""
 
+    __slots__ = ("text", "n")
+
     def __init__(self, text, n):
         self.text = text
         self.n = n
@@ -106,17 +103,29 @@ class TocItem(object):
         """Print a human-readable representation of this item."""
         return "TocItem(text={text})".format(text=repr(self.text))
 
-    def format(self, indent_level, numbered, alt_list_char, indent_width=INDENT_WIDTH):
-        """Format this item at a given indent level with the given options."""
-        anchor_name = _make_anchor_name(self.text)
-        anchor_ref = _make_anchor_ref(anchor_name)
-        link = _make_inline_link(self.text, anchor_ref)
-        if numbered:
-            item_text = _make_numbered_list_item(link, self.n)
-        else:
-            item_text = _make_list_item(link, alt_list_char=alt_list_char)
-        indent_text = " " * (indent_level * indent_width)
-        return "".join([indent_text, item_text])
+    def format(
+        self,
+        indent_level,
+        numbered,
+        alt_list_char,
+        indent_width=INDENT_WIDTH,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
+    ):
+        """
+        Format this item at a given indent level with the given options.
+
+        The item links to its anchor name as if no other heading had the
+        same one; see `Toc.format()`:py:meth: for duplicates.
+        """
+        return _format_toc_line(
+            self.text,
+            _make_anchor_name(self.text, anchor_style),
+            self.n,
+            indent_level,
+            numbered,
+            alt_list_char,
+            indent_width,
+        )
 
     def print(self):
         """Print the text associated with this item."""
@@ -124,83 +133,127 @@ class TocItem(object):
 
 
 class TocLevel(object):
-    """Model an entire, possibly nested, level of a table of contents."""
+    """
+    Model an entire, possibly nested, level of a table of contents.
+
+    A level is a view of a run of items stored in a `Toc`:py:class:: the
+    items from `start` up to (not including) `stop`, all of which are at
+    `level` or deeper.  Deeper runs of items make up nested levels.
+    """
 
-    def __init__(self, level, parent=None):
-        self.items = []
+    def __init__(self, toc, level, start, stop):
+        self.toc = toc
         self.level = level
-        self.parent = parent
-        self.item_count = 0
+        self.start = start
+        self.stop = stop
 
     def __repr__(self):
         """Print a human-readable representation of this level."""
+        import pprint
+
         items_text = pprint.pformat(self.items, indent=self.level + 1)
         text = "TocLevel(level={level}, items={items})".format(
             level=self.level, items=items_text
         )
         return text
 
-    def add_item(self, text, level):
-        """Add an item to this level."""
-        if level == self.level:
-            self.item_count += 1
-            self.items.append(TocItem(text=text, n=self.item_count))
-            return self
+    def _get_runs(self, min_level):
+        """Yield (`start`, `stop`) for each run of items at `min_level` or deeper."""
+        levels = self.toc.levels
+        run_start = None
+        for i in range(self.start, self.stop):
+            if levels[i] >= min_level:
+                if run_start is None:
+                    run_start = i
+            elif run_start is not None:
+                yield (run_start, i)
+                run_start = None
+        if run_start is not None:
+            yield (run_start, self.stop)
 
-        if level > self.level:
-            new_toc_level = TocLevel(level=self.level + 1, parent=self)
-            self.items.append(new_toc_level)
-            return new_toc_level.add_item(text, level)
+    @property
+    def items(self):
+        """Get this level's items and nested levels, in order."""
+        toc = self.toc
+        items = []
+        nested_start = None
+        for i in range(self.start, self.stop):
+            if toc.levels[i] > self.level:
+                if nested_start is None:
+                    nested_start = i
+                continue
+            if nested_start is not None:
+                items.append(TocLevel(toc, self.level + 1, nested_start, i))
+                nested_start = None
+            items.append(TocItem(text=toc.texts[i], n=toc.numbers[i]))
+        if nested_start is not None:
+            items.append(TocLevel(toc, self.level + 1, nested_start, self.stop))
+        return items
 
-        # level < self.level:
-        return self.parent.add_item(text, level)
+    @property
+    def item_count(self):
+        """Get the number of items directly at this level."""
+        levels = self.toc.levels
+        return sum(1 for i in range(self.start, self.stop) if levels[i] == self.level)
 
     def get_toc_levels(self, skip_level):
         """Get the levels for this table of contents, skipping if needed."""
-        toc_levels = []
         if skip_level < self.level:
-            toc_levels.append(self)
-        else:
-            for item in self.items:
-                if isinstance(item, TocLevel):
-                    for toc_level in item.get_toc_levels(skip_level):
-                        toc_levels.append(toc_level)
-        return toc_levels
+            return [self]
+        return [
+            TocLevel(self.toc, skip_level + 1, start, stop)
+            for (start, stop) in self._get_runs(skip_level + 1)
+        ]
 
     def format(
-        self, numbered, alt_list_char, indent_width=INDENT_WIDTH, adjust_indent=0
+        self,
+        numbered,
+        alt_list_char,
+        indent_width=INDENT_WIDTH,
+        adjust_indent=0,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
     ):
         """Format this level and all its items with the given options."""
-        formatted_items = []
-        for item in self.items:
-            if isinstance(item, TocLevel):
-                text = item.format(
-                    numbered=numbered,
-                    indent_width=indent_width,
-                    adjust_indent=adjust_indent,
-                    alt_list_char=alt_list_char,
-                )
-            elif isinstance(item, TocItem):
-                text = item.format(
-                    indent_level=(self.level - 1 - adjust_indent),
-                    numbered=numbered,
-                    alt_list_char=alt_list_char,
-                    indent_width=indent_width,
-                )
-            else:
-                raise TypeError(item)
-            formatted_items.append(text)
-        return "\n".join(formatted_items)
+        return "\n".join(
+            self.toc.format_items(
+                self.start,
+                self.stop,
+                numbered=numbered,
+                alt_list_char=alt_list_char,
+                indent_width=indent_width,
+                adjust_indent=adjust_indent,
+                anchor_style=anchor_style,
+            )
+        )
 
 
 class Toc(object):
-    """Model an entire table of contents."""
+    """
+    Model an entire table of contents.
+
+    Items are stored flat, in parallel arrays indexed by item: `levels`
+    holds each item's heading level, `texts` its text, and `numbers` its
+    position among the items of the same nested level.  Nesting is implied
+    by the levels, so no tree is built; see `headings` for one.
+
+    Every heading in the document should be added, including those the
+    table of contents leaves out, and the position of each table of
+    contents, whose own heading is also a heading; this is what makes
+    anchor names for duplicate headings come out right.
+    """
 
     def __init__(self, heading_text, heading_level, skip_level):
         self.meta_heading_text = heading_text
         self.meta_heading_level = heading_level
         self.skip_level = skip_level
-        self.headings = TocLevel(level=1)
+        self.levels = array.array("I")
+        self.texts = []
+        self.numbers = array.array("I")
+        self.toc_positions = array.array("I")
+        # The running count of items at each level (index) of the current
+        # nesting, and the level of the last item added.
+        self._counts = [0, 0]
+        self._current_level = 1
 
     def __repr__(self):
         """Print a human-readable representation of this table of contents."""
@@ -214,11 +267,123 @@ class Toc(object):
         )
         return text
 
+    @property
+    def headings(self):
+        """Get the top level of this table of contents, as a `TocLevel`:py:class:."""
+        return TocLevel(self, 1, 0, len(self.levels))
+
     def add_item(self, text, level):
-        """Add an item to this table of contents at the given level."""
-        return self.headings.add_item(text, level)
+        """
+        Add an item to this table of contents at the given level.
+
+        :Returns:
+            This table of contents
+        """
+        counts = self._counts
+        if level >= len(counts):
+            counts.extend([0] * (level + 1 - len(counts)))
+        if level > self._current_level:
+            # Going deeper starts new nested levels, numbered from 1.
+            first_new_level = self._current_level + 1
+            counts[first_new_level:] = [0] * (len(counts) - first_new_level)
+        counts[level] += 1
+        self._current_level = level
+        self.levels.append(level)
+        self.texts.append(text)
+        self.numbers.append(counts[level])
+        return self
+
+    def add_toc_position(self):
+        """Note that a table of contents comes before the next item."""
+        self.toc_positions.append(len(self.levels))
+
+    def get_anchor_names(self, anchor_style=slugs.DEFAULT_ANCHOR_STYLE, slugger=None):
+        """
+        Get the anchor name for every item, in a single pass.
 
-    def format(self, numbered, comment, alt_list_char, add_trailing_heading_chars):
+        Headings whose anchor names are already taken, including by the
+        heading of a table of contents, get numbered suffixes.  Pass a
+        `~markdown_toc.slugs.Slugger`:py:class: as `slugger` to collect every
+        anchor name in the document, those of table of contents headings
+        included.
+        """
+        if slugger is None:
+            slugger = slugs.Slugger(anchor_style)
+        anchor_names = []
+        start = 0
+        for toc_position in self.toc_positions:
+            anchor_names.extend(slugger.slug_all(self.texts[start:toc_position]))
+            slugger.slug(self.meta_heading_text)
+            start = toc_position
+        anchor_names.extend(slugger.slug_all(self.texts[start:]))
+        return anchor_names
+
+    def format_items(
+        self,
+        start,
+        stop,
+        numbered,
+        alt_list_char,
+        indent_width=INDENT_WIDTH,
+        adjust_indent=0,
+        min_level=1,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
+    ):
+        """
+        Format items from `start` up to (not including) `stop`.
+
+        :Returns:
+            A list of formatted lines, leaving out items above `min_level`
+        """
+        levels = self.levels
+        texts = self.texts
+        numbers = self.numbers
+        anchor_names = self.get_anchor_names(anchor_style)
+        lines = []
+        for i in range(start, stop):
+            level = levels[i]
+            if level < min_level:
+                continue
+            lines.append(
+                _format_toc_line(
+                    texts[i],
+                    anchor_names[i],
+                    numbers[i],
+                    level - 1 - adjust_indent,
+                    numbered,
+                    alt_list_char,
+                    indent_width,
+                )
+            )
+        return lines
+
+    def format_entries(
+        self, numbered, alt_list_char, anchor_style=slugs.DEFAULT_ANCHOR_STYLE
+    ):
+        """
+        Format the entries of this table of contents, leaving out its markers.
+
+        :Returns:
+            A list of formatted lines
+        """
+        return self.format_items(
+            0,
+            len(self.levels),
+            numbered=numbered,
+            alt_list_char=alt_list_char,
+            adjust_indent=self.skip_level,
+            min_level=self.skip_level + 1,
+            anchor_style=anchor_style,
+        )
+
+    def format(
+        self,
+        numbered,
+        comment,
+        alt_list_char,
+        add_trailing_heading_chars,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
+    ):
         """Format this table of contents with the given options."""
         formatted_items = []
         formatted_items.append(_make_comment(label=LABEL_BEGIN_TOC))
@@ -234,14 +399,15 @@ class Toc(object):
 
         formatted_items.append("")
 
-        for toc_level in self.headings.get_toc_levels(self.skip_level):
-            formatted_items.append(
-                toc_level.format(
-                    numbered=numbered,
-                    alt_list_char=alt_list_char,
-                    adjust_indent=self.skip_level,
-                )
-            )
+        lines = self.format_entries(
+            numbered=numbered, alt_list_char=alt_list_char, anchor_style=anchor_style
+        )
+        if self.skip_level < 1:
+            # Nothing is skipped, so the top level stands for everything,
+            # even when it is empty.
+            formatted_items.append("\n".join(lines))
+        else:
+            formatted_items.extend(lines)
 
         formatted_items.append("")
         formatted_items.append(_make_comment(comment, label=LABEL_END_TOC))
@@ -252,77 +418,509 @@ class Toc(object):
 
 ####################
 
+LINE_TEXT = 0
+LINE_HEADING = 1
+LINE_CODE_FENCE = 2
+LINE_CODE = 3
+LINE_TOC = 4
+LINE_BEGIN_TOC = 5
+LINE_IN_TOC = 6
+LINE_END_TOC = 7
 
-def _is_eof(text):
-    return text == ""
+TOC_START_KINDS = frozenset([LINE_TOC, LINE_BEGIN_TOC])
+TOC_BLOCK_KINDS = frozenset([LINE_IN_TOC, LINE_END_TOC])
 
 
-def _is_code_fence(text):
-    if text.endswith("\n"):
-        text = text[:-1]
-    match = CODE_FENCE_REGEX.search(text)
-    return match is not None
+# Results for lines that need nothing more than their kind
+_TEXT_RESULT = (LINE_TEXT, 0, None)
+_CODE_RESULT = (LINE_CODE, 0, None)
+_CODE_FENCE_RESULT = (LINE_CODE_FENCE, 0, None)
 
 
-def _get_comment(text):
-    if text.endswith("\n"):
-        text = text[:-1]
-    match = COMMENT_REGEX.search(text)
-    label = None
-    ref = None
-    comment = None
-    if match is not None:
-        label = match.group(RE_GROUP_LABEL)
-        ref = match.group(RE_GROUP_REF)
-        comment = match.group(RE_GROUP_COMMENT)
-    return (label, ref, comment)
+class _Syntax(object):
+    """
+    Provide the characters of Markdown block syntax as `str` or as `bytes`.
 
+    `LineClassifier`:py:class: only uses operations that `str` and `bytes`
+    have in common, such as slicing, `find()` and `strip()`, with these as
+    operands, so the same code classifies either kind of line.
 
-def _is_single_toc_token(line):
-    if _is_eof(line):
-        return False
-    (label, _ref, _comment) = _get_comment(line)
-    return label == LABEL_TOC
+    :Args:
+        convert
+            A callable turning a `str` of ASCII characters into the type of
+            the lines to classify
+    """
 
+    def __init__(self, convert):
+        def convert_each(chars):
+            return frozenset(convert(c) for c in chars)
+
+        self.empty = convert("")
+        self.space = convert(" ")
+        self.tab = convert("\t")
+        self.blanks = convert(" \t")
+        self.newlines = convert("\r\n")
+        self.whitespace = convert(" \t\r\n")
+        self.heading_char = convert(HEADING_CHAR)
+        self.backtick = convert("`")
+        self.digits = convert("0123456789")
+        self.blockquote_char = convert(">")
+        self.comment_char = convert("[")
+        self.comment_separator = convert("]: #")
+        self.comment_open = convert("(")
+        self.comment_close = convert(")")
+        self.ref_chars = convert(
+            "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+        )
+        self.labels = {
+            convert(x): x for x in [LABEL_TOC, LABEL_BEGIN_TOC, LABEL_END_TOC]
+        }
+        self.setext_levels = {convert("="): 1, convert("-"): 2}
+        # The lines that may close front matter, by the line that opens it
+        self.front_matter_fences = {
+            convert("---"): frozenset([convert("---"), convert("...")]),
+            convert("+++"): frozenset([convert("+++")]),
+        }
+        self.indent_chars = convert_each(" \t")
+        self.newline_chars = convert_each("\r\n")
+        self.break_chars = convert_each(" \t\r\n") | {self.empty}
+        self.fence_chars = convert_each("`~")
+        self.thematic_break_chars = convert_each("-*_")
+        self.bullet_chars = convert_each("-*+")
+        self.ordered_delimiters = convert_each(".)")
+        # Any line starting with something else is paragraph text.
+        self.block_start_chars = self.break_chars | convert_each(
+            "#`~[=-*_+>0123456789"
+        )
 
-def _is_begin_toc_token(line):
-    if _is_eof(line):
-        return False
-    (label, _ref, _comment) = _get_comment(line)
-    return label == LABEL_BEGIN_TOC
 
+_TEXT_SYNTAX = _Syntax(str)
+_BYTES_SYNTAX = _Syntax(lambda x: x.encode("ascii"))
 
-def _is_end_toc_token(line):
-    if _is_eof(line):
-        return False
-    (label, _ref, _comment) = _get_comment(line)
-    return label == LABEL_END_TOC
 
+class LineClassifier(object):
+    """
+    Classify the lines of a Markdown file, one line at a time.
 
-def _is_toc_token(line):
-    if _is_eof(line):
-        return False
-    (label, _ref, _comment) = _get_comment(line)
-    return label in {LABEL_TOC, LABEL_BEGIN_TOC}
+    This is a scanner for the block structure of CommonMark, as far as it
+    matters for finding headings: ATX (``#``) and setext (underlined)
+    headings, code fenced with backticks or tildes, indented code, and
+    enough of paragraphs, lists and block quotes to tell them apart.  Each
+    line is examined exactly once, with string methods that run in time
+    linear in its length; lines starting with a character that cannot
+    begin a block, which is most of them, are settled at a glance.
 
+    A setext heading is only known to be one at its underline, so that is
+    the line classified as ``LINE_HEADING``; the paragraph lines above it
+    stay ``LINE_TEXT``.
+
+    :Args:
+        binary
+            (optional) Whether the lines to classify are `bytes` rather
+            than `str`; heading texts are then `bytes` too
+    """
+
+    def __init__(self, binary=False):
+        self._syntax = _BYTES_SYNTAX if binary else _TEXT_SYNTAX
+        # The run of backticks or tildes that opened the current code fence
+        self.fence = None
+        self.in_toc = False
+        # The lines of the current paragraph, which may become a setext heading
+        self._paragraph_lines = []
+        # Whether the current paragraph is in a list item or block quote
+        self.in_container_paragraph = False
+        self.in_list = False
+
+    @property
+    def in_code_fence(self):
+        """Tell whether the next line is inside a code fence."""
+        return self.fence is not None
+
+    @property
+    def in_paragraph(self):
+        """Tell whether the next line may continue a would-be setext heading."""
+        return bool(self._paragraph_lines)
+
+    def get_state(self):
+        """Get the state carried over to the next line, as a hashable value."""
+        return (
+            self.fence,
+            self.in_toc,
+            len(self._paragraph_lines),
+            self.in_container_paragraph,
+            self.in_list,
+        )
+
+    def set_state(self, state, lines=(), line_index=0):
+        """
+        Restore a state returned by `get_state()`:py:meth:.
+
+        A state taken inside a paragraph only records how many lines of it
+        came before, so restoring it also needs `lines`, the lines of the
+        document, and `line_index`, the index of the line the state was
+        taken before.
+        """
+        (
+            self.fence,
+            self.in_toc,
+            paragraph_length,
+            self.in_container_paragraph,
+            self.in_list,
+        ) = state
+        paragraph_start = line_index - paragraph_length
+        self._paragraph_lines = list(
+            lines[paragraph_start:line_index] if paragraph_length else []
+        )
+
+    def _end_paragraph(self):
+        if self._paragraph_lines:
+            self._paragraph_lines = []
+        self.in_container_paragraph = False
+
+    def _continue_paragraph(self, line):
+        if not self.in_container_paragraph:
+            self._paragraph_lines.append(line)
+        return _TEXT_RESULT
+
+    def _get_indent(self, line, stripped):
+        """Get the width of the indentation of `line`, counting tab stops."""
+        indent = len(line) - len(stripped)
+        if indent and self._syntax.tab in line[:indent]:
+            indent = len(line[:indent].expandtabs(TAB_STOP))
+        return indent
+
+    def _get_comment_label(self, line):
+        """Get the label of a pseudo-comment like ``[label]: # (comment)``."""
+        syntax = self._syntax
+        end = line.find(syntax.comment_separator)
+        if end < 0:
+            return None
+        label = syntax.labels.get(line[1:end])
+        if label is None:
+            return None
+        rest_start = end + len(syntax.comment_separator)
+        rest = line[rest_start:].rstrip(syntax.whitespace)
+        rest = rest.lstrip(syntax.ref_chars)
+        if rest:
+            comment = rest.lstrip(syntax.space)
+            if (
+                comment == rest
+                or not comment.startswith(syntax.comment_open)
+                or not comment.endswith(syntax.comment_close)
+                or syntax.comment_close in comment[1:-1]
+            ):
+                return None
+        return label
+
+    def _get_atx_heading(self, stripped):
+        """Classify a line starting with '#', or return `None` if not a heading."""
+        syntax = self._syntax
+        rest = stripped.lstrip(syntax.heading_char)
+        level = len(stripped) - len(rest)
+        if level > MAX_HEADING_LEVEL or rest[:1] not in syntax.break_chars:
+            return None
+        text = rest.strip(syntax.whitespace)
+        if text.endswith(syntax.heading_char):
+            # A closing run of '#' must be set off by a space, or be all there is.
+            unclosed = text.rstrip(syntax.heading_char)
+            if not unclosed:
+                text = unclosed
+            elif unclosed[-1:] in syntax.break_chars:
+                text = unclosed.rstrip(syntax.blanks)
+        # An empty heading still ends a paragraph, but has nothing to list.
+        return (LINE_HEADING, level, text) if text else _TEXT_RESULT
+
+    def _is_thematic_break(self, stripped, first):
+        syntax = self._syntax
+        body = stripped.rstrip(syntax.whitespace)
+        return body.count(first) >= MIN_THEMATIC_BREAK_LENGTH and not body.replace(
+            first, syntax.empty
+        ).strip(syntax.blanks)
+
+    def _starts_list_item(self, stripped, first):
+        syntax = self._syntax
+        number = None
+        if first in syntax.bullet_chars:
+            rest = stripped[1:]
+        elif first in syntax.digits:
+            rest = stripped.lstrip(syntax.digits)
+            number = stripped[: len(stripped) - len(rest)]
+            if len(number) > MAX_LIST_NUMBER_DIGITS:
+                return False
+            if rest[:1] not in syntax.ordered_delimiters:
+                return False
+            rest = rest[1:]
+        else:
+            return False
+        if rest[:1] not in syntax.break_chars:
+            return False
+        # Only a non-empty item, numbered from 1 if at all, can interrupt a
+        # paragraph; otherwise the line just continues it.
+        if not self._paragraph_lines:
+            return True
+        if number is not None and int(number) != 1:
+            return False
+        return bool(rest.strip(syntax.whitespace))
+
+    def classify(self, line):
+        """
+        Classify `line`.
+
+        :Returns:
+            A tuple (`kind`, `heading_level`, `heading_text`), where `kind` is
+            one of the ``LINE_*`` constants; `heading_level` and
+            `heading_text` are only meaningful for ``LINE_HEADING``.
+
+        :Raises:
+            `ValueError`:py:exc: if a table of contents is improperly nested
+        """
+        syntax = self._syntax
+        first = line[:1]
+        fence = self.fence
+        if fence is not None:
+            if line.startswith(fence):
+                stripped = line
+            elif first in syntax.indent_chars:
+                stripped = line.lstrip(syntax.blanks)
+                if (
+                    not stripped.startswith(fence)
+                    or self._get_indent(line, stripped) >= CODE_INDENT
+                ):
+                    return _CODE_RESULT
+            else:
+                return _CODE_RESULT
+            # A closing fence is at least as long as the opening one.
+            if stripped.rstrip(syntax.whitespace).strip(fence[:1]):
+                return _CODE_RESULT
+            self.fence = None
+            return _CODE_FENCE_RESULT
+
+        if self.in_toc:
+            if first == syntax.comment_char:
+                label = self._get_comment_label(line)
+                if label == LABEL_TOC:
+                    raise ValueError(
+                        "invalid syntax: nested [{toc}]".format(toc=LABEL_TOC)
+                    )
+                if label == LABEL_BEGIN_TOC:
+                    raise ValueError(
+                        "invalid syntax: nested [{begintoc}]".format(
+                            begintoc=LABEL_BEGIN_TOC
+                        )
+                    )
+                if label == LABEL_END_TOC:
+                    self.in_toc = False
+                    return (LINE_END_TOC, 0, None)
+            return (LINE_IN_TOC, 0, None)
+
+        if first not in syntax.block_start_chars:
+            if not self.in_container_paragraph:
+                self._paragraph_lines.append(line)
+            return _TEXT_RESULT
+        if first in syntax.newline_chars:
+            self._end_paragraph()
+            return _TEXT_RESULT
+        return self._classify_block_start(line, first)
+
+    def _classify_block_start(self, line, first):
+        """Classify a line that may begin a block other than a paragraph."""
+        syntax = self._syntax
+        if first in syntax.indent_chars:
+            stripped = line.lstrip(syntax.blanks)
+            if not stripped.rstrip(syntax.newlines):
+                self._end_paragraph()
+                return _TEXT_RESULT
+            indent = self._get_indent(line, stripped)
+            if indent >= CODE_INDENT:
+                # An indented line cannot interrupt a paragraph, and in a list
+                # it belongs to an item.
+                if self.in_list and not self._paragraph_lines:
+                    self.in_container_paragraph = True
+                if self._paragraph_lines or self.in_container_paragraph:
+                    return self._continue_paragraph(line)
+                return _CODE_RESULT
+            first = stripped[:1]
+        else:
+            (stripped, indent) = (line, 0)
+            if not self.in_container_paragraph:
+                self.in_list = False
+
+        if first == syntax.heading_char:
+            result = self._get_atx_heading(stripped)
+            if result is not None:
+                self._end_paragraph()
+                return result
+        elif first in syntax.fence_chars:
+            info = stripped.lstrip(first)
+            length = len(stripped) - len(info)
+            # Backticks may not appear in a backtick fence's info string.
+            if length >= MIN_FENCE_LENGTH and not (
+                first == syntax.backtick and first in info
+            ):
+                self._end_paragraph()
+                self.fence = stripped[:length]
+                return _CODE_FENCE_RESULT
+        elif first == syntax.comment_char and not indent:
+            label = self._get_comment_label(line)
+            if label == LABEL_TOC:
+                self._end_paragraph()
+                return (LINE_TOC, 0, None)
+            if label == LABEL_BEGIN_TOC:
+                self._end_paragraph()
+                self.in_toc = True
+                return (LINE_BEGIN_TOC, 0, None)
+        elif first in syntax.setext_levels and self._paragraph_lines:
+            if not stripped.rstrip(syntax.whitespace).strip(first):
+                text = syntax.space.join(
+                    x.strip(syntax.whitespace) for x in self._paragraph_lines
+                )
+                self._end_paragraph()
+                return (LINE_HEADING, syntax.setext_levels[first], text)
+
+        if first in syntax.thematic_break_chars and self._is_thematic_break(
+            stripped, first
+        ):
+            self._end_paragraph()
+            return _TEXT_RESULT
+        if first == syntax.blockquote_char or self._starts_list_item(stripped, first):
+            self._end_paragraph()
+            self.in_container_paragraph = True
+            if first != syntax.blockquote_char:
+                self.in_list = True
+            return _TEXT_RESULT
+        return self._continue_paragraph(line)
+
+
+def _get_front_matter_closers(first_line, syntax):
+    """Get the lines that may close front matter opened by `first_line`, if any."""
+    return syntax.front_matter_fences.get(first_line.rstrip(syntax.whitespace))
 
-def _get_heading(text):
-    # NOTE: This only handles the "atx"-style headings beginning with '#',
-    # not the "setext"-style using "underlines" of '=' or '-'.
-    #
-    # TODO: We really should be using a full Markdown parser to detect text elements
-    # instead of limited and potentially fragile regexes....
-    if text.endswith("\n"):
-        text = text[:-1]
-    match = HEADING_REGEX.search(text)
-    if match is None:
-        heading_text = None
-        heading_level = 0
-    else:
-        heading_text = match.group(RE_GROUP_TEXT)
-        heading_level_text = match.group(RE_GROUP_LEVEL)
-        heading_level = len(heading_level_text)
-    return (heading_text, heading_level)
+
+def _get_front_matter_length(lines, syntax):
+    """
+    Get the number of lines of front matter at the start of `lines`.
+
+    Front matter, as Jekyll and Hugo use it, is YAML between ``---`` lines
+    (or TOML between ``+++`` lines), starting on the first line.  It is not
+    Markdown, so none of it is classified.  Without its closing line, it is
+    not front matter at all.
+    """
+    closers = _get_front_matter_closers(lines[0], syntax) if lines else None
+    if closers is None:
+        return 0
+    whitespace = syntax.whitespace
+    for index in range(1, len(lines)):
+        if lines[index].rstrip(whitespace) in closers:
+            return index + 1
+    return 0
+
+
+def _find_at_line_start(data, prefix, newlines=b"\r\n"):
+    start = 0
+    while True:
+        index = data.find(prefix, start)
+        if index < 0:
+            return False
+        if index == 0 or data[index - 1] in newlines:
+            return True
+        start = index + 1
+
+
+def text_has_toc_token(text):
+    """
+    Tell quickly whether Markdown `text` may have a table of contents token.
+
+    This is the in-memory counterpart of `file_has_toc_token()`:py:func:.
+    """
+    return any(
+        _find_at_line_start(text, x.decode("ascii"), "\r\n")
+        for x in TOC_TOKEN_PREFIXES
+    )
+
+
+def file_has_toc_token(path):
+    """
+    Tell quickly whether the file at `path` may have a table of contents token.
+
+    The file is memory-mapped and searched as bytes, without decoding it or
+    splitting it into lines, so its encoding must be ASCII-compatible.  A
+    token inside a code block still counts, so a `True` result may be
+    wrong, but a `False` result means there is no table of contents to
+    update.
+
+    Plain substring searches are used rather than a regex anchored at line
+    starts, since they run at memory speed; each hit is then checked to be
+    at the start of a line.
+
+    :Returns:
+        `False` if the file has no table of contents token; `True` if it may
+        have one, or if it cannot be searched this way
+    """
+    import mmap
+
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return any(_find_at_line_start(data, x) for x in TOC_TOKEN_PREFIXES)
+    except ValueError:
+        return False  # An empty file cannot be mapped
+    except OSError:
+        return True
+
+
+def _find_toc_starts(line_kinds):
+    """Get the indexes of the lines starting a table of contents, in order."""
+    kinds = line_kinds.tobytes()
+    toc_starts = []
+    for kind in TOC_START_KINDS:
+        index = kinds.find(kind)
+        while index >= 0:
+            toc_starts.append(index)
+            index = kinds.find(kind, index + 1)
+    toc_starts.sort()
+    return toc_starts
+
+
+def _match_newlines(toc_text, token_line):
+    r"""
+    Give `toc_text` the same newlines as the token it replaces.
+
+    `toc_text` is returned as is when the token ends in ``\n``.
+    """
+    if token_line.endswith("\r\n"):
+        return toc_text.replace("\n", "\r\n")
+    if token_line.endswith("\r"):
+        return toc_text.replace("\n", "\r")
+    return toc_text
+
+
+def _replace_tocs(lines, line_kinds, toc_text, match_token=_match_newlines):
+    """
+    Yield `lines`, replacing each table of contents with `toc_text`.
+
+    Each replacement is ``match_token(toc_text, token_line)``.
+    """
+    for (line, kind) in zip(lines, line_kinds):
+        if kind in TOC_START_KINDS:
+            yield match_token(toc_text, line)
+        elif kind not in TOC_BLOCK_KINDS:
+            yield line
+
+
+def _split_binary_lines(infile):
+    r"""
+    Yield the lines of binary `infile`.
+
+    Lines are split at ``\r`` as well as ``\n``, as text files opened with
+    ``newline=""`` are.
+    """
+    for line in infile:
+        # Binary files split lines only after '\n'.
+        if line.count(b"\r") > line.endswith(b"\r\n"):
+            for part in line.splitlines(True):
+                yield part
+        else:
+            yield line
 
 
 ####################
@@ -332,11 +930,13 @@ class MarkdownFile(object):
     """
     Provide a class model for a Markdown file.
 
-    This one is rudimentary, with regex-based parsing and no AST.
+    Lines are classified one at a time by `LineClassifier`:py:class:, after
+    skipping any front matter; there is no AST.
 
     :Args:
         infile
-            The input file to read from.
+            The input file to read from, or `None` if the content is given
+            with `set_text()`:py:meth: instead.
 
         infilename
             (optional) A printable name for infile, overrides `infile.name`.
@@ -345,15 +945,29 @@ class MarkdownFile(object):
         outfile
             (optional) The output file to write to; if not supplied, must be
             supplied when writing.
+
+        encoding
+            (optional) If given, the files are binary, and their lines are
+            classified as `bytes`.  Only heading texts and table of contents
+            tokens are decoded, with this encoding (which must be
+            ASCII-compatible); undecodable bytes are kept as surrogates, so
+            they come out as they went in.  Every other line is copied
+            through untouched.
     """
 
-    def __init__(self, infile, infilename=None, outfile=None):
+    def __init__(self, infile, infilename=None, outfile=None, encoding=None):
         self.infile = infile
         self.infilename = infilename
         self.outfile = outfile
+        self.encoding = encoding
         self.line_index = None
         self.lines = None
+        self.line_kinds = None
+        self.line_states = None
+        self.front_matter_length = 0
+        self.headings = None
         self.toc = None
+        self.toc_text = None
 
     @property
     def filename(self):
@@ -368,117 +982,367 @@ class MarkdownFile(object):
             filename=self.filename, line_number=self.line_index + 1
         )
 
-    def get_next_line(self, reset=False):
-        """Get the "next" line from the set of lines."""
-        if reset or self.line_index is None:
-            self.line_index = 0
-        else:
-            self.line_index += 1
-        if self.line_index + 1 > len(self.lines):
-            return ""
-        return self.lines[self.line_index]
-
-    def consume_toc(self, line):
+    def read(self, force=False):
+        """Read the Markdown file and return the raw input text (or bytes)."""
+        if force or self.lines is None:
+            if self.encoding is None:
+                self.lines = self.infile.readlines()
+            else:
+                # Split at '\r' too, as text files opened with newline="" are.
+                self.lines = self.infile.read().splitlines(True)
+            self.line_kinds = None
+            self.line_states = None
+            self.headings = None
+        return ("" if self.encoding is None else b"").join(self.lines)
+
+    def set_text(self, text):
+        r"""
+        Use `text` as the content of the Markdown file, instead of reading it.
+
+        Lines are split the way the command line reads files, at ``\n``,
+        ``\r\n`` or ``\r``, keeping the line endings.  Anything parsed from
+        earlier content is forgotten, so one object can be reused for many
+        documents.
         """
-        Consume a table of contents token or tokenset.
-
-        A table of contents is defined as either:
-
-            `toc-comment`
-
-        or:
+        self.lines = io.StringIO(text, newline="").readlines()
+        self.line_index = None
+        self.line_kinds = None
+        self.line_states = None
+        self.headings = None
+        self.toc = None
+        self.toc_text = None
+
+    def _make_classifier(self):
+        return LineClassifier(binary=self.encoding is not None)
+
+    def _get_syntax(self):
+        return _TEXT_SYNTAX if self.encoding is None else _BYTES_SYNTAX
+
+    def _decode(self, data):
+        """Decode `data`, a heading text or token line of a binary file."""
+        return data.decode(self.encoding, "surrogateescape")
+
+    def _match_token(self, toc_text, token_line):
+        """Get `toc_text` as it should replace `token_line` in the output."""
+        if self.encoding is None:
+            return _match_newlines(toc_text, token_line)
+        toc_text = _match_newlines(toc_text, self._decode(token_line))
+        return toc_text.encode(self.encoding, "surrogateescape")
+
+    def _raise_unterminated_toc(self, line_index):
+        # Without its end, a table of contents would replace the rest of the
+        # file.
+        self.line_index = line_index
+        raise ValueError(
+            "invalid syntax: [{begintoc}] without [{endtoc}]".format(
+                begintoc=LABEL_BEGIN_TOC, endtoc=LABEL_END_TOC
+            ),
+            self.get_file_position(),
+        )
 
-            `begin-toc-comment`
-            `zero-or-more-non-end-toc-comment-lines`
-            `end-toc-comment`
+    def tokenize(self, force=False):
         """
-        lines = [line]
-        seen_toc = False
-        in_toc = False
-        while not _is_eof(line):
-            if _is_single_toc_token(line):
-                if seen_toc:
-                    raise ValueError(
-                        "invalid syntax: nested [{toc}]".format(toc=LABEL_TOC),
-                        self.get_file_position(),
-                    )
-            elif _is_begin_toc_token(line):
-                if seen_toc:
-                    raise ValueError(
-                        "invalid syntax: nested [{begintoc}]".format(
-                            begintoc=LABEL_BEGIN_TOC
-                        ),
-                        self.get_file_position(),
-                    )
-                seen_toc = True
-                in_toc = True
-            elif _is_end_toc_token(line):
-                if not seen_toc:
-                    raise ValueError(
-                        "invalid syntax: dangling [{endtoc}]".format(
-                            endtoc=LABEL_END_TOC
-                        ),
-                        self.get_file_position(),
-                    )
-                in_toc = False
-            if not in_toc:
-                break
-            line = self.get_next_line()
-            lines.append(line)
-        return "".join(lines)
-
-    def skip_toc(self, line):
-        """Skip over a table of contents starting on `line`."""
-        if _is_toc_token(line):
-            self.consume_toc(line)
-            line = self.get_next_line()
-        return line
-
-    def consume_code_fence(self, line):
-        """Consume a code fence."""
-        lines = [line]
-        in_code_fence = False
-        while not _is_eof(line):
-            if _is_code_fence(line):
-                in_code_fence = not in_code_fence
-            if not in_code_fence:
-                break
-            line = self.get_next_line()
-            lines.append(line)
-        return "".join(lines)
-
-    def skip_code_fence(self, line):
-        """Skip over any code fence starting on `line`."""
-        if _is_code_fence(line):
-            self.consume_code_fence(line)
-            line = self.get_next_line()
-        return line
+        Classify every line of the Markdown file exactly once.
 
-    def read(self, force=False):
-        """Read the Markdown file and return the raw input text."""
-        if force or self.lines is None:
-            self.lines = self.infile.readlines()
-        return "".join(self.lines)
+        This populates `self.line_kinds`:py:attr:, a compact array holding
+        one ``LINE_*`` constant per line, and `self.headings`:py:attr:, a list
+        of (`line_index`, `level`, `text`) tuples in document order.
+        """
+        if not force and self.line_kinds is not None:
+            return self.line_kinds
+        self.read()
+        front_matter_length = _get_front_matter_length(self.lines, self._get_syntax())
+        line_kinds = array.array("B", [LINE_TEXT] * front_matter_length)
+        headings = []
+        classifier = self._make_classifier()
+        classify = classifier.classify
+        append_kind = line_kinds.append
+        binary = self.encoding is not None
+        line_index = 0
+        try:
+            for (line_index, line) in enumerate(
+                itertools.islice(self.lines, front_matter_length, None),
+                front_matter_length,
+            ):
+                (kind, heading_level, heading_text) = classify(line)
+                append_kind(kind)
+                if kind == LINE_HEADING:
+                    if binary:
+                        heading_text = self._decode(heading_text)
+                    headings.append((line_index, heading_level, heading_text))
+        except ValueError as e:
+            self.line_index = line_index
+            raise ValueError(e.args[0], self.get_file_position())
+        if classifier.in_toc:
+            self._raise_unterminated_toc(line_kinds.tobytes().rfind(LINE_BEGIN_TOC))
+        self.line_kinds = line_kinds
+        self.front_matter_length = front_matter_length
+        self.headings = headings
+        return line_kinds
 
     def parse(self, heading_text, heading_level, skip_level):
         """Parse headings out of the Markdown file and build the table of contents."""
         input_text = self.read()
+        self.tokenize()
+        self._build_toc(heading_text, heading_level, skip_level)
+        return input_text
+
+    def _build_toc(self, heading_text, heading_level, skip_level):
         self.toc = Toc(
             heading_text=heading_text,
             heading_level=heading_level,
             skip_level=skip_level,
         )
-        toclevel = self.toc
-        while True:
-            line = self.get_next_line()
-            if _is_eof(line):
-                break
-            line = self.skip_toc(line)
-            line = self.skip_code_fence(line)
-            (heading_text, heading_level) = _get_heading(line)
-            if heading_text is not None:
-                toclevel = toclevel.add_item(heading_text, heading_level)
-        return input_text
+        toc_line_indices = iter(_find_toc_starts(self.line_kinds))
+        next_toc_line_index = next(toc_line_indices, None)
+        for (line_index, level, text) in self.headings:
+            while (
+                next_toc_line_index is not None and next_toc_line_index < line_index
+            ):
+                self.toc.add_toc_position()
+                next_toc_line_index = next(toc_line_indices, None)
+            self.toc.add_item(text, level)
+        while next_toc_line_index is not None:
+            self.toc.add_toc_position()
+            next_toc_line_index = next(toc_line_indices, None)
+
+    def get_outline(self, anchor_style=slugs.DEFAULT_ANCHOR_STYLE):
+        """
+        Get every heading in the Markdown file, as parsed by `parse()`:py:meth:.
+
+        :Returns:
+            A list of (`line_number`, `level`, `text`, `anchor_name`) tuples in
+            document order, where `line_number` starts at 1
+        """
+        anchor_names = self.toc.get_anchor_names(anchor_style)
+        return [
+            (line_index + 1, level, text, anchor_name)
+            for ((line_index, level, text), anchor_name) in zip(
+                self.headings, anchor_names
+            )
+        ]
+
+    def _ensure_line_states(self):
+        """Record the classifier state at the start of every line (and at EOF)."""
+        if self.line_states is not None:
+            return
+        self.tokenize()
+        classifier = self._make_classifier()
+        line_states = [classifier.get_state()] * self.front_matter_length
+        for line in itertools.islice(self.lines, self.front_matter_length, None):
+            line_states.append(classifier.get_state())
+            classifier.classify(line)
+        line_states.append(classifier.get_state())
+        self.line_states = line_states
+
+    def apply_edit(self, start, end, new_lines):
+        """
+        Replace lines `start` through `end` (exclusive) with `new_lines`.
+
+        Only the new lines are classified, plus however many following lines
+        it takes for the classifier state to match what it was before the
+        edit; an edit that opens or closes a code fence, for instance,
+        reclassifies everything up to the next point where the fence state
+        agrees again, and an edit to a paragraph reclassifies the rest of
+        it, in case it ends in a setext heading underline.  Headings and the
+        table of contents are updated to match.  Nothing is changed if the
+        edited document is invalid.
+
+        `parse()`:py:meth: must have been called first.  The first edit
+        records the classifier state at every line, which costs one pass
+        over the document; after that, the cost of an edit is proportional
+        to the number of lines reclassified.
+
+        :Args:
+            start
+                The index of the first line to replace
+
+            end
+                The index just past the last line to replace; use `end` equal
+                to `start` to insert lines
+
+            new_lines
+                A list of replacement lines, each ending in a newline
+
+        :Returns:
+            `True` if the headings in the table of contents changed
+
+        :Raises:
+            - `IndexError`:py:exc: if the line range is out of bounds
+            - `ValueError`:py:exc: if the edit makes the document invalid
+        """
+        if self.toc is None:
+            raise ValueError("parse() must be called before apply_edit()")
+        lines = self.lines
+        num_lines = len(lines)
+        if not 0 <= start <= end <= num_lines:
+            raise IndexError(
+                "invalid line range: {start}:{end}".format(start=start, end=end)
+            )
+        if self._may_edit_front_matter(start):
+            return self._reparse_edit(start, end, new_lines)
+        self._ensure_line_states()
+        old_states = self.line_states
+
+        classifier = self._make_classifier()
+        classifier.set_state(old_states[start], lines, start)
+        new_kinds = array.array("B")
+        new_states = []
+        new_headings = []
+        line_index = start
+
+        def classify_line(line):
+            new_states.append(classifier.get_state())
+            try:
+                (kind, level, text) = classifier.classify(line)
+            except ValueError as e:
+                self.line_index = line_index
+                raise ValueError(e.args[0], self.get_file_position())
+            new_kinds.append(kind)
+            if kind == LINE_HEADING:
+                if self.encoding is not None:
+                    text = self._decode(text)
+                new_headings.append((line_index, level, text))
+
+        for line in new_lines:
+            classify_line(line)
+            line_index += 1
+        stop = end
+        # Lines that may yet become a setext heading are settled only once
+        # their paragraph ends.
+        while stop < num_lines and (
+            classifier.in_paragraph or classifier.get_state() != old_states[stop]
+        ):
+            classify_line(lines[stop])
+            line_index += 1
+            stop += 1
+        states_stop = stop
+        if stop == num_lines:
+            if classifier.in_toc:
+                begin_index = new_kinds.tobytes().rfind(LINE_BEGIN_TOC)
+                if begin_index >= 0:
+                    begin_index += start
+                else:
+                    begin_index = self.line_kinds[:start].tobytes().rfind(
+                        LINE_BEGIN_TOC
+                    )
+                self._raise_unterminated_toc(begin_index)
+            # The state after the last line is replaced as well.
+            new_states.append(classifier.get_state())
+            states_stop += 1
+
+        delta = len(new_lines) - (end - start)
+        headings = self.headings
+        first = bisect.bisect_left(headings, (start,))
+        last = bisect.bisect_left(headings, (stop,), lo=first)
+        old_items = [(level, text) for (_i, level, text) in headings[first:last]]
+        new_items = [(level, text) for (_i, level, text) in new_headings]
+        # Headings after the reclassified lines are unchanged apart from
+        # their line numbers.
+        if delta:
+            new_headings.extend(
+                (i + delta, level, text) for (i, level, text) in headings[last:]
+            )
+            headings[first:] = new_headings
+        else:
+            headings[first:last] = new_headings
+
+        lines[start:end] = new_lines
+        old_kinds = self.line_kinds[start:stop]
+        self.line_kinds[start:stop] = new_kinds
+        old_states[start:states_stop] = new_states
+
+        # Where tables of contents are matters too, for anchor names.
+        toc_changed = old_items != new_items or any(
+            x in TOC_START_KINDS for x in old_kinds + new_kinds
+        )
+        if toc_changed:
+            self._build_toc(
+                self.toc.meta_heading_text,
+                self.toc.meta_heading_level,
+                self.toc.skip_level,
+            )
+        return toc_changed
+
+    def _may_edit_front_matter(self, start):
+        """Tell whether an edit from line `start` on may change the front matter."""
+        # Front matter is only known once its closing line is found, so an
+        # edit anywhere may close front matter that has none.
+        if start < max(self.front_matter_length, 1):
+            return True
+        return self.front_matter_length == 0 and (
+            _get_front_matter_closers(self.lines[0], self._get_syntax()) is not None
+        )
+
+    def _get_toc_layout(self):
+        """Get what anchor names depend on: headings, and where each TOC is."""
+        items = [(level, text) for (_i, level, text) in self.headings]
+        toc_positions = [
+            bisect.bisect_left(self.headings, (x,))
+            for x in _find_toc_starts(self.line_kinds)
+        ]
+        return (items, toc_positions)
+
+    def _reparse_edit(self, start, end, new_lines):
+        """Do what `apply_edit()`:py:meth: does by classifying every line again."""
+        old_layout = self._get_toc_layout()
+        old_lines = self.lines[start:end]
+        self.lines[start:end] = new_lines
+        try:
+            self.tokenize(force=True)
+        except ValueError:
+            new_end = start + len(new_lines)
+            self.lines[start:new_end] = old_lines
+            raise
+        self.line_states = None
+        toc_changed = self._get_toc_layout() != old_layout
+        if toc_changed:
+            self._build_toc(
+                self.toc.meta_heading_text,
+                self.toc.meta_heading_level,
+                self.toc.skip_level,
+            )
+        return toc_changed
+
+    def get_toc_ranges(self):
+        """
+        Get the line ranges of the tables of contents in the Markdown file.
+
+        :Returns:
+            A list of (`start`, `end`) tuples in document order, giving the
+            index of each table of contents' first line and the index just
+            past its last line
+        """
+        line_kinds = self.tokenize()
+        kinds = line_kinds.tobytes()
+        toc_ranges = []
+        for start in _find_toc_starts(line_kinds):
+            end = start + 1
+            if line_kinds[start] == LINE_BEGIN_TOC:
+                end = kinds.find(LINE_END_TOC, end) + 1
+            toc_ranges.append((start, end))
+        return toc_ranges
+
+    def get_rendered_ranges(self):
+        """
+        Get the line ranges that the last `write()`:py:meth: replaced.
+
+        Everything outside these ranges was copied through unchanged.
+
+        :Returns:
+            A list of (`start`, `end`, `new_start`, `new_end`) tuples in
+            document order, where `start` and `end` are as for
+            `get_toc_ranges()`:py:meth: and `new_start` and `new_end` give
+            the same table of contents' lines in the output
+        """
+        toc_line_count = 0 if self.toc_text is None else self.toc_text.count("\n")
+        rendered_ranges = []
+        offset = 0
+        for (start, end) in self.get_toc_ranges():
+            new_start = start + offset
+            rendered_ranges.append((start, end, new_start, new_start + toc_line_count))
+            offset += toc_line_count - (end - start)
+        return rendered_ranges
 
     def write(
         self,
@@ -487,29 +1351,182 @@ class MarkdownFile(object):
         alt_list_char,
         add_trailing_heading_chars,
         outfile=None,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
     ):
         """Write the Markdown file with the new table of contents."""
         if outfile is not None:
             self.outfile = outfile
-        reset = True
-        while True:
-            line = self.get_next_line(reset=reset)
-            reset = False
-            if _is_eof(line):
-                break
-            if _is_code_fence(line):
-                lines = self.consume_code_fence(line)
-                self.outfile.write(lines)
-            elif _is_toc_token(line):
-                line = self.skip_toc(line)
-                self.outfile.write(
-                    self.toc.format(
-                        numbered=numbered,
-                        comment=toc_comment,
-                        alt_list_char=alt_list_char,
-                        add_trailing_heading_chars=add_trailing_heading_chars,
-                    )
+        lines = self.lines
+        toc_text = None
+        start = 0
+        for (toc_start, toc_end) in self.get_toc_ranges():
+            self.outfile.writelines(lines[start:toc_start])
+            if toc_text is None:
+                toc_text = self.toc.format(
+                    numbered=numbered,
+                    comment=toc_comment,
+                    alt_list_char=alt_list_char,
+                    add_trailing_heading_chars=add_trailing_heading_chars,
+                    anchor_style=anchor_style,
                 )
-                self.outfile.write(line)
+            self.outfile.write(self._match_token(toc_text, lines[toc_start]))
+            start = toc_end
+        self.outfile.writelines(lines[start:])
+        self.toc_text = toc_text
+
+    def render(
+        self,
+        numbered,
+        toc_comment,
+        alt_list_char,
+        add_trailing_heading_chars,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
+    ):
+        """
+        Render the Markdown file with the new table of contents as a string.
+
+        For a binary file (see `encoding`), this is `bytes`.
+        """
+        buffer = io.StringIO() if self.encoding is None else io.BytesIO()
+        self.write(
+            numbered=numbered,
+            toc_comment=toc_comment,
+            alt_list_char=alt_list_char,
+            add_trailing_heading_chars=add_trailing_heading_chars,
+            outfile=buffer,
+            anchor_style=anchor_style,
+        )
+        return buffer.getvalue()
+
+    def _skip_front_matter(self, lines, max_buffer_size, buffer_options):
+        """
+        Copy any front matter to the output, and yield the rest of `lines`.
+
+        This yields (`line_index`, `line`) tuples.  Front matter is only
+        known to be front matter at its closing line, so it is buffered
+        until then; without one, its lines are yielded after all.
+        """
+        import shutil
+        import tempfile
+
+        lines = iter(lines)
+        first_line = next(lines, None)
+        if first_line is None:
+            return
+        syntax = self._get_syntax()
+        closers = _get_front_matter_closers(first_line, syntax)
+        if closers is None:
+            for item in enumerate(itertools.chain([first_line], lines)):
+                yield item
+            return
+        with tempfile.SpooledTemporaryFile(
+            max_size=max_buffer_size, **buffer_options
+        ) as buffer:
+            buffer.write(first_line)
+            line_count = 1
+            for line in lines:
+                buffer.write(line)
+                line_count += 1
+                if line.rstrip(syntax.whitespace) in closers:
+                    buffer.seek(0)
+                    shutil.copyfileobj(buffer, self.outfile)
+                    self.front_matter_length = line_count
+                    break
             else:
-                self.outfile.write(line)
+                buffer.seek(0)
+                buffered_lines = (
+                    buffer if self.encoding is None else _split_binary_lines(buffer)
+                )
+                for item in enumerate(buffered_lines):
+                    yield item
+                return
+        for item in enumerate(lines, line_count):
+            yield item
+
+    def stream(
+        self,
+        heading_text,
+        heading_level,
+        skip_level,
+        numbered,
+        toc_comment,
+        alt_list_char,
+        add_trailing_heading_chars,
+        outfile=None,
+        max_buffer_size=DEFAULT_STREAM_BUFFER_SIZE,
+        anchor_style=slugs.DEFAULT_ANCHOR_STYLE,
+    ):
+        """
+        Parse and write the Markdown file in a single pass, in bounded memory.
+
+        Everything before the first table of contents token is written as
+        soon as it is read.  The rest is held until the end of the input,
+        since the table of contents needs every heading; it is spilled to a
+        temporary file once it grows beyond `max_buffer_size` characters.
+
+        Unlike `read()`:py:meth:, this never holds the whole input, so
+        `self.lines`:py:attr: is left unset.
+        """
+        import tempfile
+
+        if outfile is not None:
+            self.outfile = outfile
+        self.toc = Toc(
+            heading_text=heading_text,
+            heading_level=heading_level,
+            skip_level=skip_level,
+        )
+        add_item = self.toc.add_item
+        classifier = self._make_classifier()
+        classify = classifier.classify
+        binary = self.encoding is not None
+        if binary:
+            (lines, tail_options) = (_split_binary_lines(self.infile), {"mode": "w+b"})
+        else:
+            (lines, tail_options) = (self.infile, {"mode": "w+t", "newline": ""})
+        tail = None
+        tail_kinds = array.array("B")
+        line_index = 0
+        begin_index = None
+        try:
+            for (line_index, line) in self._skip_front_matter(
+                lines, max_buffer_size, tail_options
+            ):
+                (kind, level, text) = classify(line)
+                if kind == LINE_HEADING:
+                    add_item(self._decode(text) if binary else text, level)
+                elif kind in TOC_START_KINDS:
+                    self.toc.add_toc_position()
+                    begin_index = line_index
+                if tail is None:
+                    if kind not in TOC_START_KINDS:
+                        self.outfile.write(line)
+                        continue
+                    tail = tempfile.SpooledTemporaryFile(
+                        max_size=max_buffer_size, **tail_options
+                    )
+                tail.write(line)
+                tail_kinds.append(kind)
+        except ValueError as e:
+            self.line_index = line_index
+            raise ValueError(e.args[0], self.get_file_position())
+        if classifier.in_toc:
+            if tail is not None:
+                tail.close()
+            self._raise_unterminated_toc(begin_index)
+
+        if tail is None:
+            return
+        with tail:
+            tail.seek(0)
+            toc_text = self.toc.format(
+                numbered=numbered,
+                comment=toc_comment,
+                alt_list_char=alt_list_char,
+                add_trailing_heading_chars=add_trailing_heading_chars,
+                anchor_style=anchor_style,
+            )
+            tail_lines = _split_binary_lines(tail) if binary else tail
+            self.outfile.writelines(
+                _replace_tocs(tail_lines, tail_kinds, toc_text, self._match_token)
+            )
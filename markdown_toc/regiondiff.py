@@ -0,0 +1,136 @@
+"""
+Make unified diffs of texts known to differ only in certain regions.
+
+`difflib.unified_diff()`:py:func: compares every line of both texts, which
+takes a long time on large documents.  When only some regions can have
+changed, such as the tables of contents of a Markdown file, only those
+regions need comparing; everything between them is known to be equal.
+The output is in the same format as `difflib.unified_diff()`:py:func:,
+with the same hunk offsets and context.
+"""
+
+DEFAULT_CONTEXT_LINES = 3
+
+####################
+
+
+def _merge_adjacent_regions(regions):
+    """Merge regions with no lines between them, since difflib sees them as one."""
+    merged = []
+    for region in regions:
+        if merged and region[0] == merged[-1][1]:
+            (a_start, _a_end, b_start, _b_end) = merged.pop()
+            region = (a_start, region[1], b_start, region[3])
+        merged.append(region)
+    return merged
+
+
+def _get_opcodes(a, b, regions):
+    """
+    Get `difflib.SequenceMatcher.get_opcodes()`:py:meth: for all of `a` and `b`.
+
+    Only the regions are compared; the lines between them are equal.
+    """
+    import difflib
+
+    opcodes = []
+
+    def add_opcode(tag, i1, i2, j1, j2):
+        # Runs of equal lines are merged, as difflib would have found them.
+        if tag == "equal" and opcodes and opcodes[-1][0] == "equal":
+            (tag, i1, _i2, j1, _j2) = opcodes.pop()
+        opcodes.append((tag, i1, i2, j1, j2))
+
+    (i, j) = (0, 0)
+    for (a_start, a_end, b_start, b_end) in _merge_adjacent_regions(regions):
+        if a_start > i:
+            add_opcode("equal", i, a_start, j, b_start)
+        matcher = difflib.SequenceMatcher(
+            None, a[a_start:a_end], b[b_start:b_end], autojunk=False
+        )
+        for (tag, i1, i2, j1, j2) in matcher.get_opcodes():
+            add_opcode(tag, a_start + i1, a_start + i2, b_start + j1, b_start + j2)
+        (i, j) = (a_end, b_end)
+    if len(a) > i:
+        add_opcode("equal", i, len(a), j, len(b))
+    return opcodes
+
+
+def _group_opcodes(opcodes, n):
+    """Group opcodes into hunks with `n` lines of context, as difflib does."""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        (tag, i1, i2, j1, j2) = codes[0]
+        codes[0] = (tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2)
+    if codes[-1][0] == "equal":
+        (tag, i1, i2, j1, j2) = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n))
+    group = []
+    for (tag, i1, i2, j1, j2) in codes:
+        # A long stretch of equal lines ends one hunk and starts the next.
+        if tag == "equal" and i2 - i1 > n + n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            (i1, j1) = (max(i1, i2 - n), max(j1, j2 - n))
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start, stop):
+    """Format a hunk's line range as `difflib.unified_diff()`:py:func: does."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return "{beginning},{length}".format(beginning=beginning, length=length)
+
+
+def unified_diff(
+    a, b, regions, fromfile="", tofile="", n=DEFAULT_CONTEXT_LINES, lineterm="\n"
+):
+    """
+    Compare `a` and `b`, two lists of lines, in unified diff format.
+
+    :Args:
+        a, b
+            The lines to compare
+
+        regions
+            A list of (`a_start`, `a_end`, `b_start`, `b_end`) tuples, in
+            order and not overlapping, giving the only ranges of lines (with
+            exclusive ends) that may differ; the lines before, between and
+            after them must be the same in `a` and `b`
+
+        fromfile, tofile, n, lineterm
+            (optional) As for `difflib.unified_diff()`:py:func:
+
+    :Returns:
+        An iterator of the lines of the diff
+    """
+    started = False
+    for group in _group_opcodes(_get_opcodes(a, b, regions), n):
+        if not started:
+            started = True
+            yield "--- {name}{lineterm}".format(name=fromfile, lineterm=lineterm)
+            yield "+++ {name}{lineterm}".format(name=tofile, lineterm=lineterm)
+        (first, last) = (group[0], group[-1])
+        yield "@@ -{a_range} +{b_range} @@{lineterm}".format(
+            a_range=_format_range(first[1], last[2]),
+            b_range=_format_range(first[3], last[4]),
+            lineterm=lineterm,
+        )
+        for (tag, i1, i2, j1, j2) in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    yield " " + line
+                continue
+            if tag in ("replace", "delete"):
+                for line in a[i1:i2]:
+                    yield "-" + line
+            if tag in ("replace", "insert"):
+                for line in b[j1:j2]:
+                    yield "+" + line
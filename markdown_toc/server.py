@@ -0,0 +1,261 @@
+"""
+Provide a daemon that runs markdown-toc for `~markdown_toc.client`:py:mod:.
+
+The daemon keeps a warm interpreter, with every module imported and every
+regex compiled, and listens on a Unix domain socket.  Each request is run
+in a child process forked from the daemon, so requests cannot interfere
+with one another or with the daemon; the child adopts the client's working
+directory, environment and standard file descriptors, and runs
+`~markdown_toc.cli.main()`:py:func: exactly as the command line would.
+"""
+
+from __future__ import print_function
+
+import array
+import errno
+import importlib
+import os
+import select
+import signal
+import socket
+import stat
+import struct
+import sys
+import time
+import traceback
+
+from . import cli, client
+
+DEFAULT_IDLE_TIMEOUT = cli.DEFAULT_IDLE_TIMEOUT
+
+LISTEN_BACKLOG = 64
+
+# Modules the CLI imports lazily; a daemon can afford to import them up front.
+WARM_UP_MODULES = ["concurrent.futures", "datetime", "difflib", "tempfile"]
+
+####################
+
+
+def _warm_up():
+    """Do up front the lazy work a request would otherwise pay for."""
+    for module_name in WARM_UP_MODULES:
+        importlib.import_module(module_name)
+
+
+def _make_socket_dir(socket_path):
+    """Make sure the socket's directory exists and belongs only to us."""
+    socket_dir = os.path.dirname(socket_path)
+    if not socket_dir:
+        return
+    try:
+        os.mkdir(socket_dir, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    dir_stat = os.lstat(socket_dir)
+    if not stat.S_ISDIR(dir_stat.st_mode) or dir_stat.st_uid != os.getuid():
+        raise RuntimeError(
+            "{socket_dir}: socket directory is not owned by this user".format(
+                socket_dir=socket_dir
+            )
+        )
+
+
+def _remove_stale_socket(socket_path):
+    """Remove a socket left behind by a daemon that is no longer running."""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+    else:
+        raise RuntimeError(
+            "{socket_path}: a daemon is already listening".format(
+                socket_path=socket_path
+            )
+        )
+    finally:
+        probe.close()
+
+
+def _listen(socket_path):
+    _make_socket_dir(socket_path)
+    _remove_stale_socket(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        listener.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    listener.listen(LISTEN_BACKLOG)
+    return listener
+
+
+def _receive_request(conn):
+    """
+    Receive a request and the client's standard file descriptors.
+
+    :Returns:
+        A tuple (`argv`, `cwd`, `environ`, `fds`)
+    """
+    fds = array.array("i")
+    length_size = struct.calcsize(client.LENGTH_FORMAT)
+    (data, ancdata, _flags, _address) = conn.recvmsg(
+        length_size, socket.CMSG_SPACE(len(client.STDIO_FDS) * fds.itemsize)
+    )
+    for (level, kind, cmsg_data) in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            usable_size = len(cmsg_data) - (len(cmsg_data) % fds.itemsize)
+            fds.frombytes(cmsg_data[:usable_size])
+    if len(data) != length_size or len(fds) != len(client.STDIO_FDS):
+        for fd in fds:
+            os.close(fd)
+        raise ValueError("malformed request")
+    (length,) = struct.unpack(client.LENGTH_FORMAT, data)
+    (argv, cwd, environ) = client.decode_request(client.recv_exactly(conn, length))
+    return (argv, cwd, environ, list(fds))
+
+
+def _get_exit_status(wait_status):
+    if os.WIFEXITED(wait_status):
+        return os.WEXITSTATUS(wait_status)
+    if os.WIFSIGNALED(wait_status):
+        return 128 + os.WTERMSIG(wait_status)
+    return cli.STATUS_FAILURE
+
+
+def _run_request(argv, cwd, environ, fds):
+    """Run one request in a freshly forked child; never returns."""
+    status = cli.STATUS_FAILURE
+    try:
+        for (fd, target_fd) in zip(fds, client.STDIO_FDS):
+            os.dup2(fd, target_fd)
+            os.close(fd)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+        sys.argv = list(argv)
+        try:
+            status = cli.main(*argv)
+        except SystemExit as e:
+            if e.code is None:
+                status = cli.STATUS_SUCCESS
+            elif isinstance(e.code, int):
+                status = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                status = cli.STATUS_FAILURE
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(status)  # pylint: disable=protected-access
+
+
+def serve(socket_path=None, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """
+    Serve requests until idle for `idle_timeout` seconds.
+
+    :Args:
+        socket_path
+            (optional) The path to listen on (default: see
+            `~markdown_toc.client.get_socket_path()`:py:func:)
+
+        idle_timeout
+            (optional) Seconds to wait with no requests in progress before
+            shutting down
+
+    :Returns:
+        An exit status
+    """
+    if socket_path is None:
+        socket_path = client.get_socket_path()
+    _warm_up()
+    listener = _listen(socket_path)
+
+    # Wake up the select() below whenever a child exits.
+    (wakeup_read_fd, wakeup_write_fd) = os.pipe()
+    os.set_blocking(wakeup_read_fd, False)
+    os.set_blocking(wakeup_write_fd, False)
+    signal.signal(signal.SIGCHLD, lambda _signum, _frame: None)
+    signal.set_wakeup_fd(wakeup_write_fd)
+
+    pending = {}
+    last_active = time.monotonic()
+    try:
+        while True:
+            if pending:
+                timeout = None
+            else:
+                timeout = last_active + idle_timeout - time.monotonic()
+                if timeout <= 0:
+                    break
+            try:
+                (readable, _w, _x) = select.select(
+                    [listener, wakeup_read_fd], [], [], timeout
+                )
+            except InterruptedError:
+                readable = []
+
+            if wakeup_read_fd in readable:
+                try:
+                    while os.read(wakeup_read_fd, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+
+            if listener in readable:
+                last_active = time.monotonic()
+                (conn, _address) = listener.accept()
+                try:
+                    (argv, cwd, environ, fds) = _receive_request(conn)
+                except (OSError, ValueError) as e:
+                    print(
+                        "{socket_path}: bad request: {e}".format(
+                            socket_path=socket_path, e=e
+                        ),
+                        file=sys.stderr,
+                    )
+                    conn.close()
+                else:
+                    pid = os.fork()
+                    if pid == 0:
+                        listener.close()
+                        conn.close()
+                        signal.set_wakeup_fd(-1)
+                        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                        _run_request(argv, cwd, environ, fds)
+                    for fd in fds:
+                        os.close(fd)
+                    pending[pid] = conn
+
+            while pending:
+                (pid, wait_status) = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                conn = pending.pop(pid, None)
+                if conn is None:
+                    continue
+                try:
+                    conn.sendall(
+                        struct.pack(client.STATUS_FORMAT, _get_exit_status(wait_status))
+                    )
+                except OSError:
+                    pass
+                conn.close()
+                last_active = time.monotonic()
+    finally:
+        signal.set_wakeup_fd(-1)
+        os.close(wakeup_read_fd)
+        os.close(wakeup_write_fd)
+        listener.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    return cli.STATUS_SUCCESS
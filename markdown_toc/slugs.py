@@ -0,0 +1,232 @@
+"""
+Make anchor names ("slugs") for headings the way Markdown renderers do.
+
+Each anchor style reproduces how a particular site turns heading text into
+the ``id`` of the heading's anchor:
+
+``plain``
+    The default, and what **markdown-toc** has always done: keep letters and
+    numbers, lowercased; turn each whitespace character and ``-`` into
+    ``-``; drop everything else.  Duplicates are left alone.
+
+``github``
+    Lowercase; keep letters, marks, numbers, ``_`` and ``-``; turn each
+    space into ``-``; drop everything else.  Duplicates get ``-1``, ``-2``,
+    and so on.
+
+``gitlab``
+    Like ``github``, but only decimal digits count as numbers, and runs of
+    ``-`` are squeezed into one.
+
+``bitbucket``
+    Reduce to ASCII; keep letters, digits, whitespace, ``_`` and ``-``;
+    lowercase; collapse runs of whitespace and ``-`` into one ``-``; and
+    prefix with ``markdown-header-``.  Duplicates get ``_1``, ``_2``, and
+    so on.
+
+Characters are mapped with `str.translate()`:py:meth: tables, which are
+filled in once per character, and the anchor for each heading text is
+memoized, so rendering the same headings again is cheap.
+"""
+
+import functools
+import re
+
+ANCHOR_STYLE_PLAIN = "plain"
+ANCHOR_STYLE_GITHUB = "github"
+ANCHOR_STYLE_GITLAB = "gitlab"
+ANCHOR_STYLE_BITBUCKET = "bitbucket"
+
+ANCHOR_STYLES = [
+    ANCHOR_STYLE_PLAIN,
+    ANCHOR_STYLE_GITHUB,
+    ANCHOR_STYLE_GITLAB,
+    ANCHOR_STYLE_BITBUCKET,
+]
+
+DEFAULT_ANCHOR_STYLE = ANCHOR_STYLE_PLAIN
+
+BITBUCKET_PREFIX = "markdown-header-"
+BITBUCKET_SEPARATOR_PATTERN = r"[-\s]+"
+
+# Separator between a duplicate anchor name and its suffix (None: no suffix)
+DUPLICATE_SEPARATORS = {
+    ANCHOR_STYLE_PLAIN: None,
+    ANCHOR_STYLE_GITHUB: "-",
+    ANCHOR_STYLE_GITLAB: "-",
+    ANCHOR_STYLE_BITBUCKET: "_",
+}
+
+# Unicode general categories (by first letter, or in full) kept in anchors
+KEPT_CATEGORIES = {
+    ANCHOR_STYLE_GITHUB: ("L", "M", "N", "Pc"),
+    ANCHOR_STYLE_GITLAB: ("L", "M", "Nd", "Pc"),
+}
+
+SLUG_CACHE_SIZE = 65536
+
+# Characters whose translations are worked out up front
+PRECOMPUTED_CHARS = 256
+
+####################
+
+
+class _TranslationTable(dict):
+    """
+    Provide a `str.translate()`:py:meth: table that fills itself in.
+
+    Each character's translation is computed by `translate_char` the first
+    time the character is seen, and then kept.
+    """
+
+    def __init__(self, translate_char):
+        super(_TranslationTable, self).__init__()
+        self.translate_char = translate_char
+        for codepoint in range(PRECOMPUTED_CHARS):
+            self[codepoint] = translate_char(chr(codepoint))
+
+    def __missing__(self, codepoint):
+        translation = self[codepoint] = self.translate_char(chr(codepoint))
+        return translation
+
+
+def _make_category_translator(kept_categories):
+    import unicodedata
+
+    def translate_char(c):
+        if c == " ":
+            return "-"
+        if c == "-":
+            return c
+        category = unicodedata.category(c)
+        if category in kept_categories or category[0] in kept_categories:
+            return c
+        return None
+
+    return translate_char
+
+
+def _translate_plain_char(c):
+    if c.isalnum():
+        return c.lower()
+    if c.isspace() or c == "-":
+        return "-"
+    return None
+
+
+def _translate_bitbucket_char(c):
+    if c.isspace() or c == "-" or c == "_" or (ord(c) < 128 and c.isalnum()):
+        return c
+    return None
+
+
+_translation_tables = {}
+
+
+def _get_translation_table(style):
+    table = _translation_tables.get(style)
+    if table is None:
+        if style == ANCHOR_STYLE_PLAIN:
+            translate_char = _translate_plain_char
+        elif style == ANCHOR_STYLE_BITBUCKET:
+            translate_char = _translate_bitbucket_char
+        else:
+            translate_char = _make_category_translator(KEPT_CATEGORIES[style])
+        table = _translation_tables[style] = _TranslationTable(translate_char)
+    return table
+
+
+@functools.lru_cache(maxsize=SLUG_CACHE_SIZE)
+def make_slug(text, style=DEFAULT_ANCHOR_STYLE):
+    """
+    Make the anchor name for heading `text`, ignoring any duplicates.
+
+    :Args:
+        text
+            The heading text
+
+        style
+            (optional) One of `ANCHOR_STYLES`
+
+    :Returns:
+        The anchor name, without the leading '#'
+
+    :Raises:
+        `ValueError`:py:exc: if `style` is not recognized
+    """
+    if style not in DUPLICATE_SEPARATORS:
+        raise ValueError("{style}: unrecognized anchor style".format(style=style))
+    if style == ANCHOR_STYLE_BITBUCKET:
+        import unicodedata
+
+        slug = unicodedata.normalize("NFKD", text)
+        slug = slug.translate(_get_translation_table(style)).strip().lower()
+        return BITBUCKET_PREFIX + re.sub(BITBUCKET_SEPARATOR_PATTERN, "-", slug)
+    if style == ANCHOR_STYLE_PLAIN:
+        return text.translate(_get_translation_table(style))
+    slug = text.lower().translate(_get_translation_table(style))
+    if style == ANCHOR_STYLE_GITLAB:
+        while "--" in slug:
+            slug = slug.replace("--", "-")
+    return slug
+
+
+class Slugger(object):
+    """
+    Make unique anchor names for the headings of one document.
+
+    Anchors must be made in document order, since a heading whose anchor
+    name was already taken gets a numbered suffix (except in the ``plain``
+    style).
+
+    :Args:
+        style
+            (optional) One of `ANCHOR_STYLES`
+    """
+
+    def __init__(self, style=DEFAULT_ANCHOR_STYLE):
+        if style not in DUPLICATE_SEPARATORS:
+            raise ValueError("{style}: unrecognized anchor style".format(style=style))
+        self.style = style
+        self.separator = DUPLICATE_SEPARATORS[style]
+        # Maps each anchor name taken to the last suffix tried for it
+        self._taken = {}
+
+    @property
+    def anchor_names(self):
+        """Get every anchor name made so far, in the order they were made."""
+        return list(self._taken)
+
+    def _make_unique(self, base):
+        taken = self._taken
+        prefix = base + self.separator
+        slug = base
+        while slug in taken:
+            taken[base] += 1
+            slug = prefix + str(taken[base])
+        taken[slug] = 0
+        return slug
+
+    def slug(self, text):
+        """Make the anchor name for the next heading, with text `text`."""
+        slug = make_slug(text, self.style)
+        if slug in self._taken and self.separator is not None:
+            return self._make_unique(slug)
+        self._taken[slug] = 0
+        return slug
+
+    def slug_all(self, texts):
+        """Make the anchor names for the next headings, with texts `texts`."""
+        style = self.style
+        separator = self.separator
+        taken = self._taken
+        slugs = []
+        append = slugs.append
+        for text in texts:
+            slug = make_slug(text, style)
+            if slug not in taken:
+                taken[slug] = 0
+            elif separator is not None:
+                slug = self._make_unique(slug)
+            append(slug)
+        return slugs
@@ -0,0 +1,195 @@
+"""
+Time the phases of processing each file, and report the results.
+
+Each phase is timed both by the wall clock and by the CPU time of the
+process doing the work, so that time spent waiting on I/O stands out from
+time spent computing.  Timings are written as JSON lines, one object per
+file, for other tools to pick apart.
+"""
+
+import sys
+import time
+
+TOTAL_KEY = "total"
+
+####################
+
+
+class TimeLimitExceeded(Exception):
+    """Raise when work runs past the limit set by `time_limit()`:py:func:."""
+
+
+def can_limit_time():
+    """Tell whether `time_limit()`:py:func: works on this platform."""
+    import signal
+
+    return hasattr(signal, "setitimer")
+
+
+def time_limit(seconds):
+    """
+    Limit the wall-clock time spent in a ``with`` block.
+
+    The limit is kept by a ``SIGALRM`` interval timer, so it stops the work
+    wherever it is, even in a single long-running call; this only works in
+    the main thread, and only where `can_limit_time()`:py:func: is true.
+
+    :Args:
+        seconds
+            The time limit, or `None` for no limit
+
+    :Returns:
+        A context manager for the ``with`` block
+
+    :Raises:
+        `TimeLimitExceeded`:py:exc: if the block runs longer than `seconds`
+    """
+    return _TimeLimit(seconds)
+
+
+class _TimeLimit(object):
+    """Keep the limit set by `time_limit()`:py:func:."""
+
+    # A class rather than `contextlib.contextmanager()`:py:func:, so that
+    # importing this module does not import `contextlib`:py:mod:.
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._previous_handler = None
+
+    def __enter__(self):
+        if self.seconds is None:
+            return self
+        import signal
+
+        seconds = self.seconds
+
+        def handle_alarm(_signum, _frame):
+            raise TimeLimitExceeded(seconds)
+
+        self._previous_handler = signal.signal(signal.SIGALRM, handle_alarm)
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+        return self
+
+    def __exit__(self, _exc_type, _exc_value, _traceback):
+        if self.seconds is None:
+            return False
+        import signal
+
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self._previous_handler)
+        return False
+
+
+class NullTimer(object):
+    """Provide a timer that does nothing, for when no timings are wanted."""
+
+    def start(self, phase):
+        """Ignore the phase; this timer records nothing."""
+
+    def stop(self):
+        """Ignore the end of timing; this timer records nothing."""
+
+
+NULL_TIMER = NullTimer()
+
+
+class PhaseTimer(object):
+    """
+    Time the phases of processing one file.
+
+    Phases run one after another: starting one ends the last.  A phase
+    started more than once accumulates its times.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._phase_names = []
+        self._phase = None
+        self._start_wall = self._phase_wall = time.perf_counter()
+        self._start_cpu = self._phase_cpu = time.process_time()
+        self._end_wall = None
+        self._end_cpu = None
+
+    def _end_phase(self):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if self._phase is not None:
+            if self._phase not in self.phases:
+                self.phases[self._phase] = [0.0, 0.0]
+                self._phase_names.append(self._phase)
+            times = self.phases[self._phase]
+            times[0] += wall - self._phase_wall
+            times[1] += cpu - self._phase_cpu
+        (self._phase_wall, self._phase_cpu) = (wall, cpu)
+        return (wall, cpu)
+
+    def start(self, phase):
+        """End the current phase, if any, and start `phase`."""
+        self._end_phase()
+        self._phase = phase
+
+    def stop(self):
+        """End the current phase, if any, and stop timing."""
+        (self._end_wall, self._end_cpu) = self._end_phase()
+        self._phase = None
+
+    @property
+    def wall_time(self):
+        """Get the total wall-clock time, in seconds, up to `stop()`:py:meth:."""
+        return self._end_wall - self._start_wall
+
+    def get_record(self, filename, status):
+        """
+        Get the timings as a record for `TimingsWriter`:py:class:.
+
+        :Returns:
+            A dict with the file's name and exit status, and the wall-clock
+            and CPU time, in seconds, of each phase and in total
+        """
+        phases = {}
+        for name in self._phase_names:
+            (wall, cpu) = self.phases[name]
+            phases[name] = {"wall": round(wall, 6), "cpu": round(cpu, 6)}
+        phases[TOTAL_KEY] = {
+            "wall": round(self.wall_time, 6),
+            "cpu": round(self._end_cpu - self._start_cpu, 6),
+        }
+        return {"file": filename, "status": status, "phases": phases}
+
+
+class TimingsWriter(object):
+    """
+    Write timing records as JSON lines.
+
+    :Args:
+        path
+            The path to the file to write, or ``-`` for stderr
+
+        threshold
+            (optional) The total wall-clock time, in seconds, below which a
+            file's timings are not written
+    """
+
+    def __init__(self, path, threshold=0.0):
+        self.path = path
+        self.threshold = threshold
+        if path == "-":
+            self.file = sys.stderr
+        else:
+            self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        """Write `record` if its total wall-clock time reaches the threshold."""
+        import json
+
+        if record["phases"][TOTAL_KEY]["wall"] < self.threshold:
+            return
+        self.file.write(json.dumps(record))
+        self.file.write("\n")
+        self.file.flush()
+
+    def close(self):
+        """Close the file written, unless it is stderr."""
+        if self.file is not sys.stderr:
+            self.file.close()
@@ -0,0 +1,378 @@
+"""
+Find the Markdown files to process under a set of input paths.
+
+Directories are walked lazily with `os.scandir()`:py:func:, so files are
+found (and can be processed) as the walk goes, rather than after the whole
+tree has been listed.  Files are selected by include and exclude patterns,
+and by the ``.gitignore`` files in effect, and each file is produced only
+once, however many paths (including symbolic links) lead to it.
+"""
+
+from __future__ import print_function
+
+import os
+import os.path
+import re
+import stat
+import sys
+
+from .defaults import MARKDOWN_PATTERNS
+
+GITIGNORE_BASENAME = ".gitignore"
+GIT_DIRNAME = ".git"
+
+####################
+
+
+def _translate_gitignore_glob(glob):
+    """Translate a ``.gitignore`` glob (without any leading '/') to a regex."""
+    parts = []
+    i = 0
+    length = len(glob)
+    while i < length:
+        c = glob[i]
+        if glob.startswith("**/", i):
+            # Zero or more leading directories
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("/**", i) and i + 3 == length:
+            # Everything inside
+            parts.append("/.*")
+            i += 3
+            continue
+        if glob.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            close = glob.find("]", i + 2 if glob.startswith("[!", i) else i + 1)
+            if close < 0:
+                parts.append(re.escape(c))
+            else:
+                bracket_start = i + 1
+                bracket = glob[bracket_start:close].replace("\\", "\\\\")
+                if bracket.startswith("!"):
+                    bracket = "^" + bracket[1:]
+                parts.append("[" + bracket + "]")
+                i = close
+        elif c == "\\" and i + 1 < length:
+            i += 1
+            parts.append(re.escape(glob[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+class GitignoreRule(object):
+    """
+    Provide one pattern from a ``.gitignore`` file.
+
+    :Args:
+        base_dir
+            The absolute path to the directory containing the ``.gitignore``
+            file
+
+        pattern
+            The pattern, as it appears in the file
+    """
+
+    def __init__(self, base_dir, pattern):
+        self.base_dir = base_dir.rstrip(os.sep)
+        self.negated = pattern.startswith("!")
+        if self.negated:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # A pattern with a '/' anywhere but the end is relative to `base_dir`;
+        # otherwise it matches a name at any level below it.
+        self.anchored = "/" in pattern
+        self.regex = re.compile(_translate_gitignore_glob(pattern.lstrip("/")) + r"\Z")
+
+    def match(self, rel_path, name, is_dir):
+        """Tell whether the rule matches; `rel_path` is relative to `base_dir`."""
+        if self.dir_only and not is_dir:
+            return False
+        return bool(self.regex.match(rel_path if self.anchored else name))
+
+
+def _strip_gitignore_line(line):
+    line = line.rstrip("\n").rstrip("\r")
+    if not line or line.startswith("#"):
+        return ""
+    # Trailing spaces are ignored unless escaped.
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    # A leading '\\#' or '\\!' stays escaped, and so matches literally.
+    return stripped
+
+
+def read_gitignore(dir_path):
+    """
+    Read the ``.gitignore`` file in `dir_path`, if any.
+
+    :Returns:
+        A list of `GitignoreRule`:py:class: objects (empty if there is no
+        ``.gitignore`` file)
+    """
+    try:
+        with open(
+            os.path.join(dir_path, GITIGNORE_BASENAME),
+            encoding="utf-8",
+            errors="surrogateescape",
+        ) as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        pattern = _strip_gitignore_line(line)
+        if pattern and pattern not in ("!", "/"):
+            rules.append(GitignoreRule(dir_path, pattern))
+    return rules
+
+
+def is_ignored(rules, abs_path, is_dir):
+    """
+    Tell whether `abs_path` is ignored by `rules`.
+
+    Rules are in order of precedence, lowest first, so the last matching
+    rule wins.
+    """
+    name = os.path.basename(abs_path)
+    for rule in reversed(rules):
+        rel_start = len(rule.base_dir) + 1
+        rel_path = abs_path[rel_start:].replace(os.sep, "/")
+        if rule.match(rel_path, name, is_dir):
+            return not rule.negated
+    return False
+
+
+def _get_ancestor_rules(top):
+    """Get the ``.gitignore`` rules inherited by `top` from its repository."""
+    ancestors = []
+    dir_path = os.path.dirname(os.path.abspath(top))
+    while True:
+        ancestors.append(dir_path)
+        if os.path.exists(os.path.join(dir_path, GIT_DIRNAME)):
+            break
+        parent = os.path.dirname(dir_path)
+        if parent == dir_path:
+            # Not in a repository: only the directory's own files apply.
+            return []
+        dir_path = parent
+    rules = []
+    for dir_path in reversed(ancestors):
+        rules.extend(read_gitignore(dir_path))
+    return rules
+
+
+####################
+
+
+def _compile_patterns(patterns):
+    """Compile glob patterns into a list of (`regex`, `is_path_pattern`)."""
+    # fnmatch is only needed (and so only imported) when walking directories.
+    import fnmatch
+
+    return [(re.compile(fnmatch.translate(x)), "/" in x) for x in patterns]
+
+
+def _matches_any(compiled_patterns, rel_path, name):
+    for (regex, is_path_pattern) in compiled_patterns:
+        if regex.match(rel_path if is_path_pattern else name):
+            return True
+    return False
+
+
+class FileFinder(object):
+    """
+    Find the files to process under a set of input paths.
+
+    :Args:
+        include
+            (optional) Glob patterns for files to take from directories
+            (default: `MARKDOWN_PATTERNS`)
+
+        exclude
+            (optional) Glob patterns for files and directories to leave out
+            of directories
+
+        use_gitignore
+            (optional) Whether to leave out files and directories ignored by
+            ``.gitignore`` files
+
+    Patterns without a '/' match a file or directory name; patterns with a
+    '/' match a path relative to the input directory.  Files given
+    explicitly are always used.
+    """
+
+    def __init__(self, include=None, exclude=None, use_gitignore=True):
+        self.include = _compile_patterns(include or MARKDOWN_PATTERNS)
+        self.exclude = _compile_patterns(exclude or [])
+        self.use_gitignore = use_gitignore
+        self._seen = set()
+
+    def _is_new(self, stat_result):
+        key = (stat_result.st_dev, stat_result.st_ino)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
+
+    def is_selected(self, rel_path):
+        """
+        Tell whether the file at `rel_path` is included and not excluded.
+
+        `rel_path` uses '/' as a separator; a match on any of its parent
+        directories also excludes it.
+        """
+        parts = rel_path.split("/")
+        for i in range(1, len(parts) + 1):
+            if _matches_any(self.exclude, "/".join(parts[:i]), parts[i - 1]):
+                return False
+        return _matches_any(self.include, rel_path, parts[-1])
+
+    def iter_files(self, paths):
+        """
+        Yield the files to process under `paths`, as they are found.
+
+        Anything that is not a directory, including a path that does not
+        exist or ``-`` for stdin, is yielded as is, so that processing it
+        reports any error.
+        """
+        for path in paths:
+            if path == "-":
+                yield path
+                continue
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                yield path
+                continue
+            if not stat.S_ISDIR(stat_result.st_mode):
+                if self._is_new(stat_result):
+                    yield path
+                continue
+            if not self._is_new(stat_result):
+                continue
+            for file_path in self._walk(path):
+                yield file_path
+
+    def get_top_dir(self, top):
+        """
+        Get the directory `top`, given as an input path, ready to walk.
+
+        :Returns:
+            A walk directory, to pass to `list_dir()`:py:meth:,
+            `get_subdir()`:py:meth: and `is_selected_in()`:py:meth:; it is a
+            tuple whose first item is the directory's path
+        """
+        rules = _get_ancestor_rules(top) if self.use_gitignore else []
+        return self._make_walk_dir(top, os.path.abspath(top), "", rules)
+
+    def get_subdir(self, walk_dir, name):
+        """Get the subdirectory `name` of the walk directory `walk_dir`."""
+        (dir_path, abs_dir_path, rel_dir_path, rules) = walk_dir
+        return self._make_walk_dir(
+            os.path.join(dir_path, name),
+            os.path.join(abs_dir_path, name),
+            rel_dir_path + name + "/",
+            rules,
+        )
+
+    def _make_walk_dir(self, dir_path, abs_dir_path, rel_dir_path, rules):
+        # A directory's own .gitignore applies to everything below it.
+        if self.use_gitignore:
+            rules = rules + read_gitignore(abs_dir_path)
+        return (dir_path, abs_dir_path, rel_dir_path, rules)
+
+    def is_selected_in(self, walk_dir, name, is_dir):
+        """
+        Tell whether an entry in the walk directory `walk_dir` is selected.
+
+        A selected directory is walked, and a selected file is processed.
+        """
+        (_dir_path, abs_dir_path, rel_dir_path, rules) = walk_dir
+        if is_dir and name == GIT_DIRNAME:
+            return False
+        rel_path = rel_dir_path + name
+        if _matches_any(self.exclude, rel_path, name):
+            return False
+        if rules and is_ignored(rules, os.path.join(abs_dir_path, name), is_dir):
+            return False
+        return is_dir or _matches_any(self.include, rel_path, name)
+
+    def list_dir(self, walk_dir):
+        """
+        List the selected entries in the walk directory `walk_dir`.
+
+        :Returns:
+            A tuple (`subdirs`, `files`) of lists of `os.DirEntry`:py:class:
+            objects, in name order
+
+        :Raises:
+            `OSError`:py:exc: if the directory cannot be read
+        """
+        subdirs = []
+        files = []
+        for entry in sorted(os.scandir(walk_dir[0]), key=lambda x: x.name):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if self.is_selected_in(walk_dir, entry.name, is_dir):
+                (subdirs if is_dir else files).append(entry)
+        return (subdirs, files)
+
+    def _walk(self, top):
+        # Walk iteratively, depth first and in name order, so that a deep tree
+        # cannot exhaust the recursion limit.
+        pending = [self.get_top_dir(top)]
+        while pending:
+            walk_dir = pending.pop()
+            try:
+                (subdirs, files) = self.list_dir(walk_dir)
+            except OSError as e:
+                print(
+                    "{dir_path}: cannot read directory: {message}".format(
+                        dir_path=walk_dir[0], message=e.strerror
+                    ),
+                    file=sys.stderr,
+                )
+                continue
+            for entry in files:
+                try:
+                    stat_result = entry.stat()
+                except OSError:
+                    continue
+                if self._is_new(stat_result):
+                    yield entry.path
+            new_subdirs = []
+            for entry in subdirs:
+                try:
+                    # Following a symbolic link could lead back up the tree.
+                    # Of two names for one directory, the first in name order
+                    # is the one walked.
+                    if self._is_new(entry.stat()):
+                        new_subdirs.append(entry)
+                except OSError:
+                    continue
+            for entry in reversed(new_subdirs):
+                pending.append(self.get_subdir(walk_dir, entry.name))
+
+
+def iter_files(paths, include=None, exclude=None, use_gitignore=True):
+    """
+    Yield the files to process under `paths`, as they are found.
+
+    See `FileFinder`:py:class: for the arguments.
+    """
+    finder = FileFinder(include=include, exclude=exclude, use_gitignore=use_gitignore)
+    return finder.iter_files(paths)
@@ -0,0 +1,429 @@
+"""
+Watch Markdown files and update their tables of contents when they change.
+
+On Linux, changes are reported by inotify; elsewhere, files are polled.
+Under directories, the files and directories watched are those a
+`~markdown_toc.walk.FileFinder`:py:class: selects, so ``.gitignore`` files
+and exclude patterns apply.  Bursts of changes are debounced, and only the
+files that changed are processed.  Changes made by the watcher itself are
+recognized and ignored, so it never reacts to its own writes.
+"""
+
+from __future__ import print_function
+
+import os
+import os.path
+import select
+import struct
+import sys
+import time
+
+from . import walk
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 1.0
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+INOTIFY_EVENT_FORMAT = "iIII"
+INOTIFY_EVENT_SIZE = struct.calcsize(INOTIFY_EVENT_FORMAT)
+INOTIFY_READ_SIZE = 64 * 1024
+
+####################
+
+
+def _get_signature(path):
+    """Get a (size, mtime) signature for `path`, or `None` if it is gone."""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return (stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def _walk_dirs(finder, top_walk_dir, seen_real_paths, enter_dir):
+    """
+    Walk `top_walk_dir` and the directories selected below it.
+
+    The walk is iterative, so that a deep tree cannot exhaust the recursion
+    limit, and goes into each directory only once, by its real path, so that
+    symbolic links cannot lead it round in circles.
+
+    :Args:
+        finder
+            The `~markdown_toc.walk.FileFinder`:py:class: that selects
+            directories and files
+
+        top_walk_dir
+            The walk directory to start from
+
+        seen_real_paths
+            A set of the real paths of the directories already walked, which
+            is updated as the walk goes
+
+        enter_dir
+            A callable taking a walk directory and its real path, called for
+            each directory just before it is listed
+
+    :Returns:
+        A list of the paths of the selected files found
+    """
+    file_paths = []
+    pending = [top_walk_dir]
+    while pending:
+        walk_dir = pending.pop()
+        real_path = os.path.realpath(walk_dir[0])
+        if real_path in seen_real_paths:
+            continue
+        seen_real_paths.add(real_path)
+        enter_dir(walk_dir, real_path)
+        try:
+            (subdirs, files) = finder.list_dir(walk_dir)
+        except OSError:
+            # Gone (or unreadable) already; nothing to report
+            continue
+        file_paths.extend(x.path for x in files)
+        pending.extend(finder.get_subdir(walk_dir, x.name) for x in reversed(subdirs))
+    return file_paths
+
+
+class PollingWatcher(object):
+    """
+    Detect changed files by polling.
+
+    Each poll stats every known file, but only re-lists a directory when the
+    directory's own mtime shows that entries were added or removed.
+
+    :Args:
+        files
+            Files to watch
+
+        dirs
+            Directories under which to watch the files `finder` selects
+
+        interval
+            (optional) Seconds between polls
+
+        finder
+            (optional) The `~markdown_toc.walk.FileFinder`:py:class: that
+            selects directories and files under `dirs` (default: Markdown
+            files not ignored by ``.gitignore`` files)
+    """
+
+    def __init__(self, files, dirs, interval=DEFAULT_POLL_INTERVAL, finder=None):
+        self.interval = interval
+        self._finder = walk.FileFinder() if finder is None else finder
+        self._explicit_files = set(files)
+        self._walk_dirs = {}
+        self._real_dir_paths = set()
+        self._dir_signatures = {}
+        self._file_signatures = {}
+        for path in files:
+            self._file_signatures[path] = _get_signature(path)
+        for top in dirs:
+            self._scan_tree(self._finder.get_top_dir(top), initial=True)
+
+    def _enter_dir(self, walk_dir, real_path):
+        dir_path = walk_dir[0]
+        self._walk_dirs[dir_path] = (walk_dir, real_path)
+        self._dir_signatures[dir_path] = _get_signature(dir_path)
+
+    def _add_files(self, paths, initial):
+        """Start watching files not watched yet; return them unless `initial`."""
+        changed = []
+        for path in paths:
+            if path not in self._file_signatures:
+                self._file_signatures[path] = _get_signature(path)
+                if not initial:
+                    changed.append(path)
+        return changed
+
+    def _scan_tree(self, walk_dir, initial):
+        file_paths = _walk_dirs(
+            self._finder, walk_dir, self._real_dir_paths, self._enter_dir
+        )
+        return self._add_files(file_paths, initial)
+
+    def _rescan_dir(self, dir_path):
+        """Look for new entries in a directory whose entries have changed."""
+        (walk_dir, _real_path) = self._walk_dirs[dir_path]
+        self._dir_signatures[dir_path] = _get_signature(dir_path)
+        try:
+            (subdirs, files) = self._finder.list_dir(walk_dir)
+        except OSError:
+            return []
+        changed = self._add_files([x.path for x in files], initial=False)
+        for entry in subdirs:
+            if entry.path not in self._walk_dirs:
+                subdir = self._finder.get_subdir(walk_dir, entry.name)
+                changed.extend(self._scan_tree(subdir, initial=False))
+        return changed
+
+    def wait(self, timeout):
+        """
+        Wait up to `timeout` seconds (forever if `None`) for changes.
+
+        :Returns:
+            A list of paths that may have changed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self.poll()
+            if changed:
+                return changed
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def poll(self):
+        """Check once for changes, without waiting."""
+        changed = []
+        for path in list(self._dir_signatures):
+            signature = _get_signature(path)
+            if signature is None:
+                del self._dir_signatures[path]
+                (_walk_dir, real_path) = self._walk_dirs.pop(path)
+                self._real_dir_paths.discard(real_path)
+            elif signature != self._dir_signatures[path]:
+                changed.extend(self._rescan_dir(path))
+        for (path, old_signature) in list(self._file_signatures.items()):
+            signature = _get_signature(path)
+            if signature is None and path not in self._explicit_files:
+                del self._file_signatures[path]
+            elif signature != old_signature:
+                self._file_signatures[path] = signature
+                changed.append(path)
+        return changed
+
+    def close(self):
+        """Stop watching."""
+
+
+class InotifyWatcher(object):
+    """
+    Detect changed files using Linux inotify.
+
+    Directories are watched rather than files, so that editors which save by
+    writing a new file and renaming it over the old one are noticed too.
+
+    :Args:
+        files
+            Files to watch
+
+        dirs
+            Directories under which to watch the files `finder` selects
+
+        finder
+            (optional) See `PollingWatcher`:py:class:
+
+    :Raises:
+        `OSError`:py:exc: if inotify is not available
+    """
+
+    def __init__(self, files, dirs, finder=None):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._finder = walk.FileFinder() if finder is None else finder
+        self._dirs_by_wd = {}
+        self._walk_dirs_by_wd = {}
+        self._real_dir_paths = set()
+        self._file_names_by_dir = {}
+        for path in files:
+            (dir_path, name) = os.path.split(os.path.abspath(path))
+            self._file_names_by_dir.setdefault(dir_path, {})[name] = path
+            self._add_watch(dir_path)
+        for top in dirs:
+            _walk_dirs(
+                self._finder,
+                self._finder.get_top_dir(top),
+                self._real_dir_paths,
+                self._add_watch_for_walk,
+            )
+
+    def _add_watch_for_walk(self, walk_dir, real_path):
+        self._add_watch(walk_dir[0], walk_dir=walk_dir, real_path=real_path)
+
+    def _add_watch(self, dir_path, walk_dir=None, real_path=None):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dir_path), INOTIFY_MASK)
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            print(
+                "{dir_path}: cannot watch: {message}".format(
+                    dir_path=dir_path, message=os.strerror(errno)
+                ),
+                file=sys.stderr,
+            )
+            return
+        self._dirs_by_wd[wd] = dir_path
+        if walk_dir is not None:
+            self._walk_dirs_by_wd[wd] = (walk_dir, real_path)
+
+    def _read_events(self):
+        changed = []
+        try:
+            data = os.read(self.fd, INOTIFY_READ_SIZE)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + INOTIFY_EVENT_SIZE <= len(data):
+            (wd, mask, _cookie, name_length) = struct.unpack_from(
+                INOTIFY_EVENT_FORMAT, data, offset
+            )
+            offset += INOTIFY_EVENT_SIZE
+            name_end = offset + name_length
+            name = os.fsdecode(data[offset:name_end].rstrip(b"\0"))
+            offset = name_end
+            if mask & IN_Q_OVERFLOW:
+                print("inotify event queue overflowed", file=sys.stderr)
+                continue
+            dir_path = self._dirs_by_wd.get(wd)
+            if dir_path is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._dirs_by_wd[wd]
+                if wd in self._walk_dirs_by_wd:
+                    (_walk_dir, real_path) = self._walk_dirs_by_wd.pop(wd)
+                    self._real_dir_paths.discard(real_path)
+                continue
+            (walk_dir, _real_path) = self._walk_dirs_by_wd.get(wd, (None, None))
+            if mask & IN_ISDIR:
+                if (
+                    walk_dir is not None
+                    and mask & (IN_CREATE | IN_MOVED_TO)
+                    and self._finder.is_selected_in(walk_dir, name, True)
+                ):
+                    changed.extend(
+                        _walk_dirs(
+                            self._finder,
+                            self._finder.get_subdir(walk_dir, name),
+                            self._real_dir_paths,
+                            self._add_watch_for_walk,
+                        )
+                    )
+                continue
+            if not mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                continue
+            explicit_names = self._file_names_by_dir.get(dir_path, {})
+            if name in explicit_names:
+                changed.append(explicit_names[name])
+            elif walk_dir is not None and self._finder.is_selected_in(
+                walk_dir, name, False
+            ):
+                changed.append(os.path.join(dir_path, name))
+        return changed
+
+    def wait(self, timeout):
+        """
+        Wait up to `timeout` seconds (forever if `None`) for changes.
+
+        :Returns:
+            A list of paths that may have changed
+        """
+        (readable, _w, _x) = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        return self._read_events()
+
+    def close(self):
+        """Stop watching."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def make_watcher(files, dirs, poll_interval=DEFAULT_POLL_INTERVAL, finder=None):
+    """Make an inotify watcher if possible, otherwise a polling watcher."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(files, dirs, finder=finder)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(files, dirs, interval=poll_interval, finder=finder)
+
+
+####################
+
+
+def watch(
+    paths,
+    process_file,
+    debounce=DEFAULT_DEBOUNCE,
+    poll_interval=DEFAULT_POLL_INTERVAL,
+    finder=None,
+):
+    """
+    Watch `paths` and call `process_file` on each file as it changes.
+
+    :Args:
+        paths
+            Files and directories to watch; directories are watched
+            recursively for the files `finder` selects
+
+        process_file
+            A callable taking the path of a file to process
+
+        debounce
+            (optional) Seconds to wait for a burst of changes to settle
+            before processing the changed files
+
+        poll_interval
+            (optional) Seconds between polls, when inotify is not available
+
+        finder
+            (optional) See `PollingWatcher`:py:class:
+
+    :Returns:
+        Only when interrupted
+    """
+    files = [x for x in paths if not os.path.isdir(x)]
+    dirs = [x for x in paths if os.path.isdir(x)]
+    watcher = make_watcher(files, dirs, poll_interval=poll_interval, finder=finder)
+
+    # Signatures of files as this process last left them
+    own_signatures = {}
+
+    try:
+        while True:
+            changed = watcher.wait(None)
+            while True:
+                more_changed = watcher.wait(debounce)
+                if not more_changed:
+                    break
+                changed.extend(more_changed)
+
+            seen = set()
+            for path in changed:
+                if path in seen:
+                    continue
+                seen.add(path)
+                signature = _get_signature(path)
+                if signature is None or signature == own_signatures.get(path):
+                    continue
+                process_file(path)
+                own_signatures[path] = _get_signature(path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -54,13 +54,15 @@ PROVIDES = PACKAGES
 SCRIPTS = []
 
 # Auto-generated scripts with entry points
-SCRIPT_NAMES = ["markdown-toc"]
+SCRIPT_NAMES = ["markdown-toc", "markdown-toc-client"]
 # or: SCRIPT_NAMES = ["markdown_toc"]
 
 SCRIPT_ALIASES = {}
 # or: SCRIPT_ALIASES = {"markdown_toc": ["alias"]}
 
-SCRIPT_ENTRY_POINTS = {}
+SCRIPT_ENTRY_POINTS = {
+    "markdown-toc-client": "markdown_toc.client:main",
+}
 # or: SCRIPT_ENTRY_POINTS = {
 #     "markdown_toc": "markdown_toc.__main__:main",
 # }
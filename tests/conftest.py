@@ -0,0 +1,53 @@
+"""Fixtures shared by the tests."""
+
+import io
+import os
+import sys
+import time
+
+import pytest
+
+from markdown_toc import cli
+
+
+def _write_text(path, text, age=None):
+    with io.open(str(path), "wt", encoding="utf-8", newline="") as f:
+        f.write(text)
+    if age is not None:
+        mtime = time.time() - age
+        os.utime(str(path), (mtime, mtime))
+
+
+def _read_text(path):
+    with io.open(str(path), "rt", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+@pytest.fixture
+def write_text():
+    """
+    Get a function that writes text to a file, without translating newlines.
+
+    Given `age`, the function also sets the file's mtime that many seconds
+    into the past.
+    """
+    return _write_text
+
+
+@pytest.fixture
+def read_text():
+    """Get a function that reads text from a file, without translating newlines."""
+    return _read_text
+
+
+@pytest.fixture
+def run_cli(monkeypatch):
+    """Get a function that runs the command line and returns its exit status."""
+
+    def run(*args):
+        # The command line is parsed from `sys.argv`, as when run as a program.
+        argv = ["markdown-toc"] + list(args)
+        monkeypatch.setattr(sys, "argv", argv)
+        return cli.main(*argv)
+
+    return run
@@ -0,0 +1,106 @@
+"""Tests for how markdown-toc copes with pathological input."""
+
+import time
+
+from markdown_toc import benchmark, cli, mdfile
+
+# The large document of each pair is this many times the size of the small
+# one.  Quadratic time would show as a growth of about this much, so a
+# generous limit still catches it while leaving room for a loaded machine.
+ADVERSARIAL_SIZE = 2000
+ADVERSARIAL_SCALE = 16
+ADVERSARIAL_MAX_GROWTH = 4.0
+ADVERSARIAL_REPEAT = 5
+
+# Long enough for any file to be processed on a loaded machine
+TIME_LIMIT = 2.0
+
+DOCUMENT = "[toc]: #\n\n# One\n\n## Two\n"
+
+
+def test_adversarial_documents_take_linear_time():
+    results = benchmark.run_adversarial(
+        size=ADVERSARIAL_SIZE,
+        repeat=ADVERSARIAL_REPEAT,
+        max_growth=ADVERSARIAL_MAX_GROWTH,
+        scale=ADVERSARIAL_SCALE,
+    )
+    assert len(results) == len(benchmark.ADVERSARIAL_DOCUMENTS)
+    regressed = [
+        "{name}: growth {growth:.2f}".format(name=name, growth=growth)
+        for (name, _small_seconds, _large_seconds, growth, is_regressed) in results
+        if is_regressed
+    ]
+    assert regressed == []
+
+
+def test_max_file_size_fails_larger_files(
+    tmp_path, capsys, run_cli, write_text, read_text
+):
+    large_path = tmp_path / "large.md"
+    small_path = tmp_path / "small.md"
+    write_text(large_path, DOCUMENT + "text\n" * 100)
+    write_text(small_path, DOCUMENT)
+
+    status = run_cli(
+        "--inplace", "--max-file-size", "100", str(large_path), str(small_path)
+    )
+
+    assert status == cli.STATUS_FAILURE
+    assert read_text(large_path) == DOCUMENT + "text\n" * 100
+    assert "- [One](#one)" in read_text(small_path)
+    assert (
+        "Skipped {path}: larger than 100 bytes".format(path=large_path)
+        in capsys.readouterr().err
+    )
+
+
+def test_time_limit_fails_slow_files_and_leaves_them_unchanged(
+    tmp_path, capsys, monkeypatch, run_cli, write_text, read_text
+):
+    slow_path = tmp_path / "slow.md"
+    fast_path = tmp_path / "fast.md"
+    write_text(slow_path, DOCUMENT)
+    write_text(fast_path, DOCUMENT)
+
+    # Rather than rely on a file being slow enough, make parsing one hang.
+    parse = mdfile.MarkdownFile.parse
+
+    def hanging_parse(self, *args, **kwargs):
+        if self.filename == str(slow_path):
+            time.sleep(TIME_LIMIT * 30)
+        return parse(self, *args, **kwargs)
+
+    monkeypatch.setattr(mdfile.MarkdownFile, "parse", hanging_parse)
+
+    started = time.monotonic()
+    status = run_cli(
+        "--inplace",
+        "--time-limit",
+        str(TIME_LIMIT),
+        str(slow_path),
+        str(fast_path),
+    )
+
+    assert time.monotonic() - started < TIME_LIMIT * 10
+    assert status == cli.STATUS_FAILURE
+    assert read_text(slow_path) == DOCUMENT
+    assert "- [One](#one)" in read_text(fast_path)
+    assert (
+        "Skipped {path}: took longer than {seconds:g} seconds".format(
+            path=slow_path, seconds=TIME_LIMIT
+        )
+        in capsys.readouterr().err
+    )
+
+
+def test_unterminated_toc_is_an_error(tmp_path, capsys, run_cli, write_text, read_text):
+    text = "[begintoc]: #\n\n# One\n" + "text\n" * 1000
+    path = tmp_path / "unterminated.md"
+    write_text(path, text)
+
+    status = run_cli("--inplace", str(path))
+
+    assert status == cli.STATUS_FAILURE
+    assert read_text(path) == text
+    assert capsys.readouterr().err
@@ -0,0 +1,113 @@
+"""Tests for markdown_toc.api."""
+
+import pytest
+
+from markdown_toc import api, cli
+
+DOCUMENT = (
+    "Intro\n"
+    "\n"
+    "[begintoc]: #\n"
+    "- [Old](#old)\n"
+    "[endtoc]: #\n"
+    "\n"
+    "# One\n"
+    "\n"
+    "## Two_and Three!\n"
+    "\n"
+    "```\n"
+    "# Not a heading\n"
+    "```\n"
+    "\n"
+    "## Two_and Three!\n"
+    "\n"
+    "Setext\n"
+    "------\n"
+)
+
+
+@pytest.mark.parametrize(
+    ("cli_args", "option_values"),
+    [
+        ([], {}),
+        (["-H", "2", "-S", "1"], {"heading_level": 2, "skip_level": 1}),
+        (
+            ["-T", "Index", "-#"],
+            {"heading_text": "Index", "add_trailing_heading_chars": True},
+        ),
+        (["-n"], {"numbered": True}),
+        (["-l"], {"alt_list_char": True}),
+        (["--anchor-style", "github"], {"anchor_style": "github"}),
+        (["--anchor-style", "bitbucket"], {"anchor_style": "bitbucket"}),
+        (["-c", "Made by hand"], {"comment": "Made by hand"}),
+    ],
+)
+def test_render_matches_the_command_line(
+    tmp_path, run_cli, write_text, read_text, cli_args, option_values
+):
+    input_path = tmp_path / "input.md"
+    output_path = tmp_path / "output.md"
+    write_text(input_path, DOCUMENT)
+    if "-c" not in cli_args:
+        cli_args = cli_args + ["--no-comment"]
+
+    status = run_cli(*(cli_args + ["-o", str(output_path), str(input_path)]))
+    (new_text, changed) = api.render(DOCUMENT, **option_values)
+
+    assert status == cli.STATUS_SUCCESS
+    assert changed
+    assert new_text == read_text(output_path)
+
+
+def test_render_leaves_current_text_alone():
+    (new_text, changed) = api.render(DOCUMENT, heading_level=2)
+    assert changed
+
+    assert api.render(new_text, heading_level=2) == (new_text, False)
+    assert api.render("# No token\n") == ("# No token\n", False)
+
+
+def test_render_accepts_options_or_option_values():
+    options = api.Options(heading_level=2, numbered=True)
+    assert api.render(DOCUMENT, options) == api.render(
+        DOCUMENT, heading_level=2, numbered=True
+    )
+    with pytest.raises(TypeError):
+        api.render(DOCUMENT, options, numbered=False)
+
+
+@pytest.mark.parametrize(
+    "option_values",
+    [{"heading_level": 0}, {"skip_level": -1}, {"anchor_style": "nowhere"}],
+)
+def test_options_rejects_invalid_values(option_values):
+    with pytest.raises(ValueError):
+        api.Options(**option_values)
+
+
+def test_process_many_keeps_going_after_an_error():
+    current = api.render(DOCUMENT)[0]
+    documents = [
+        ("stale.md", DOCUMENT),
+        ("broken.md", "[begintoc]: #\n\n# One\n"),
+        ("current.md", current),
+        ("plain.md", "# No token\n"),
+    ]
+
+    results = list(api.process_many(documents))
+
+    assert [x.name for x in results] == [name for (name, _text) in documents]
+    assert [x.changed for x in results] == [True, False, False, False]
+    assert [x.text for x in results] == [
+        current,
+        documents[1][1],
+        current,
+        documents[3][1],
+    ]
+    assert [x.error is None for x in results] == [True, False, True, True]
+    assert "broken.md" in results[1].error
+
+
+def test_process_many_checks_options_up_front():
+    with pytest.raises(ValueError):
+        api.process_many([], heading_level=0)
@@ -0,0 +1,58 @@
+"""Tests for markdown_toc.benchmark."""
+
+import json
+
+from markdown_toc import benchmark
+
+NUM_LINES = 2000
+
+
+def _make_report(seconds_by_phase):
+    return {
+        "results": {
+            phase: {"seconds": seconds} for (phase, seconds) in seconds_by_phase.items()
+        }
+    }
+
+
+def test_generate_markdown_is_repeatable():
+    lines = benchmark.generate_markdown(num_lines=NUM_LINES, seed=1)
+    assert lines == benchmark.generate_markdown(num_lines=NUM_LINES, seed=1)
+    assert lines != benchmark.generate_markdown(num_lines=NUM_LINES, seed=2)
+    assert any(line.startswith("#") for line in lines)
+    assert any(line.startswith("```") for line in lines)
+
+
+def test_run_benchmarks_times_every_phase():
+    lines = benchmark.generate_markdown(num_lines=NUM_LINES)
+    results = benchmark.run_benchmarks(lines, repeat=1)
+    assert sorted(results) == sorted(benchmark.PHASES)
+    for phase_results in results.values():
+        assert phase_results["seconds"] >= 0.0
+
+
+def test_compare_results_flags_regressions_beyond_threshold():
+    baseline = _make_report({benchmark.PHASE_PARSE: 1.0, benchmark.PHASE_WRITE: 1.0})
+    current = _make_report({benchmark.PHASE_PARSE: 1.05, benchmark.PHASE_WRITE: 1.5})
+
+    comparisons = benchmark.compare_results(baseline, current, threshold=0.1)
+
+    regressed = {
+        phase: is_regressed for (phase, _b, _c, _r, is_regressed) in comparisons
+    }
+    assert regressed == {benchmark.PHASE_PARSE: False, benchmark.PHASE_WRITE: True}
+
+
+def test_compare_command_reports_regression_status(tmp_path):
+    baseline_path = tmp_path / "baseline.json"
+    current_path = tmp_path / "current.json"
+    with open(str(baseline_path), "w") as f:
+        json.dump(_make_report({benchmark.PHASE_PARSE: 1.0}), f)
+    with open(str(current_path), "w") as f:
+        json.dump(_make_report({benchmark.PHASE_PARSE: 2.0}), f)
+
+    compare_argv = ["benchmark", benchmark.COMMAND_COMPARE]
+    status = benchmark.main(*compare_argv, str(baseline_path), str(current_path))
+    assert status == benchmark.STATUS_REGRESSED
+    status = benchmark.main(*compare_argv, str(current_path), str(baseline_path))
+    assert status == benchmark.STATUS_SUCCESS
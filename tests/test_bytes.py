@@ -0,0 +1,66 @@
+"""Tests for processing files as bytes, with ``--bytes``."""
+
+import pytest
+
+from markdown_toc import cli
+
+# Not valid UTF-8 (nor any multibyte locale encoding)
+UNDECODABLE = b"\xff\xfe"
+
+VALID_DOCUMENT = "[toc]: #\n\n# Café\n\nSome text\n\n## Zwei Größen\n\n```\n# no\n```\n"
+
+
+def test_bytes_mode_copies_undecodable_bytes_exactly(tmp_path, run_cli):
+    body = b"\r\n# caf\xe9\r\n\r\nbody " + UNDECODABLE + b"\r\n## Two\r\n"
+    path = tmp_path / "a.md"
+    path.write_bytes(b"[toc]: #\r\n" + body)
+
+    status = run_cli("--bytes", "--no-comment", "--inplace", str(path))
+
+    assert status == cli.STATUS_SUCCESS
+    output = path.read_bytes()
+    assert output.startswith(b"[begintoc]: #\r\n")
+    assert b"- [caf\xe9](#" in output
+    assert b"- [Two](#two)\r\n" in output
+    assert output.endswith(b"[endtoc]: #\r\n" + body)
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_bytes_mode_matches_text_mode(tmp_path, run_cli, newline):
+    data = VALID_DOCUMENT.replace("\n", newline).encode("utf-8")
+    text_path = tmp_path / "text.md"
+    bytes_path = tmp_path / "bytes.md"
+    text_path.write_bytes(data)
+    bytes_path.write_bytes(data)
+
+    text_status = run_cli("--no-comment", "--inplace", str(text_path))
+    bytes_status = run_cli("--bytes", "--no-comment", "--inplace", str(bytes_path))
+
+    assert text_status == bytes_status == cli.STATUS_SUCCESS
+    assert bytes_path.read_bytes() == text_path.read_bytes()
+    assert bytes_path.read_bytes() != data
+
+
+def test_bytes_mode_round_trips(tmp_path, run_cli):
+    path = tmp_path / "a.md"
+    path.write_bytes(b"[toc]: #\n\n# One " + UNDECODABLE + b"\n\ntext\n")
+    args = ["--bytes", "--no-comment", "--inplace", str(path)]
+    assert run_cli(*args) == cli.STATUS_SUCCESS
+    once = path.read_bytes()
+
+    assert run_cli(*args) == cli.STATUS_SUCCESS
+    assert path.read_bytes() == once
+
+
+def test_bytes_mode_extracts_headings_as_they_were(tmp_path, run_cli):
+    path = tmp_path / "a.md"
+    output_path = tmp_path / "outline.jsonl"
+    path.write_bytes(b"# caf\xe9\n\n## " + UNDECODABLE + b"\n")
+
+    status = run_cli("--bytes", "--extract", "json", "-o", str(output_path), str(path))
+
+    assert status == cli.STATUS_SUCCESS
+    output = output_path.read_bytes()
+    assert b'"text": "caf\xe9"' in output
+    assert b'"text": "' + UNDECODABLE + b'"' in output
+    assert b"\\udc" not in output
@@ -0,0 +1,138 @@
+"""Tests for markdown_toc.cache."""
+
+import os
+
+import pytest
+
+from markdown_toc import cache, cli, mdfile
+
+OPTIONS_HASH = cache.hash_options(["Contents", 1, 0])
+OTHER_OPTIONS_HASH = cache.hash_options(["Contents", 2, 0])
+
+DOCUMENT = "[toc]: #\n\n# One\n"
+
+
+@pytest.fixture
+def result_cache(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path / "cache" / "results.sqlite3"))
+    yield result_cache
+    result_cache.close()
+
+
+def _store(result_cache, path, text):
+    result_cache.store(
+        str(path), os.stat(str(path)), cache.hash_text(text), OPTIONS_HASH
+    )
+
+
+def test_lookup_stat_hits_only_unchanged_files(tmp_path, result_cache, write_text):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT, age=60)
+    assert not result_cache.lookup_stat(str(path), os.stat(str(path)), OPTIONS_HASH)
+
+    _store(result_cache, path, DOCUMENT)
+    assert result_cache.lookup_stat(str(path), os.stat(str(path)), OPTIONS_HASH)
+    assert not result_cache.lookup_stat(
+        str(path), os.stat(str(path)), OTHER_OPTIONS_HASH
+    )
+
+    write_text(path, DOCUMENT + "\n# Two\n", age=30)
+    assert not result_cache.lookup_stat(str(path), os.stat(str(path)), OPTIONS_HASH)
+
+
+def test_lookup_content_hits_any_file_with_the_same_content(
+    tmp_path, result_cache, write_text
+):
+    path = tmp_path / "a.md"
+    other_path = tmp_path / "b.md"
+    write_text(path, DOCUMENT, age=60)
+    write_text(other_path, DOCUMENT, age=60)
+    _store(result_cache, path, DOCUMENT)
+
+    other_stat = os.stat(str(other_path))
+    content_hash = cache.hash_text(DOCUMENT)
+    assert not result_cache.lookup_content(
+        str(other_path), other_stat, content_hash, OTHER_OPTIONS_HASH
+    )
+    assert not result_cache.lookup_content(
+        str(other_path), other_stat, cache.hash_text("other"), OPTIONS_HASH
+    )
+    assert result_cache.lookup_content(
+        str(other_path), other_stat, content_hash, OPTIONS_HASH
+    )
+    # A content hit records the file, so the next lookup needs only a stat.
+    assert result_cache.lookup_stat(str(other_path), other_stat, OPTIONS_HASH)
+
+
+def test_recently_modified_files_are_matched_by_content_only(
+    tmp_path, result_cache, write_text
+):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    _store(result_cache, path, DOCUMENT)
+
+    stat_result = os.stat(str(path))
+    assert not result_cache.lookup_stat(str(path), stat_result, OPTIONS_HASH)
+    assert result_cache.lookup_content(
+        str(path), stat_result, cache.hash_text(DOCUMENT), OPTIONS_HASH
+    )
+
+
+def test_evict_keeps_the_most_recently_used_entries(tmp_path, write_text):
+    result_cache = cache.ResultCache(str(tmp_path / "results.sqlite3"), max_entries=2)
+    paths = [tmp_path / name for name in ["a.md", "b.md", "c.md"]]
+    for path in paths:
+        write_text(path, DOCUMENT, age=60)
+        _store(result_cache, path, DOCUMENT)
+    # Using the oldest entry makes the second one the least recently used.
+    assert result_cache.lookup_stat(str(paths[0]), os.stat(str(paths[0])), OPTIONS_HASH)
+
+    result_cache.evict()
+
+    hits = [
+        result_cache.lookup_stat(str(x), os.stat(str(x)), OPTIONS_HASH) for x in paths
+    ]
+    assert hits == [True, False, True]
+    result_cache.close()
+
+
+def _count_parses(monkeypatch):
+    parsed = []
+    parse = mdfile.MarkdownFile.parse
+
+    def counting_parse(self, *args, **kwargs):
+        parsed.append(self.filename)
+        return parse(self, *args, **kwargs)
+
+    monkeypatch.setattr(mdfile.MarkdownFile, "parse", counting_parse)
+    return parsed
+
+
+def test_cli_skips_files_the_cache_knows_are_up_to_date(
+    tmp_path, monkeypatch, run_cli, write_text, read_text
+):
+    cache_path = str(tmp_path / "results.sqlite3")
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    parsed = _count_parses(monkeypatch)
+
+    # The default comment has a timestamp, so would change the file every run.
+    cache_args = ["--inplace", "--no-comment", "--cache-file", cache_path]
+    assert run_cli(*(cache_args + [str(path)])) == cli.STATUS_SUCCESS
+    assert "- [One](#one)" in read_text(path)
+    assert len(parsed) == 1
+
+    # Unchanged: skipped
+    assert run_cli(*(cache_args + [str(path)])) == cli.STATUS_SUCCESS
+    assert len(parsed) == 1
+
+    # Different options: processed again
+    assert run_cli(*(cache_args + ["-H", "2", str(path)])) == cli.STATUS_SUCCESS
+    assert len(parsed) == 2
+    assert "## Contents" in read_text(path)
+
+    # Changed content: processed again
+    write_text(path, read_text(path) + "\n# Two\n")
+    assert run_cli(*(cache_args + ["-H", "2", str(path)])) == cli.STATUS_SUCCESS
+    assert len(parsed) == 3
+    assert "- [Two](#two)" in read_text(path)
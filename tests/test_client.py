@@ -0,0 +1,99 @@
+"""Tests for markdown_toc.client, and the ``--serve`` daemon it talks to."""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import markdown_toc
+from markdown_toc import cli, client
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets"
+)
+
+DOCUMENT = "[toc]: #\n\n# One\n\n## Two\n"
+
+# Long enough for the daemon to start, or to go idle, on a loaded machine
+DAEMON_TIMEOUT = 30.0
+
+# Short, so that the test soon sees the daemon shut itself down
+IDLE_TIMEOUT = 2.0
+
+
+def _wait_for_socket(daemon, socket_path):
+    deadline = time.monotonic() + DAEMON_TIMEOUT
+    while not os.path.exists(socket_path):
+        assert daemon.poll() is None, "daemon exited early"
+        assert time.monotonic() < deadline, "daemon did not start listening"
+        time.sleep(0.05)
+
+
+def _fail_to_run_locally(argv):
+    pytest.fail("ran locally instead of through the daemon")
+
+
+def test_request_goes_through_the_daemon(tmp_path, monkeypatch, write_text, read_text):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    socket_path = str(tmp_path / "daemon.sock")
+    package_dir = os.path.dirname(os.path.dirname(markdown_toc.__file__))
+    environ = dict(os.environ, PYTHONPATH=package_dir)
+    daemon = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "markdown_toc",
+            "--serve",
+            "--socket",
+            socket_path,
+            "--idle-timeout",
+            str(IDLE_TIMEOUT),
+        ],
+        env=environ,
+    )
+    try:
+        _wait_for_socket(daemon, socket_path)
+        monkeypatch.setenv(client.SOCKET_ENV_VAR, socket_path)
+        monkeypatch.setattr(client, "_run_locally", _fail_to_run_locally)
+
+        status = client.run(
+            ["markdown-toc-client", "--inplace", "--no-comment", str(path)]
+        )
+
+        assert status == cli.STATUS_SUCCESS
+        assert "- [One](#one)" in read_text(path)
+        # With no more requests, the daemon shuts down and cleans up.
+        assert daemon.wait(timeout=DAEMON_TIMEOUT) == cli.STATUS_SUCCESS
+        assert not os.path.exists(socket_path)
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+            daemon.wait()
+
+
+def test_client_runs_locally_without_a_daemon(
+    tmp_path, monkeypatch, write_text, read_text
+):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    monkeypatch.setenv(client.SOCKET_ENV_VAR, str(tmp_path / "missing.sock"))
+    # Running locally replaces `sys.argv`; put it back afterwards.
+    monkeypatch.setattr(sys, "argv", list(sys.argv))
+
+    status = client.run(["markdown-toc-client", "--inplace", "--no-comment", str(path)])
+
+    assert status == cli.STATUS_SUCCESS
+    assert "- [One](#one)" in read_text(path)
+
+
+def test_request_round_trips():
+    argv = ["markdown-toc", "-n", "a=b.md", ""]
+    environ = {"HOME": "/home/someone", "EMPTY": "", "EQUALS": "a=b"}
+
+    request = client.encode_request(argv, "/some/dir", environ)
+
+    assert client.decode_request(request) == (argv, "/some/dir", environ)
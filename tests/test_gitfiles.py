@@ -0,0 +1,127 @@
+"""Tests for markdown_toc.gitfiles, and ``--staged`` and ``--changed-since``."""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from markdown_toc import cli, gitfiles
+
+pytestmark = pytest.mark.skipif(shutil.which(gitfiles.GIT) is None, reason="needs git")
+
+DOCUMENT = "[toc]: #\n\n# One\n\n## Two\n"
+
+
+def _git(*args):
+    subprocess.run(
+        [gitfiles.GIT, "-c", "user.name=Test", "-c", "user.email=test@example.com"]
+        + list(args),
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch, write_text):
+    """
+    Get a new git repository, with one commit on ``main``, as the current directory.
+
+    The repository's own settings are the only ones git sees.
+    """
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmp_path))
+    repo_path = tmp_path / "repo"
+    repo_path.mkdir()
+    monkeypatch.chdir(repo_path)
+    _git("init", "-q", "-b", "main")
+    write_text(repo_path / ".gitignore", "ignored.md\n")
+    for name in ["a.md", "b.md", "gone.md", "docs/c.md"]:
+        (repo_path / name).parent.mkdir(exist_ok=True)
+        write_text(repo_path / name, DOCUMENT)
+    _git("add", ".")
+    _git("commit", "-q", "-m", "Start")
+    return repo_path
+
+
+def test_staged_paths_are_those_that_still_exist(repo, write_text):
+    write_text(repo / "a.md", DOCUMENT + "More\n")
+    write_text(repo / "new.md", DOCUMENT)
+    write_text(repo / "notes.txt", "Notes\n")
+    _git("add", "a.md", "new.md", "notes.txt")
+    _git("rm", "-q", "gone.md")
+    _git("mv", "b.md", "moved.md")
+    write_text(repo / "docs" / "c.md", DOCUMENT + "Unstaged\n")
+
+    assert gitfiles.get_staged_paths() == [
+        ("a.md", "a.md"),
+        ("moved.md", "moved.md"),
+        ("new.md", "new.md"),
+        ("notes.txt", "notes.txt"),
+    ]
+    assert gitfiles.get_staged_paths(["*.txt"]) == [("notes.txt", "notes.txt")]
+
+
+def test_paths_outside_the_current_directory_stay_whole(repo, monkeypatch, write_text):
+    write_text(repo / "a.md", DOCUMENT + "More\n")
+    write_text(repo / "docs" / "c.md", DOCUMENT + "More\n")
+    _git("add", ".")
+    monkeypatch.chdir(repo / "docs")
+
+    assert gitfiles.get_staged_paths() == [
+        (os.path.join(str(repo), "a.md"), "a.md"),
+        ("c.md", "docs/c.md"),
+    ]
+
+
+def test_changed_paths_include_commits_changes_and_untracked_files(repo, write_text):
+    _git("checkout", "-q", "-b", "topic")
+    write_text(repo / "a.md", DOCUMENT + "Committed\n")
+    _git("commit", "-q", "-am", "Change a.md")
+    write_text(repo / "b.md", DOCUMENT + "Unstaged\n")
+    write_text(repo / "new.md", DOCUMENT)
+    write_text(repo / "ignored.md", DOCUMENT)
+
+    assert gitfiles.get_changed_paths("main") == [
+        ("a.md", "a.md"),
+        ("b.md", "b.md"),
+        ("new.md", "new.md"),
+    ]
+    assert gitfiles.get_changed_paths("main", ["new.md"]) == [("new.md", "new.md")]
+
+
+def test_bad_ref_is_an_error(repo):
+    with pytest.raises(RuntimeError, match="merge-base"):
+        gitfiles.get_changed_paths("no-such-branch")
+
+
+def test_staged_updates_only_staged_markdown_files(
+    repo, run_cli, write_text, read_text
+):
+    write_text(repo / "a.md", DOCUMENT + "More\n")
+    write_text(repo / "docs" / "c.md", DOCUMENT + "More\n")
+    write_text(repo / "notes.txt", DOCUMENT)
+    _git("add", "a.md", "docs/c.md", "notes.txt")
+    write_text(repo / "b.md", DOCUMENT + "Unstaged\n")
+
+    status = run_cli("--staged", "--no-comment", "--exclude", "docs")
+
+    assert status == cli.STATUS_SUCCESS
+    assert "- [One](#one)" in read_text(repo / "a.md")
+    assert read_text(repo / "docs" / "c.md") == DOCUMENT + "More\n"
+    assert read_text(repo / "notes.txt") == DOCUMENT
+    assert read_text(repo / "b.md") == DOCUMENT + "Unstaged\n"
+
+
+def test_changed_since_updates_changed_markdown_files(
+    repo, run_cli, write_text, read_text
+):
+    _git("checkout", "-q", "-b", "topic")
+    write_text(repo / "new.md", DOCUMENT)
+
+    status = run_cli("--changed-since", "main", "--no-comment")
+
+    assert status == cli.STATUS_SUCCESS
+    assert "- [One](#one)" in read_text(repo / "new.md")
+    assert read_text(repo / "a.md") == DOCUMENT
@@ -0,0 +1,127 @@
+"""Tests for markdown_toc.iofile, and how files are written in place."""
+
+import os
+import stat
+import tempfile
+
+import pytest
+
+from markdown_toc import cli, iofile
+
+DOCUMENT = "[toc]: #\n\n# One\n\n## Two\n"
+
+
+def test_atomic_output_replaces_the_file_only_on_close(tmp_path, write_text, read_text):
+    path = tmp_path / "a.md"
+    write_text(path, "old\n")
+    old_inode = os.stat(str(path)).st_ino
+    output_iofile = iofile.TextIOFile(str(path), atomic=True)
+
+    output_iofile.open_for_output()
+    output_iofile.file.write("new\n")
+    output_iofile.file.flush()
+    assert read_text(path) == "old\n"
+
+    output_iofile.close()
+    assert read_text(path) == "new\n"
+    assert os.stat(str(path)).st_ino != old_inode
+    assert os.listdir(str(tmp_path)) == ["a.md"]
+
+
+def test_atomic_output_can_be_discarded(tmp_path, write_text, read_text):
+    path = tmp_path / "a.md"
+    write_text(path, "old\n")
+    output_iofile = iofile.TextIOFile(str(path), atomic=True)
+
+    output_iofile.open_for_output()
+    output_iofile.file.write("new\n")
+    output_iofile.discard()
+
+    assert read_text(path) == "old\n"
+    assert os.listdir(str(tmp_path)) == ["a.md"]
+
+
+def test_inplace_keeps_the_file_mode(tmp_path, run_cli, write_text, read_text):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    os.chmod(str(path), 0o640)
+
+    status = run_cli("--inplace", "--no-comment", str(path))
+
+    assert status == cli.STATUS_SUCCESS
+    assert "- [One](#one)" in read_text(path)
+    assert stat.S_IMODE(os.stat(str(path)).st_mode) == 0o640
+
+
+def test_inplace_writes_in_place_in_a_read_only_directory(
+    tmp_path, monkeypatch, run_cli, write_text, read_text
+):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    old_inode = os.stat(str(path)).st_ino
+
+    # Running as root, a read-only directory would still be writable.
+    def refuse_mkstemp(*args, **kwargs):
+        raise PermissionError("read-only directory")
+
+    monkeypatch.setattr(tempfile, "mkstemp", refuse_mkstemp)
+
+    status = run_cli("--inplace", "--no-comment", str(path))
+
+    assert status == cli.STATUS_SUCCESS
+    assert "- [One](#one)" in read_text(path)
+    assert os.stat(str(path)).st_ino == old_inode
+
+
+@pytest.mark.parametrize(
+    ("policy", "file_fsyncs", "batch_paths"),
+    [
+        (cli.FSYNC_NEVER, 0, None),
+        (cli.FSYNC_FILE, 2, None),
+        (cli.FSYNC_BATCH, 0, ["stale.md"]),
+    ],
+)
+def test_fsync_policy(
+    tmp_path, monkeypatch, run_cli, write_text, policy, file_fsyncs, batch_paths
+):
+    stale_path = tmp_path / "stale.md"
+    current_path = tmp_path / "current.md"
+    write_text(stale_path, DOCUMENT)
+    write_text(current_path, "# No token\n")
+    fsyncs = []
+    fsynced_batches = []
+    monkeypatch.setattr(os, "fsync", fsyncs.append)
+    monkeypatch.setattr(iofile, "fsync_files", fsynced_batches.append)
+    if hasattr(os, "sync"):
+        monkeypatch.setattr(os, "sync", pytest.fail)
+
+    status = run_cli(
+        "--inplace",
+        "--no-comment",
+        "--fsync",
+        policy,
+        str(stale_path),
+        str(current_path),
+    )
+
+    assert status == cli.STATUS_SUCCESS
+    # With '--fsync file', the file and then its directory are flushed.
+    assert len(fsyncs) == file_fsyncs
+    if batch_paths is None:
+        assert fsynced_batches == []
+    else:
+        expected_paths = [os.path.realpath(str(tmp_path / x)) for x in batch_paths]
+        assert fsynced_batches == [expected_paths]
+
+
+def test_fsync_files_flushes_each_directory_once(tmp_path, monkeypatch, write_text):
+    paths = [tmp_path / "a.md", tmp_path / "b.md", tmp_path / "sub" / "c.md"]
+    (tmp_path / "sub").mkdir()
+    for path in paths:
+        write_text(path, DOCUMENT)
+    fsynced_dirs = []
+    monkeypatch.setattr(iofile, "_fsync_dir", fsynced_dirs.append)
+
+    iofile.fsync_files([str(x) for x in paths] + [str(tmp_path / "gone.md")])
+
+    assert fsynced_dirs == [str(tmp_path), str(tmp_path / "sub")]
@@ -0,0 +1,220 @@
+"""Tests for markdown_toc.mdfile."""
+
+import random
+import re
+
+import pytest
+
+from markdown_toc import mdfile
+
+WORDS = ["alpha", "beta", "gamma", "delta", "Usage", "API", "hello_world"]
+
+
+def _make_markdown_file(text):
+    md = mdfile.MarkdownFile(infile=None, infilename="test.md")
+    md.set_text(text)
+    return md
+
+
+def _get_headings(text):
+    md = _make_markdown_file(text)
+    md.tokenize()
+    return md.headings
+
+
+def _get_old_headings(text):
+    """
+    Find headings the way `MarkdownFile` did before it had a block scanner.
+
+    ATX headings were matched by regex, and any line starting with three
+    backticks opened or closed a code fence.
+    """
+    heading_regex = re.compile(r"^(?P<level>#+) *(?P<text>.*[^ #])( *#+)?$")
+    code_fence_regex = re.compile(r"^```+")
+    headings = []
+    in_code_fence = False
+    for (line_index, line) in enumerate(text.splitlines()):
+        if code_fence_regex.search(line):
+            in_code_fence = not in_code_fence
+            continue
+        if in_code_fence:
+            continue
+        match = heading_regex.search(line)
+        if match:
+            level = len(match.group("level"))
+            headings.append((line_index, level, match.group("text")))
+    return headings
+
+
+def _make_words(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+
+
+def _generate_markdown(rng, num_blocks):
+    """Generate blocks the old classifier handled correctly."""
+    lines = []
+    for _ in range(num_blocks):
+        choice = rng.random()
+        if choice < 0.3:
+            lines.append("#" * rng.randint(1, 6) + " " + _make_words(rng) + "\n")
+        elif choice < 0.45:
+            lines.append("```python\n")
+            for _ in range(rng.randint(0, 3)):
+                lines.append("# " + _make_words(rng) + "\n")
+            lines.append("```\n")
+        else:
+            for _ in range(rng.randint(1, 3)):
+                lines.append(_make_words(rng) + "\n")
+        lines.append("\n")
+    return "".join(lines)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_scanner_agrees_with_old_classifier_on_atx_headings_and_fences(seed):
+    text = _generate_markdown(random.Random(seed), num_blocks=50)
+    assert _get_headings(text) == _get_old_headings(text)
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("Title\n=====\n\nSub\n---\n", [(1, 1, "Title"), (4, 2, "Sub")]),
+        ("Two\nlines\n===\n", [(2, 1, "Two lines")]),
+        ("text\n\n---\n", []),
+        ("- item\n---\n", []),
+        ("# ATX #\n#hashtag\n", [(0, 1, "ATX")]),
+    ],
+)
+def test_scanner_finds_setext_headings(text, expected):
+    assert _get_headings(text) == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("~~~\n# in\n~~~\n# out\n", [(3, 1, "out")]),
+        ("````\n```\n# in\n````\n# out\n", [(4, 1, "out")]),
+        ("```\n# in\n`````\n# out\n", [(3, 1, "out")]),
+        ("~~~\n```\n# in\n~~~\n# out\n", [(4, 1, "out")]),
+        ("``` not `closed\n# out\n", [(1, 1, "out")]),
+        ("text\n\n    # indented\n\n# out\n", [(4, 1, "out")]),
+        ("text\n    # lazy\n", []),
+    ],
+)
+def test_scanner_skips_code(text, expected):
+    assert _get_headings(text) == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "front_matter_length", "expected"),
+    [
+        ("---\ntitle: x\n---\n# A\n", 3, [(3, 1, "A")]),
+        ("---\ntitle: x\n...\n# A\n", 3, [(3, 1, "A")]),
+        ('+++\ntitle = "x"\n+++\n# A\n', 3, [(3, 1, "A")]),
+        ("---\n# not a heading\n---\n", 3, []),
+        ("text\n---\ntitle: x\n---\n", 0, [(1, 2, "text"), (3, 2, "title: x")]),
+        ("---\ntitle: x\n", 0, []),
+    ],
+)
+def test_scanner_skips_front_matter(text, front_matter_length, expected):
+    md = _make_markdown_file(text)
+    md.tokenize()
+    assert md.front_matter_length == front_matter_length
+    assert md.headings == expected
+
+
+EDIT_LINES = [
+    "Foo\n",
+    "===\n",
+    "---\n",
+    "\n",
+    "# H\n",
+    "## Sub #\n",
+    "```\n",
+    "~~~~\n",
+    "    code\n",
+    "- item\n",
+    "> quote\n",
+    "[toc]: #\n",
+    "[begintoc]: #\n",
+    "[endtoc]: #\n",
+    "+++\n",
+    "...\n",
+    "title: x\n",
+]
+
+
+def _parse(md):
+    md.parse(heading_text="Contents", heading_level=1, skip_level=0)
+
+
+def _render(md):
+    return md.render(
+        numbered=False,
+        toc_comment=None,
+        alt_list_char=False,
+        add_trailing_heading_chars=False,
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_apply_edit_matches_full_reparse(seed):
+    rng = random.Random(seed)
+    num_edits = 0
+    for _ in range(100):
+        lines = [rng.choice(EDIT_LINES) for _ in range(rng.randint(0, 25))]
+        md = _make_markdown_file("".join(lines))
+        try:
+            _parse(md)
+        except ValueError:
+            continue
+        for _ in range(5):
+            start = rng.randint(0, len(md.lines))
+            end = rng.randint(start, len(md.lines))
+            new_lines = [rng.choice(EDIT_LINES) for _ in range(rng.randint(0, 4))]
+            try:
+                md.apply_edit(start, end, new_lines)
+            except ValueError:
+                break
+            reparsed = _make_markdown_file("".join(md.lines))
+            _parse(reparsed)
+            assert list(md.line_kinds) == list(reparsed.line_kinds)
+            assert md.headings == reparsed.headings
+            assert _render(md) == _render(reparsed)
+            num_edits += 1
+    assert num_edits > 0
+
+
+def test_apply_edit_rejects_invalid_edits_and_keeps_the_document():
+    text = "[begintoc]: #\n[endtoc]: #\n\n# One\n"
+    md = _make_markdown_file(text)
+    _parse(md)
+    with pytest.raises(ValueError):
+        md.apply_edit(1, 2, [])
+    assert "".join(md.lines) == text
+    with pytest.raises(IndexError):
+        md.apply_edit(3, 10, [])
+
+
+def test_apply_edit_reports_whether_the_toc_changed():
+    md = _make_markdown_file("[toc]: #\n\n# One\n\ntext\n")
+    _parse(md)
+    assert not md.apply_edit(4, 5, ["more text\n"])
+    assert md.apply_edit(4, 5, ["# Two\n"])
+    assert "- [Two](#two)" in _render(md)
+
+
+def test_toc_numbers_restart_under_each_new_parent():
+    toc = mdfile.Toc(heading_text="Contents", heading_level=1, skip_level=0)
+    for (text, level) in [
+        ("A", 1),
+        ("B", 3),
+        ("C", 2),
+        ("D", 1),
+        ("E", 3),
+        ("F", 4),
+        ("G", 2),
+        ("H", 4),
+    ]:
+        toc.add_item(text, level)
+    assert list(toc.numbers) == [1, 1, 1, 2, 1, 1, 1, 1]
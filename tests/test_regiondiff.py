@@ -0,0 +1,84 @@
+"""Tests for markdown_toc.regiondiff."""
+
+import difflib
+import random
+
+import pytest
+
+from markdown_toc import cli, mdfile, regiondiff
+
+
+def _make_edited_lines(rng, num_lines, num_regions):
+    """
+    Make lines, and a copy with some regions of them replaced.
+
+    Every line is unique, so that difflib has only one way to line them up.
+    """
+    a = ["line {n}\n".format(n=n) for n in range(num_lines)]
+    starts = sorted(rng.sample(range(num_lines + 1), min(num_regions, num_lines + 1)))
+    b = []
+    regions = []
+    i = 0
+    for (region_number, start) in enumerate(starts):
+        end = min(num_lines, start + rng.randint(0, 4))
+        if regions and start < regions[-1][1]:
+            continue
+        b.extend(a[i:start])
+        new_start = len(b)
+        for n in range(start, end):
+            if rng.random() < 0.5:
+                b.append(a[n])
+        for n in range(rng.randint(0, 4)):
+            b.append("new {region} {n}\n".format(region=region_number, n=n))
+        regions.append((start, end, new_start, len(b)))
+        i = end
+    b.extend(a[i:])
+    return (a, b, regions)
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("context_lines", [0, 1, 3])
+def test_unified_diff_matches_difflib(seed, context_lines):
+    rng = random.Random(seed)
+    (a, b, regions) = _make_edited_lines(
+        rng, num_lines=rng.randint(0, 60), num_regions=rng.randint(0, 4)
+    )
+    expected = list(
+        difflib.unified_diff(a, b, fromfile="a", tofile="b", n=context_lines)
+    )
+    actual = list(
+        regiondiff.unified_diff(
+            a, b, regions, fromfile="a", tofile="b", n=context_lines
+        )
+    )
+    assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "[toc]: #\n\n# One\n\n## Two\n",
+        "[toc]: #\n[toc]: #\n\n# One\n",
+        "Intro\n\n[begintoc]: #\n- [Old](#old)\n[endtoc]: #\n\n# One\n\ntext\n",
+        "# One\n\n" + "text\n" * 20 + "[toc]: #\n\n" + "text\n" * 20 + "[toc]: #",
+    ],
+)
+def test_compute_diff_of_toc_regions_matches_full_diff(text):
+    md = mdfile.MarkdownFile(infile=None, infilename="test.md")
+    md.set_text(text)
+    md.parse(heading_text="Contents", heading_level=1, skip_level=0)
+    output_text = md.render(
+        numbered=False,
+        toc_comment=None,
+        alt_list_char=False,
+        add_trailing_heading_chars=False,
+    )
+
+    expected = list(cli._compute_diff("test.md", text, output_text))
+    actual = list(
+        cli._compute_diff(
+            "test.md", text, output_text, rendered_ranges=md.get_rendered_ranges()
+        )
+    )
+    assert expected
+    assert actual == expected
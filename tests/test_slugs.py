@@ -0,0 +1,142 @@
+"""Tests for markdown_toc.slugs."""
+
+import random
+
+import pytest
+
+from markdown_toc import api, slugs
+
+# Heading texts, and the anchor names each site gives them
+KNOWN_SLUGS = {
+    slugs.ANCHOR_STYLE_GITHUB: [
+        ("Hello World", "hello-world"),
+        ("Hello, World!", "hello-world"),
+        ("What's new?", "whats-new"),
+        ("API v2.0 (beta)", "api-v20-beta"),
+        ("snake_case and kebab-case", "snake_case-and-kebab-case"),
+        ("C++ & C#", "c--c"),
+        ("Emoji 🎉 party", "emoji--party"),
+        ("--flags--", "--flags--"),
+        ("Über Größe", "über-größe"),
+        ("Ünïcödé Çafé", "ünïcödé-çafé"),
+        ("日本語の見出し", "日本語の見出し"),
+    ],
+    slugs.ANCHOR_STYLE_GITLAB: [
+        ("Hello World", "hello-world"),
+        ("Hello, World!", "hello-world"),
+        ("What's new?", "whats-new"),
+        ("API v2.0 (beta)", "api-v20-beta"),
+        ("snake_case and kebab-case", "snake_case-and-kebab-case"),
+        ("C++ & C#", "c-c"),
+        ("Emoji 🎉 party", "emoji-party"),
+        ("--flags--", "-flags-"),
+        ("Über Größe", "über-größe"),
+        ("Ünïcödé Çafé", "ünïcödé-çafé"),
+        ("日本語の見出し", "日本語の見出し"),
+    ],
+    slugs.ANCHOR_STYLE_BITBUCKET: [
+        ("Hello World", "markdown-header-hello-world"),
+        ("Hello, World!", "markdown-header-hello-world"),
+        ("What's new?", "markdown-header-whats-new"),
+        ("API v2.0 (beta)", "markdown-header-api-v20-beta"),
+        ("snake_case and kebab-case", "markdown-header-snake_case-and-kebab-case"),
+        ("C++ & C#", "markdown-header-c-c"),
+        ("Emoji 🎉 party", "markdown-header-emoji-party"),
+        ("Tab\there", "markdown-header-tab-here"),
+        ("Über Größe", "markdown-header-uber-groe"),
+        ("Ünïcödé Çafé", "markdown-header-unicode-cafe"),
+    ],
+}
+
+# The same heading text, over and over, and texts that look like its suffixes
+REPEATED_TEXTS = ["Intro", "Intro", "Intro-1", "Intro", "Intro 1"]
+
+KNOWN_REPEATED_SLUGS = {
+    slugs.ANCHOR_STYLE_GITHUB: [
+        "intro",
+        "intro-1",
+        "intro-1-1",
+        "intro-2",
+        "intro-1-2",
+    ],
+    slugs.ANCHOR_STYLE_GITLAB: [
+        "intro",
+        "intro-1",
+        "intro-1-1",
+        "intro-2",
+        "intro-1-2",
+    ],
+    slugs.ANCHOR_STYLE_BITBUCKET: [
+        "markdown-header-intro",
+        "markdown-header-intro_1",
+        "markdown-header-intro-1",
+        "markdown-header-intro_2",
+        "markdown-header-intro-1_1",
+    ],
+    slugs.ANCHOR_STYLE_PLAIN: ["intro", "intro", "intro-1", "intro", "intro-1"],
+}
+
+CHARACTERS = "aZ09 _-\t.,!?'()&#+/é ß日🎉½Ⅻ́ "
+
+
+def _make_baseline_anchor_name(text):
+    """Make an anchor name the way markdown-toc did before anchor styles."""
+    anchor_text = []
+    for c in text:
+        if c.isalnum():
+            anchor_text.append(c.lower())
+        elif c.isspace() or c == "-":
+            anchor_text.append("-")
+    return "".join(anchor_text)
+
+
+@pytest.mark.parametrize(
+    ("style", "text", "expected"),
+    [
+        (style, text, expected)
+        for (style, cases) in KNOWN_SLUGS.items()
+        for (text, expected) in cases
+    ],
+)
+def test_make_slug_matches_site(style, text, expected):
+    assert slugs.make_slug(text, style) == expected
+
+
+@pytest.mark.parametrize("style", slugs.ANCHOR_STYLES)
+def test_slugger_numbers_repeated_headings(style):
+    expected = KNOWN_REPEATED_SLUGS[style]
+
+    slugger = slugs.Slugger(style)
+    assert [slugger.slug(x) for x in REPEATED_TEXTS] == expected
+    assert slugs.Slugger(style).slug_all(REPEATED_TEXTS) == expected
+
+
+def test_plain_style_makes_the_baseline_anchor_names():
+    rng = random.Random(0)
+    texts = [
+        "".join(rng.choice(CHARACTERS) for _ in range(rng.randint(0, 12)))
+        for _ in range(500)
+    ]
+    texts.extend(text for (text, _expected) in KNOWN_SLUGS[slugs.ANCHOR_STYLE_GITHUB])
+
+    assert slugs.DEFAULT_ANCHOR_STYLE == slugs.ANCHOR_STYLE_PLAIN
+    assert [slugs.make_slug(x) for x in texts] == [
+        _make_baseline_anchor_name(x) for x in texts
+    ]
+
+
+def test_rendered_links_use_the_anchor_style():
+    text = "[toc]: #\n\n# Intro\n\n# Intro\n"
+
+    (plain_text, _changed) = api.render(text, comment=None)
+    (github_text, _changed) = api.render(text, comment=None, anchor_style="github")
+
+    assert plain_text.count("- [Intro](#intro)\n") == 2
+    assert "- [Intro](#intro)\n- [Intro](#intro-1)\n" in github_text
+
+
+def test_unrecognized_style_is_an_error():
+    with pytest.raises(ValueError):
+        slugs.make_slug("Intro", "nowhere")
+    with pytest.raises(ValueError):
+        slugs.Slugger("nowhere")
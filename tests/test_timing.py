@@ -0,0 +1,101 @@
+"""Tests for markdown_toc.timing, and the options that report timings."""
+
+import json
+import pstats
+
+from markdown_toc import cli, timing
+
+DOCUMENT = "[toc]: #\n\n# One\n\n## Two\n"
+
+
+def _read_records(text):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_timings_file_has_one_json_line_per_file(
+    tmp_path, run_cli, write_text, read_text
+):
+    paths = [tmp_path / "stale.md", tmp_path / "plain.md"]
+    write_text(paths[0], DOCUMENT)
+    write_text(paths[1], "# No token\n")
+    timings_path = tmp_path / "timings.jsonl"
+
+    status = run_cli(
+        "--inplace",
+        "--no-comment",
+        "--timings-file",
+        str(timings_path),
+        str(paths[0]),
+        str(paths[1]),
+    )
+
+    assert status == cli.STATUS_SUCCESS
+    records = _read_records(read_text(timings_path))
+    assert [x["file"] for x in records] == [str(x) for x in paths]
+    assert [x["status"] for x in records] == [cli.STATUS_SUCCESS] * 2
+    for record in records:
+        for times in record["phases"].values():
+            assert sorted(times) == ["cpu", "wall"]
+            assert times["wall"] >= 0.0
+            assert times["cpu"] >= 0.0
+    # A file without a token is done once it has been scanned for one.
+    stale_phases = list(records[0]["phases"])
+    assert stale_phases[0] == "prescan"
+    assert {"read", "parse", "render", "write"} <= set(stale_phases)
+    assert stale_phases[-1] == timing.TOTAL_KEY
+    assert list(records[1]["phases"]) == ["prescan", timing.TOTAL_KEY]
+
+
+def test_timings_go_to_stderr(tmp_path, capsys, run_cli, write_text):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+
+    status = run_cli("--inplace", "--no-comment", "--timings", str(path))
+
+    assert status == cli.STATUS_SUCCESS
+    records = _read_records(capsys.readouterr().err)
+    assert [x["file"] for x in records] == [str(path)]
+
+
+def test_slow_threshold_leaves_out_fast_files(tmp_path, run_cli, write_text, read_text):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    timings_path = tmp_path / "timings.jsonl"
+
+    status = run_cli(
+        "--inplace",
+        "--timings-file",
+        str(timings_path),
+        "--slow-threshold",
+        "3600",
+        str(path),
+    )
+
+    assert status == cli.STATUS_SUCCESS
+    assert read_text(timings_path) == ""
+
+
+def test_profile_out_writes_profile_statistics(tmp_path, run_cli, write_text):
+    path = tmp_path / "a.md"
+    write_text(path, DOCUMENT)
+    profile_path = tmp_path / "profile.out"
+
+    status = run_cli("--inplace", "--profile-out", str(profile_path), str(path))
+
+    assert status == cli.STATUS_SUCCESS
+    stats = pstats.Stats(str(profile_path))
+    assert any(name == "_process_file" for (_f, _l, name) in stats.stats)
+
+
+def test_phase_timer_accumulates_repeated_phases():
+    timer = timing.PhaseTimer()
+    timer.start("read")
+    timer.start("parse")
+    timer.start("read")
+    timer.stop()
+
+    record = timer.get_record("a.md", cli.STATUS_SUCCESS)
+
+    assert list(record["phases"]) == ["read", "parse", timing.TOTAL_KEY]
+    total = record["phases"][timing.TOTAL_KEY]["wall"]
+    assert record["phases"]["read"]["wall"] <= total
@@ -0,0 +1,112 @@
+"""Tests for markdown_toc.walk, and processing input directories."""
+
+import os
+
+import pytest
+
+from markdown_toc import cli, walk
+
+DOCUMENT = "[toc]: #\n\n# One\n\n## Two\n"
+
+TREE = {
+    ".gitignore": "build/\n*.draft.md\n!keep.draft.md\n",
+    "README.md": DOCUMENT,
+    "a.draft.md": DOCUMENT,
+    "keep.draft.md": DOCUMENT,
+    "notes.txt": "Not Markdown\n",
+    "build/out.md": DOCUMENT,
+    "docs/.gitignore": "private.md\n",
+    "docs/guide.md": DOCUMENT,
+    "docs/private.md": DOCUMENT,
+    "docs/deep/more.markdown": DOCUMENT,
+    ".git/notes.md": DOCUMENT,
+}
+
+
+@pytest.fixture
+def tree(tmp_path, write_text):
+    """Get a Git working tree with both ignored and unignored files in it."""
+    for (rel_path, text) in TREE.items():
+        path = tmp_path.joinpath(*rel_path.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_text(path, text)
+    return tmp_path
+
+
+def _find(top, **kwargs):
+    return [
+        os.path.relpath(x, str(top)).replace(os.sep, "/")
+        for x in walk.iter_files([str(top)], **kwargs)
+    ]
+
+
+def test_gitignore_files_leave_out_ignored_files(tree):
+    # Files in a directory come before its subdirectories, in name order.
+    assert _find(tree) == [
+        "README.md",
+        "keep.draft.md",
+        "docs/guide.md",
+        "docs/deep/more.markdown",
+    ]
+
+
+def test_gitignore_files_apply_below_a_subdirectory(tree, write_text):
+    # The repository's top-level .gitignore still applies.
+    write_text(tree / "docs" / "old.draft.md", DOCUMENT)
+
+    assert _find(tree / "docs") == ["guide.md", "deep/more.markdown"]
+
+
+def test_no_gitignore_keeps_ignored_files_but_not_git_dir(tree):
+    assert sorted(_find(tree, use_gitignore=False)) == [
+        "README.md",
+        "a.draft.md",
+        "build/out.md",
+        "docs/deep/more.markdown",
+        "docs/guide.md",
+        "docs/private.md",
+        "keep.draft.md",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("include", "exclude", "expected"),
+    [
+        (["*.txt"], None, ["notes.txt"]),
+        (None, ["docs"], ["README.md", "keep.draft.md"]),
+        (None, ["deep", "README.md"], ["keep.draft.md", "docs/guide.md"]),
+        (["docs/*.md"], None, ["docs/guide.md"]),
+        (["*.md", "*.txt"], ["docs/g*"], ["README.md", "keep.draft.md", "notes.txt"]),
+    ],
+)
+def test_include_and_exclude_patterns(tree, include, exclude, expected):
+    assert _find(tree, include=include, exclude=exclude) == expected
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symbolic links")
+def test_files_reached_twice_are_found_once(tree):
+    os.symlink("README.md", str(tree / "link.md"))
+    os.symlink("docs", str(tree / "docs-link"))
+    paths = [str(tree / "README.md"), str(tree), str(tree / "docs" / "guide.md")]
+
+    found = [
+        os.path.relpath(x, str(tree)).replace(os.sep, "/")
+        for x in walk.iter_files(paths)
+    ]
+
+    assert found == [
+        "README.md",
+        "keep.draft.md",
+        "docs/guide.md",
+        "docs/deep/more.markdown",
+    ]
+
+
+def test_inplace_on_a_directory_skips_ignored_files(tree, run_cli, read_text):
+    status = run_cli("--inplace", "--no-comment", str(tree))
+
+    assert status == cli.STATUS_SUCCESS
+    for rel_path in ["README.md", "keep.draft.md", "docs/guide.md"]:
+        assert "- [One](#one)" in read_text(tree.joinpath(*rel_path.split("/")))
+    for rel_path in ["a.draft.md", "build/out.md", "docs/private.md"]:
+        assert read_text(tree.joinpath(*rel_path.split("/"))) == DOCUMENT
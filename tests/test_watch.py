@@ -0,0 +1,126 @@
+"""Tests for markdown_toc.watch, and what ``--watch`` watches."""
+
+import _thread
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from markdown_toc import walk, watch
+
+DOCUMENT = "[toc]: #\n\n# One\n\n## Two\n"
+
+TREE = {
+    ".gitignore": "ignored.md\nbuild/\n",
+    "a.md": DOCUMENT,
+    "notes.txt": DOCUMENT,
+    "ignored.md": DOCUMENT,
+    "build/b.md": DOCUMENT,
+    "skip/c.md": DOCUMENT,
+    "sub/d.md": DOCUMENT,
+    "sub/deeper/e.md": DOCUMENT,
+    ".git/f.md": DOCUMENT,
+}
+
+SELECTED = ["a.md", "sub/d.md", "sub/deeper/e.md"]
+
+# Long enough for any change to be noticed on a loaded machine
+WATCH_TIMEOUT = 30.0
+
+
+@pytest.fixture
+def tree(tmp_path, write_text):
+    """
+    Get a Git working tree with both ignored and unignored files in it.
+
+    Its directories are dated in the past, so that adding a file to one
+    changes its mtime, however coarse the file system's timestamps.
+    """
+    for (rel_path, text) in TREE.items():
+        path = tmp_path.joinpath(*rel_path.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_text(path, text, age=100)
+    if hasattr(os, "symlink"):
+        # A link back up the tree must not be followed round and round.
+        os.symlink("..", str(tmp_path / "sub" / "loop"))
+    mtime = time.time() - 100
+    for (dir_path, _dir_names, _file_names) in os.walk(str(tmp_path)):
+        os.utime(dir_path, (mtime, mtime))
+    return tmp_path
+
+
+def _rel_paths(top, paths):
+    return sorted(os.path.relpath(x, str(top)).replace(os.sep, "/") for x in paths)
+
+
+def _make_finder():
+    return walk.FileFinder(exclude=["skip"])
+
+
+def test_polling_watcher_watches_only_selected_files(tree, write_text):
+    watcher = watch.PollingWatcher([], [str(tree)], finder=_make_finder())
+    assert watcher.poll() == []
+
+    for rel_path in TREE:
+        write_text(tree.joinpath(*rel_path.split("/")), DOCUMENT + "More\n")
+
+    assert _rel_paths(tree, watcher.poll()) == SELECTED
+    assert watcher.poll() == []
+
+
+def test_polling_watcher_finds_new_files_and_directories(tree, write_text):
+    watcher = watch.PollingWatcher([], [str(tree)], finder=_make_finder())
+
+    (tree / "new").mkdir()
+    (tree / "build" / "new").mkdir()
+    for rel_path in ["new.md", "ignored.md", "new/g.md", "sub/h.md", "build/new/i.md"]:
+        write_text(tree.joinpath(*rel_path.split("/")), DOCUMENT)
+
+    assert _rel_paths(tree, watcher.poll()) == ["new.md", "new/g.md", "sub/h.md"]
+
+
+def test_polling_watcher_watches_explicit_files(tree, write_text):
+    path = tree / "notes.txt"
+    watcher = watch.PollingWatcher([str(path)], [])
+
+    write_text(path, DOCUMENT + "More\n")
+
+    assert watcher.poll() == [str(path)]
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_watch_processes_a_changed_file(
+    tree, monkeypatch, write_text, read_text, use_inotify
+):
+    if use_inotify and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is only on Linux")
+    if not use_inotify:
+        monkeypatch.setattr(sys, "platform", "unknown")
+    path = tree / "sub" / "d.md"
+    processed = []
+
+    def process_file(changed_path):
+        processed.append(changed_path)
+        # Stop watching; `watch()` returns when interrupted.
+        raise KeyboardInterrupt()
+
+    changer = threading.Timer(0.5, write_text, [path, DOCUMENT + "More\n"])
+    # Should the change go unnoticed, interrupting the watch ends the test.
+    stopper = threading.Timer(WATCH_TIMEOUT, _thread.interrupt_main)
+    changer.start()
+    stopper.start()
+    try:
+        watch.watch(
+            [str(tree)],
+            process_file,
+            debounce=0.05,
+            poll_interval=0.05,
+            finder=_make_finder(),
+        )
+    finally:
+        changer.cancel()
+        stopper.cancel()
+
+    assert processed == [str(path)]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""Check markdown-toc's startup time against a budget."""
+
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_IMPORT_BUDGET_MS = 25.0
+DEFAULT_FIRST_FILE_BUDGET_MS = 40.0
+DEFAULT_RUNS = 10
+
+MODULE = "markdown_toc.cli"
+
+# What a console-script entry point does; `python -m` would add the cost of
+# importing `runpy`:py:mod:, which installed users never pay.
+ENTRY_POINT_CODE = (
+    "import sys; from markdown_toc.__main__ import main; "
+    "sys.argv[0] = 'markdown-toc'; main()"
+)
+
+SAMPLE_DOCUMENT = """\
+# Sample
+
+[toc]: #
+
+## One
+
+## Two
+"""
+
+
+def _measure_import_ms(python):
+    """Measure the cold cumulative import time of `MODULE` with -X importtime."""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", "import {}".format(MODULE)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        fields = [x.strip() for x in line.split("|")]
+        if len(fields) == 3 and fields[2] == MODULE:
+            return int(fields[1]) / 1000.0
+    raise RuntimeError("{}: not found in -X importtime output".format(MODULE))
+
+
+def _measure_best_ms(command, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False
+        )
+        elapsed = (time.perf_counter() - start) * 1000.0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _setup_args(argv):
+    parser = argparse.ArgumentParser(prog=argv[0], description=__doc__)
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=DEFAULT_IMPORT_BUDGET_MS,
+        metavar="MS",
+        help="budget for importing {} (default: {})".format(
+            MODULE, DEFAULT_IMPORT_BUDGET_MS
+        ),
+    )
+    parser.add_argument(
+        "--first-file-budget",
+        type=float,
+        default=DEFAULT_FIRST_FILE_BUDGET_MS,
+        metavar="MS",
+        help=(
+            "budget for a whole run on one small file, interpreter startup "
+            "included (default: {})"
+        ).format(DEFAULT_FIRST_FILE_BUDGET_MS),
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=DEFAULT_RUNS,
+        help="runs to take the best time of (default: {})".format(DEFAULT_RUNS),
+    )
+    return parser.parse_args(argv[1:])
+
+
+def main(*argv):
+    args = _setup_args(argv)
+    python = sys.executable
+
+    import_ms = min(_measure_import_ms(python) for _ in range(args.runs))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sample_path = os.path.join(temp_dir, "sample.md")
+        with open(sample_path, "wt") as f:
+            f.write(SAMPLE_DOCUMENT)
+        interpreter_ms = _measure_best_ms([python, "-c", "pass"], args.runs)
+        first_file_ms = _measure_best_ms(
+            [python, "-c", ENTRY_POINT_CODE, "--pre-commit", sample_path], args.runs
+        )
+
+    status = 0
+    for (label, measured, budget) in [
+        ("import {}".format(MODULE), import_ms, args.import_budget),
+        ("time to first file", first_file_ms, args.first_file_budget),
+    ]:
+        verdict = "OK" if measured <= budget else "OVER BUDGET"
+        if measured > budget:
+            status = 1
+        print(
+            "==> {label}: {measured:.1f} ms (budget: {budget:.1f} ms) {verdict}".format(
+                label=label, measured=measured, budget=budget, verdict=verdict
+            )
+        )
+    print("==> (bare interpreter startup: {:.1f} ms)".format(interpreter_ms))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv))